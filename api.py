@@ -0,0 +1,230 @@
+# Read-only HTTP API over the dashboard queries.
+# Serves the same numbers as education-report.py as JSON or Arrow, tagged
+# with an ETag of the load version so unchanged results are answered 304.
+#
+#   uvicorn api:app --host 0.0.0.0 --port 8000
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+import psycopg
+from fastapi import FastAPI, HTTPException, Request, Response
+import load_data.util_package.dashboard_utils as utils
+import load_data.util_package.sql_queries as queries
+import load_data.util_package.logging as log
+
+# Endpoint -> query, its parameters in the order of its placeholders
+# (or by name for queries with %(name)s placeholders), and the ones
+# that are required
+ENDPOINTS = {
+    "years": (queries.get_years, [], []),
+    "states": (queries.get_states, [], []),
+    "institutions": (queries.get_institutes_by_state, ["state"], ["state"]),
+    "search": (queries.search_institutions, ["search", "state", "limit"],
+               ["search"]),
+    "metrics": (queries.get_metric_names, [], []),
+    "tuition-summary": (queries.tuition_rate_summary,
+                        ["year", "state", "unitid"], ["year"]),
+    "loan-repayment": (queries.loan_repayment_performance, ["year"],
+                       ["year"]),
+    "tuition-repayment": (queries.tuition_repayment_over_time, [], []),
+    "tuition-admission": (queries.tuition_admrate, ["year"], ["year"]),
+    "faculty-salaries": (queries.faculty_salary_map,
+                         ["year", "state", "unitid"], ["year"]),
+    "programs": (queries.program_earnings_debt, ["year", "state"],
+                 ["year"]),
+    "institution-programs": (queries.institution_programs,
+                             ["year", "unitid"], ["year", "unitid"]),
+}
+
+# Type and default (when not given) of each parameter
+PARAMETERS = {
+    "year": (int, None),
+    "unitid": (int, None),
+    "state": (str, ""),
+    "search": (str, None),
+    "limit": (int, 25),
+}
+# Allowed range of numeric parameters
+PARAMETER_RANGES = {
+    "limit": (1, 100),
+}
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Serialized responses kept by ETag, shared by every request
+RESPONSE_CACHE_SIZE = 256
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+app = FastAPI(title="US Colleges and Universities Data API",
+              description="Read-only College Scorecard and IPEDS queries "
+                          "behind the dashboard.")
+
+
+def parse_params(name, query_params):
+    """
+    Values of an endpoint's parameters from the request's query string,
+    converted to their types. Raises a 422 for a missing or invalid one.
+    """
+    _, param_names, required = ENDPOINTS[name]
+    values = {}
+    for param in param_names:
+        kind, default = PARAMETERS[param]
+        raw = query_params.get(param)
+        if raw is None or raw == "":
+            if param in required:
+                raise HTTPException(
+                    422, f"Missing required parameter '{param}'.")
+            values[param] = default
+            continue
+        try:
+            values[param] = kind(raw)
+        except ValueError:
+            raise HTTPException(
+                422, f"Invalid value for '{param}': {raw!r}.")
+        if param in PARAMETER_RANGES:
+            low, high = PARAMETER_RANGES[param]
+            if not low <= values[param] <= high:
+                raise HTTPException(
+                    422, f"'{param}' must be between {low} and {high}.")
+    return values
+
+
+def response_format(request):
+    """
+    "arrow" if asked for with ?format=arrow or an Accept header of the
+    Arrow stream type, else "json".
+    """
+    requested = request.query_params.get("format")
+    if requested is None:
+        accept = request.headers.get("accept", "")
+        requested = "arrow" if ARROW_MEDIA_TYPE in accept else "json"
+    if requested not in ("json", "arrow"):
+        raise HTTPException(422, f"Unknown format: {requested!r}.")
+    if requested == "arrow" and utils.pa is None:
+        raise HTTPException(406, "Arrow responses need pyarrow installed.")
+    return requested
+
+
+def make_etag(version, name, params, fmt):
+    """
+    ETag of a result: the load version it was read at and a hash of the
+    endpoint, its parameters and the format. It changes only when a new
+    load is recorded (see maintenance_utils.record_load).
+    """
+    key = repr((name, sorted(params.items()), fmt)).encode()
+    return f'"v{version}-{hashlib.sha1(key).hexdigest()[:16]}"'
+
+
+def etag_matches(etag, if_none_match):
+    """
+    True if an If-None-Match header lists the ETag (weak comparison).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def run_query(name, params):
+    """
+    Run an endpoint's query on a read connection (see
+    dashboard_utils.get_connection), as of the year's directory
+    attributes when history is loaded (see dashboard_utils.year_query).
+    """
+    query, param_names, _ = ENDPOINTS[name]
+    query = utils.year_query(query)
+    if "%(" in query:
+        args = params
+    else:
+        args = tuple(params[param] for param in param_names)
+    return utils.query_columnar(query, params=args or None)
+
+
+def serialize(df, fmt):
+    """
+    Response body of a result: JSON records (NaN as null), or an Arrow
+    IPC stream.
+    """
+    if fmt == "arrow":
+        table = utils.pa.Table.from_pandas(df, preserve_index=False)
+        sink = io.BytesIO()
+        with utils.pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), ARROW_MEDIA_TYPE
+    return (df.to_json(orient="records", date_format="iso").encode(),
+            "application/json")
+
+
+def cached_response(etag, name, params, fmt):
+    """
+    Serialized result of an endpoint, reused from the response cache when
+    the same ETag was already served. The last RESPONSE_CACHE_SIZE
+    results are kept; older load versions simply age out.
+    """
+    with _response_cache_lock:
+        if etag in _response_cache:
+            _response_cache.move_to_end(etag)
+            return _response_cache[etag]
+
+    body = serialize(run_query(name, params), fmt)
+
+    with _response_cache_lock:
+        _response_cache[etag] = body
+        while len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    return body
+
+
+@app.get("/version")
+def version():
+    """
+    Current load version (latest Load_History LOAD_ID).
+    """
+    return {"load_version": utils.get_load_version()}
+
+
+@app.get("/queries")
+def list_queries():
+    """
+    Every endpoint with its parameters and their defaults.
+    """
+    return {name: {param: {"type": PARAMETERS[param][0].__name__,
+                           "required": param in required,
+                           "default": PARAMETERS[param][1]}
+                   for param in param_names}
+            for name, (_, param_names, required) in ENDPOINTS.items()}
+
+
+@app.get("/queries/{name}")
+def get_query(name: str, request: Request):
+    """
+    Result of a dashboard query, e.g.
+    /queries/tuition-summary?year=2021&state=NY
+    """
+    if name not in ENDPOINTS:
+        raise HTTPException(404, f"Unknown query: {name!r}.")
+    params = parse_params(name, request.query_params)
+    fmt = response_format(request)
+
+    try:
+        load_version = utils.get_load_version()
+        etag = make_etag(load_version, name, params, fmt)
+        headers = {"ETag": etag,
+                   "Cache-Control":
+                       f"public, max-age={utils.LOAD_VERSION_TTL}",
+                   "Vary": "Accept"}
+        if etag_matches(etag, request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        body, media_type = cached_response(etag, name, params, fmt)
+    except psycopg.errors.UndefinedTable as e:
+        # the table is filled by a loader that has not been run yet
+        raise HTTPException(404, f"No data loaded for {name!r}: {e}")
+    except psycopg.Error as e:
+        log.get_logger(__name__).error(
+            f"Query {name} failed: {e}", exc_info=True)
+        raise HTTPException(503, "Database unavailable.")
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,423 @@
+# Driver code to benchmark the dashboard by replaying scripted sessions
+import sys
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import psutil
+import psycopg
+from streamlit.testing.v1 import AppTest
+import load_data.util_package.dashboard_utils as utils
+import load_data.util_package.sql_queries as queries
+import load_data.util_package.stats_utils as stats_utils
+from load_data.cleaning_package.cleaning_collegescorecard import (
+    CATEGORY_MAPPINGS as SCORECARD_CATEGORIES)
+from load_data.cleaning_package.cleaning_ipeds import (
+    CATEGORY_MAPPINGS as IPEDS_CATEGORIES)
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "education-report.py")
+
+# Interactions replayed after the first page load. Each step finds a
+# widget by type and label and calls one of its AppTest methods, e.g.
+# selectbox.select_index(1), radio.set_value("Out-of-state"),
+# text_input.input("univ"). A JSON file with the same shape can be
+# given with --script.
+DEFAULT_SESSION = [
+    {"name": "change year", "widget": "selectbox",
+     "label": "Year (Start of Academic Year)",
+     "method": "select_index", "arg": 1},
+    {"name": "pick state", "widget": "selectbox", "label": "State",
+     "method": "select_index", "arg": 1},
+    {"name": "pick institution", "widget": "selectbox",
+     "label": "Institution", "method": "select_index", "arg": 1},
+    {"name": "toggle trend tuition", "widget": "radio",
+     "label": "Tuition to plot:", "method": "set_value",
+     "arg": "Out-of-state"},
+    {"name": "toggle scatter tuition", "widget": "radio",
+     "label": "Select tuition type:", "method": "set_value",
+     "arg": "Out-of-state"},
+    {"name": "search institution", "widget": "text_input",
+     "label": "Search institution", "method": "input", "arg": "univ"},
+]
+
+PERCENTILES = [50, 90, 95, 99]
+
+SYNTHETIC_STATES = ["CA", "TX", "NY", "FL", "PA", "OH", "IL", "MA",
+                    "GA", "WA"]
+SYNTHETIC_CITIES = ["Springfield", "Riverside", "Franklin", "Greenville",
+                    "Fairview", "Madison", "Clinton", "Salem", "Georgetown",
+                    "Oakland"]
+SYNTHETIC_KINDS = ["University", "College", "Community College",
+                   "Institute of Technology", "State University"]
+
+
+#######################
+# SYNTHETIC DATA ######
+#######################
+
+def make_synthetic_data(n_institutions, years, seed=0):
+    """
+    Random but constraint-respecting rows for every table the dashboard
+    reads, with the columns in the order of the INSERT queries.
+
+    Returns {table name: dataframe}
+    """
+    rng = np.random.default_rng(seed)
+    n = n_institutions
+    unitids = np.arange(100000, 100000 + n)
+    last_year = max(years)
+
+    def codes(mapping):
+        return rng.choice(sorted(mapping), size=n)
+
+    cities = rng.choice(SYNTHETIC_CITIES, size=n)
+    names = [f"{city} {kind} {i}" for i, (city, kind) in
+             enumerate(zip(cities, rng.choice(SYNTHETIC_KINDS, size=n)))]
+
+    tables = {
+        "Institutions": pd.DataFrame({
+            "OPEID": np.arange(1000, 1000 + n),
+            "UNITID": unitids,
+            "ACCREDAGENCY": "Synthetic Accreditation Commission",
+            "PREDDEG": codes(SCORECARD_CATEGORIES["PREDDEG"]),
+            "HIGHDEG": codes(SCORECARD_CATEGORIES["HIGHDEG"]),
+            "CONTROL": codes(SCORECARD_CATEGORIES["CONTROL"]),
+            "REGION": codes(SCORECARD_CATEGORIES["REGION"]),
+            "LAST_REPORTED": last_year
+        }),
+        "Institutions_IPEDS": pd.DataFrame({
+            "UNITID": unitids,
+            "INSTNM": names,
+            "ADDR": [f"{i + 1} Main Street" for i in range(n)],
+            "CITY": cities,
+            "STABBR": rng.choice(SYNTHETIC_STATES, size=n),
+            "ZIP": [f"{z:05d}" for z in rng.integers(1000, 99999, size=n)],
+            "LATITUDE": rng.uniform(25, 48, size=n).round(7),
+            "LONGITUDE": rng.uniform(-123, -70, size=n).round(7),
+            **{col: codes(IPEDS_CATEGORIES[col]) for col in
+               ["C_BASIC", "C_IPUG", "C_UGPRF", "C_ENPRF", "C_SZSET"]},
+            "COUNTYCD": [f"{c:05d}" for c in
+                         rng.integers(1001, 56045, size=n)],
+            "CSA": None,
+            "CBSA": None,
+            "LAST_REPORTED": last_year
+        })
+    }
+
+    financials, academics, demographics = [], [], []
+    for year in years:
+        tuition_in = rng.integers(3000, 60000, size=n)
+        financials.append(pd.DataFrame({
+            "UNITID": unitids,
+            "YEAR": year,
+            "TUITIONFEE_IN": tuition_in,
+            "TUITIONFEE_OUT": tuition_in + rng.integers(0, 25000, size=n),
+            "TUITIONFEE_PROG": rng.integers(3000, 60000, size=n),
+            "TUITFTE": rng.integers(1000, 40000, size=n),
+            "AVGFACSAL": rng.integers(4000, 16000, size=n),
+            "CDR2": rng.uniform(0, 0.3, size=n).round(3),
+            "CDR3": rng.uniform(0, 0.3, size=n).round(3)
+        }))
+        academics.append(pd.DataFrame({
+            "UNITID": unitids,
+            "YEAR": year,
+            "ADM_RATE": rng.uniform(0.05, 1, size=n).round(4),
+            "C100_4": rng.uniform(0, 1, size=n).round(4),
+            "C100_L4": rng.uniform(0, 1, size=n).round(4),
+            "SAT_AVG": rng.integers(800, 1550, size=n).astype(float),
+            "COUNT_NWNE_3YR": rng.integers(0, 5000, size=n),
+            "COUNT_WNE_3YR": rng.integers(0, 5000, size=n),
+            "CNTOVER150_3YR": rng.integers(0, 5000, size=n)
+        }))
+        # Race shares sum to one, as required by the table CHECKs
+        ugds_race = rng.dirichlet(np.ones(8), size=n).round(4)
+        irps_race = rng.dirichlet(np.ones(8), size=n).round(4)
+        ugds_men = rng.uniform(0, 1, size=n).round(4)
+        irps_men = rng.uniform(0, 1, size=n).round(4)
+        demographics.append(pd.DataFrame(
+            np.column_stack([
+                unitids, np.full(n, year), rng.integers(50, 60000, size=n),
+                ugds_men, 1 - ugds_men, ugds_race,
+                irps_men, 1 - irps_men, irps_race]),
+            columns=["UNITID", "YEAR", "UGDS", "UGDS_MEN", "UGDS_WOMEN"] +
+            [f"UGDS_{r}" for r in ["WHITE", "BLACK", "HISP", "ASIAN",
+                                   "AIAN", "NHPI", "2MOR", "UNKN"]] +
+            ["IRPS_MEN", "IRPS_WOMEN"] +
+            [f"IRPS_{r}" for r in ["WHITE", "BLACK", "HISP", "ASIAN",
+                                   "AIAN", "NHPI", "2MOR", "UNKN"]]
+        ).astype({"UNITID": int, "YEAR": int, "UGDS": int}))
+
+    tables["Financials"] = pd.concat(financials, ignore_index=True)
+    tables["Academics"] = pd.concat(academics, ignore_index=True)
+    tables["Demographics"] = pd.concat(demographics, ignore_index=True)
+    return tables
+
+
+def seed_database(dsn, n_institutions, years, seed=0):
+    """
+    Create the dashboard tables in the database at `dsn` and fill them
+    with synthetic data. Inserts are upserts, so seeding twice is safe.
+    Meant for a local scratch database, not the production server.
+    """
+    tables = make_synthetic_data(n_institutions, years, seed)
+    inserts = {
+        "Institutions": queries.INSERT_INSTITUTIONS,
+        "Institutions_IPEDS": queries.INSERT_INSTITUTIONS_IPEDS,
+        "Financials": queries.INSERT_FINANCIALS,
+        "Academics": queries.INSERT_ACADEMICS,
+        "Demographics": queries.INSERT_DEMOGRAPHICS
+    }
+
+    # Catalog statistics of the synthetic data, as a real load would write
+    column_stats = pd.concat([
+        stats_utils.compute_column_stats(
+            df[df["YEAR"] == year], table_name, year)
+        for table_name in ["Financials", "Academics", "Demographics"]
+        for df in [tables[table_name]]
+        for year in years], ignore_index=True)
+
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            for col, col_map in {**SCORECARD_CATEGORIES,
+                                 **IPEDS_CATEGORIES}.items():
+                table = f"Dim_{col}"
+                cur.execute(queries.CREATE_DIMENSION.format(table=table))
+                cur.executemany(
+                    queries.INSERT_DIMENSION.format(table=table),
+                    list(col_map.items()))
+            for create in [queries.CREATE_INSTITUTIONS,
+                           queries.CREATE_INSTITUTIONS_IPEDS,
+                           queries.CREATE_INSTNM_SEARCH_INDEX,
+                           queries.CREATE_FINANCIALS,
+                           queries.CREATE_ACADEMICS,
+                           queries.CREATE_DEMOGRAPHICS,
+                           queries.CREATE_COLUMN_STATS]:
+                cur.execute(create)
+            for table_name, insert in inserts.items():
+                # object dtype keeps integer columns as Python ints
+                cur.executemany(
+                    insert, tables[table_name].astype(object).values.tolist())
+                print(f"Seeded {len(tables[table_name])} rows into",
+                      f"{table_name}.")
+            cur.executemany(queries.INSERT_COLUMN_STATS,
+                            column_stats.values.tolist())
+
+
+#######################
+# INSTRUMENTATION #####
+#######################
+
+# Counters of the current worker process. Sessions run one at a time
+# in each worker, so the counters belong to a single interaction.
+_counters = {"queries": 0, "results": []}
+_dsn = None
+
+
+class CountingCursor(psycopg.Cursor):
+    """
+    Cursor that counts the statements it executes and keeps their results
+    so the bytes fetched can be summed after the interaction.
+    """
+    def execute(self, query, params=None, **kwargs):
+        result = super().execute(query, params, **kwargs)
+        _counters["queries"] += 1
+        if self.pgresult is not None:
+            _counters["results"].append(self.pgresult)
+        return result
+
+
+def benchmark_connection():
+    """
+    Replaces dashboard_utils.get_connection in the worker processes.
+    """
+    return psycopg.connect(_dsn, cursor_factory=CountingCursor)
+
+
+def init_worker(dsn):
+    """
+    Point the dashboard at the benchmark database. The app script imports
+    the same dashboard_utils module, so it picks up the patched function.
+    """
+    global _dsn
+    _dsn = dsn
+    utils.get_connection = benchmark_connection
+
+
+def result_bytes(pgresult):
+    """
+    Size in bytes of the values of a query result, as sent by Postgres.
+    """
+    return sum(pgresult.get_length(row, col)
+               for row in range(pgresult.ntuples)
+               for col in range(pgresult.nfields))
+
+
+def find_widget(at, widget, label):
+    """
+    Find a widget of the app by type (AppTest attribute) and label.
+    """
+    for element in getattr(at, widget):
+        if element.label == label:
+            return element
+    raise ValueError(f"No {widget} labeled '{label}' on the page.")
+
+
+def run_session(session_id, steps, timeout):
+    """
+    Replay one scripted session in a fresh AppTest (a new browser tab)
+    and measure every rerun. Runs in a worker process.
+
+    Returns a list of dicts, one per interaction.
+    """
+    at = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    process = psutil.Process()
+    measurements = []
+
+    for step in [{"name": "initial load"}] + steps:
+        error = None
+        _counters["queries"] = 0
+        _counters["results"] = []
+
+        start_time = time.perf_counter()
+        try:
+            if "widget" in step:
+                element = find_widget(at, step["widget"], step["label"])
+                getattr(element, step["method"])(step.get("arg"))
+            at.run()
+            if len(at.exception):
+                error = at.exception[0].message
+        except Exception as e:
+            error = str(e)
+        elapsed_time = time.perf_counter() - start_time
+
+        measurements.append({
+            "session": session_id,
+            "step": step["name"],
+            "latency_ms": elapsed_time * 1000,
+            "queries": _counters["queries"],
+            "bytes_fetched": sum(result_bytes(r)
+                                 for r in _counters["results"]),
+            "rss_mb": process.memory_info().rss / 2 ** 20,
+            "error": error
+        })
+        if error is not None:
+            # Later steps depend on the page this one should have produced
+            break
+
+    _counters["results"] = []
+    return measurements
+
+
+def summarize(measurements, step_order):
+    """
+    Per-interaction latency percentiles, mean query count and bytes
+    fetched, and peak process memory, in replay order.
+    """
+    df = pd.DataFrame(measurements)
+    grouped = df.groupby("step", sort=False)
+    summary = pd.DataFrame({
+        "runs": grouped.size(),
+        "errors": grouped["error"].count(),
+        **{f"p{p}_ms": grouped["latency_ms"].quantile(p / 100)
+           for p in PERCENTILES},
+        "max_ms": grouped["latency_ms"].max(),
+        "queries": grouped["queries"].mean(),
+        "kb_fetched": grouped["bytes_fetched"].mean() / 1024,
+        "peak_rss_mb": grouped["rss_mb"].max()
+    })
+    return summary.reindex([s for s in step_order if s in summary.index])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay scripted dashboard sessions headlessly and "
+                    "report per-interaction rerun latency.")
+    parser.add_argument("--dsn", required=True,
+                        help="Connection string of a local benchmark "
+                             "database, e.g. postgresql://localhost/bench")
+    parser.add_argument("--seed", action="store_true",
+                        help="Create the tables and load synthetic data "
+                             "before the benchmark")
+    parser.add_argument("--institutions", type=int, default=2000,
+                        help="Number of synthetic institutions")
+    parser.add_argument("--years", nargs="*", type=int,
+                        default=list(range(2015, 2023)),
+                        help="Years of synthetic data")
+    parser.add_argument("--script",
+                        help="JSON file with the session steps "
+                             "(default: DEFAULT_SESSION)")
+    parser.add_argument("--sessions", type=int, default=10,
+                        help="Number of sessions to replay")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Sessions replayed at the same time "
+                             "(one worker process each)")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="Seconds allowed for one rerun")
+    parser.add_argument("--output", help="Write the summary and raw "
+                                         "measurements to this JSON file")
+    parser.add_argument("--max-p95-ms", type=float,
+                        help="Fail if any interaction's p95 latency "
+                             "is above this")
+    args = parser.parse_args()
+
+    try:
+        if args.seed:
+            seed_database(args.dsn, args.institutions, args.years)
+
+        steps = DEFAULT_SESSION
+        if args.script:
+            with open(args.script) as f:
+                steps = json.load(f)
+
+        print(f"Replaying {args.sessions} sessions of {len(steps) + 1}",
+              f"interactions with concurrency {args.concurrency}...")
+        start_time = time.time()
+
+        measurements = []
+        with ProcessPoolExecutor(max_workers=args.concurrency,
+                                 initializer=init_worker,
+                                 initargs=(args.dsn,)) as executor:
+            futures = [executor.submit(run_session, session_id, steps,
+                                       args.timeout)
+                       for session_id in range(args.sessions)]
+            for future in as_completed(futures):
+                measurements.extend(future.result())
+
+        elapsed_time = time.time() - start_time
+        summary = summarize(measurements, ["initial load"] +
+                            [step["name"] for step in steps])
+        with pd.option_context("display.width", 200,
+                               "display.float_format", "{:.1f}".format):
+            print(summary)
+        print(f"\nBenchmark completed in {elapsed_time:.1f} seconds.")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"summary": summary.reset_index()
+                           .to_dict(orient="records"),
+                           "measurements": measurements}, f, indent=2)
+
+        errors = [m for m in measurements if m["error"] is not None]
+        for m in errors[:5]:
+            print(f"ERROR  : session {m['session']} {m['step']}:",
+                  m["error"])
+        too_slow = (summary.index[summary["p95_ms"] > args.max_p95_ms]
+                    if args.max_p95_ms is not None else [])
+        for step in too_slow:
+            print(f"TOO SLOW: {step} p95",
+                  f"{summary.loc[step, 'p95_ms']:.0f} ms >",
+                  f"{args.max_p95_ms:.0f} ms")
+        if errors or len(too_slow):
+            sys.exit(1)
+
+    except Exception as e:
+        print("Dashboard benchmark failed:", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
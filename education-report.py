@@ -1,7 +1,6 @@
 import streamlit as st
 import load_data.util_package.dashboard_utils as utils
 import load_data.util_package.sql_queries as queries
-import pydeck as pdk
 import altair as alt
 import pandas as pd
 
@@ -33,71 +32,58 @@ selected_state = st.sidebar.selectbox(
     index=0
 )
 
-if selected_state != "":
-    available_institution = utils.query_data(queries.get_institutes_by_state,
-                                             params=(selected_state,))
+# Typeahead: only the top matches for the typed name are fetched.
+# With a state selected and nothing typed, list that state's institutions.
+institution_search = st.sidebar.text_input("Search institution", value="")
+
+if institution_search.strip() != "":
+    available_institution = utils.search_institutions(
+        institution_search, state=selected_state, limit=25)
+elif selected_state != "":
+    available_institution = utils.query_data(
+        queries.get_institutes_by_state, params=(selected_state,))
 else:
-    available_institution = utils.query_data(queries.get_all_institutes,
-                                             params=())
-    print(available_institution)
+    available_institution = pd.DataFrame(
+        columns=["unitid", "instnm", "city", "stabbr"])
+
+
+def institution_label(unitid):
+    if unitid is None:
+        return ""
+    row = available_institution.loc[
+        available_institution["unitid"] == unitid].iloc[0]
+    return f"{row['instnm']} ({row['city']}, {row['stabbr']})"
 
-selected_institution = st.sidebar.selectbox(
+
+# Options are UNITIDs, so institutions sharing a name stay distinct
+selected_institution_unitid = st.sidebar.selectbox(
     "Institution",
-    options=[""] + available_institution["instnm"].tolist(),
+    options=[None] + [int(u) for u in available_institution["unitid"]],
+    format_func=institution_label,
     index=0
 )
 
-if selected_institution != "":
-    selected_institution_unitid = available_institution.loc[
-        available_institution["instnm"] == selected_institution,
-        "unitid"
-        ].iloc[0]
-else:
-    selected_institution_unitid = None
+# In-memory cube of the fact tables, shared by every session and rebuilt
+# once per load version: the year / state / institution slices of
+# PLOTS 2-3 are answered from it without querying Postgres
+
+
+@st.cache_resource(max_entries=1)
+def get_cube(load_version):
+    return utils.build_cube(load_version)
+
+
+cube = get_cube(utils.get_load_version())
 
 # PLOT 1
 # Summaries of how many colleges and universities are included in the data
 # for the selected year, by state and type of institution (private, public,
 # for-profit, and so on)
 
-
-most_recent_year = queries.get_most_recent_year
-max_year = utils.query_data(most_recent_year, params=())['max'].to_list()[0]
+max_year, df = utils.get_institution_summary(selected_state)
 st.subheader(f"Institutions by State and Type\nUpdated to most recent year: {max_year}")
 
-# Get necessary data
-params = [max_year]
-
-inst_summary_query = queries.year_institute_summary_begin
-if selected_state != "":
-    inst_summary_query += " AND iped_ins.STABBR = %s"
-    params.append(selected_state)
-
-inst_summary_query += queries.year_institute_summary_end
-
-df = utils.query_data(inst_summary_query,
-                      params=params)
-
-df = df.rename(columns={
-    "control": "Type",
-    "stabbr": "State",
-    "count": "Institution Count"
-})
-
-df["Type"] = df["Type"].fillna("Unknown")
-
-pivot_df = (
-    df.pivot_table(
-        index="State",
-        columns="Type",
-        values="Institution Count",
-        aggfunc="sum",
-        fill_value=0
-    )
-    .reset_index()
-)
-
-pivot_df.columns.name = None
+pivot_df = utils.make_institution_summary(df)
 
 st.dataframe(pivot_df, use_container_width=True, hide_index=True)
 
@@ -108,24 +94,11 @@ Summaries of current college tuition rates, by state and Carnegie
 Classification of institution.
 """
 # Get necessary data
-tuition_summary_query = queries.tuition_rate_summary
-tuition_summary_df = utils.query_data(tuition_summary_query,
-                                      params=(selected_year,
-                                              selected_state,
-                                              selected_institution))
-
-# map to get "$"
-tuition_summary_df["avg_in_state_tuition"] = tuition_summary_df[
-    "avg_in_state_tuition"].map("${:,.0f}".format)
-tuition_summary_df["avg_out_state_tuition"] = tuition_summary_df[
-    "avg_out_state_tuition"].map("${:,.0f}".format)
-
-tuition_summary_df = tuition_summary_df.rename(columns={
-    "stabbr": "State",
-    "c_basic": "Carnegie Classification",
-    "avg_in_state_tuition": "Avg In-State Tuition",
-    "avg_out_state_tuition": "Avg Out of State Tuition"
-})
+tuition_summary_df = utils.cube_tuition_summary(cube, selected_year,
+                                                selected_state,
+                                                selected_institution_unitid)
+
+tuition_summary_df = utils.make_tuition_summary_table(tuition_summary_df)
 
 st.dataframe(tuition_summary_df, use_container_width=True, hide_index=True)
 
@@ -134,57 +107,24 @@ st.subheader("Summary table of loan repayment performances")
 """
 Best- and worst-performing institutions by loan repayment rates.
 """
-loan_perf_query = queries.loan_repayment_performance
-loan_df = utils.query_data(loan_perf_query, params=(selected_year,))
+loan_df = utils.cube_loan_repayment(cube, selected_year)
 
 if loan_df.empty:
     st.info("No loan repayment data available for the selected year.")
 else:
-    # filter by state if one is selected
-    if selected_state:
-        loan_df = loan_df[loan_df["stabbr"] == selected_state]
-
-    # Clean up / rename columns
-    loan_df = loan_df.rename(columns={
-        "instnm": "Institution",
-        "stabbr": "State",
-        "control": "Type",
-        "repayment_rate": "Repayment Rate"
-    })
-
-    # If repayment is 0–1, you can convert to %
-    if loan_df["Repayment Rate"].max() <= 1.0:
-        loan_df["Repayment Rate"] = loan_df["Repayment Rate"] * 100
-
-    # Sort for best / worst
-    top_n = 10
-    best_df = (
-        loan_df.sort_values("Repayment Rate", ascending=False)
-        .head(top_n)
-    )
-    worst_df = (
-        loan_df.sort_values("Repayment Rate", ascending=True)
-        .head(top_n)
-    )
+    best_df, worst_df = utils.make_loan_performance_tables(
+        loan_df, state_selected=selected_state, top_n=10)
 
     # Display side by side
     col1, col2 = st.columns(2)
 
     with col1:
         st.markdown("**Best-performing institutions (by repayment rate)**")
-        st.dataframe(
-            best_df[["Institution", "State", "Type", "Repayment Rate"]],
-            use_container_width=True,
-            hide_index=True
-        )
+        st.dataframe(best_df, use_container_width=True, hide_index=True)
 
     with col2:
         st.markdown("**Worst-performing institutions (by repayment rate)**")
-        st.dataframe(
-            worst_df[["Institution", "State", "Type", "Repayment Rate"]],
-            use_container_width=True,
-            hide_index=True
-        )
+        st.dataframe(worst_df, use_container_width=True, hide_index=True)
 
 
 # PLOT 4
@@ -210,112 +150,31 @@ tuition_type_over_time = st.radio(
 
 tuition_repay_query = queries.tuition_repayment_over_time
 
-tuition_repay_df = utils.query_data(
+# Large results are fetched column by column
+tuition_repay_df = utils.query_columnar(
     tuition_repay_query,
     params=()
 )
 
+# Axis floors come from the load-time statistics catalog
+trend_scales = utils.report_scales(selected_year,
+                                   tuition_type=tuition_type_over_time)
 
-# state filter
-if selected_state:
-    tuition_repay_df = tuition_repay_df[tuition_repay_df["stabbr"]
-                                        == selected_state]
+# Charts are rebuilt only when their data or parameters change
+trend_chart = utils.cached_chart(
+    utils.make_tuition_repayment_charts,
+    tuition_repay_df,
+    state_selected=selected_state,
+    agg_level=agg_level,
+    tuition_type=tuition_type_over_time,
+    tuition_floor=trend_scales["tuition_floor"],
+    repayment_floor=trend_scales["repayment_floor"]
+)
 
-if tuition_repay_df.empty:
+if trend_chart is None:
     st.info("No tuition/repayment trend data available")
 else:
-    # Basic cleanup / rename
-    tuition_repay_df = tuition_repay_df.rename(columns={
-        "year": "Year",
-        "control": "Type",
-        "avg_in_state_tuition": "Avg In-State Tuition",
-        "avg_out_state_tuition": "Avg Out-of-State Tuition",
-        "avg_repayment_rate": "Avg Repayment Rate"
-    })
-
-    # If Avg Repayment is 0–1, convert to percentage
-    if tuition_repay_df["Avg Repayment Rate"].max() <= 1.0:
-        tuition_repay_df["Avg Repayment Rate"] = (
-            tuition_repay_df["Avg Repayment Rate"] * 100
-        )
-
-    # Choose tuition metric
-    if tuition_type_over_time == "In-state":
-        tuition_col = "Avg In-State Tuition"
-    else:
-        tuition_col = "Avg Out-of-State Tuition"
-
-    # Decide grouping based on aggregation level
-    if agg_level == "All Institutions":
-        # Aggregate across all Types if not already aggregated
-        group_cols = ["Year"]
-        df_agg = (tuition_repay_df
-                  .groupby(group_cols, as_index=False)
-                  .agg({
-                      tuition_col: "mean",
-                      "Avg Repayment Rate": "mean"
-                  }))
-        color_encoding = alt.value("steelblue")  # single color
-    else:
-        # Group by Year + Type (Public / Private / For-profit)
-        group_cols = ["Year", "Type"]
-        df_agg = (tuition_repay_df
-                  .groupby(group_cols, as_index=False)
-                  .agg({
-                      tuition_col: "mean",
-                      "Avg Repayment Rate": "mean"
-                  }))
-        color_encoding = "Type:N"
-
-    # Tuition chart over time
-    tuition_chart = (
-        alt.Chart(df_agg)
-        .mark_line(point=True)
-        .encode(
-            x=alt.X("Year:O", title="Year"),
-            y=alt.Y(
-                f"{tuition_col}:Q",
-                title=tuition_col,
-                scale=alt.Scale(domain=[5000, df_agg[tuition_col].max()])
-            ),
-            color=color_encoding,
-            tooltip=(
-                ["Year", "Type", tuition_col]
-                if "Type" in df_agg.columns
-                else ["Year", tuition_col]
-            )
-        )
-        .properties(
-            height=250,
-            title="Average Tuition Over Time"
-        )
-    )
-
-    # Repayment chart over time
-    repay_chart = (
-        alt.Chart(df_agg)
-        .mark_line(point=True)
-        .encode(
-            x=alt.X("Year:O", title="Year"),
-            y=alt.Y(
-                "Avg Repayment Rate:Q",
-                title="Avg Repayment Rate (%)",
-                scale=alt.Scale(domain=[70,
-                                        df_agg["Avg Repayment Rate"].max()])
-            ),
-            color=color_encoding,
-            tooltip=(
-                ["Year", "Type", "Avg Repayment Rate"]
-                if "Type" in df_agg.columns
-                else ["Year", "Avg Repayment Rate"])
-        )
-        .properties(
-            height=250,
-            title="Average Loan Repayment Rate Over Time"
-        )
-    )
-
-    st.altair_chart(tuition_chart & repay_chart, use_container_width=True)
+    st.vega_lite_chart(trend_chart, use_container_width=True)
 
 # PLOT 5
 st.subheader("Carnegie Classification and Average SAT score")
@@ -323,13 +182,8 @@ st.subheader("Carnegie Classification and Average SAT score")
 # each Carnegie Basic Classification
 
 car_sat_summary_query = queries.SAT_avg_carnegie
-car_sat_summary_df = utils.query_data(car_sat_summary_query)
-
-car_sat_summary_df = car_sat_summary_df.rename(
-    columns={"carnegie_basic": "Carnegie Classification",
-             "avg_sat_score": "Average SAT Score"})
-car_sat_summary_df["Average SAT Score"] = (
-    car_sat_summary_df["Average SAT Score"].round(0))
+car_sat_summary_df = utils.make_sat_carnegie_table(
+    utils.query_data(car_sat_summary_query))
 
 st.data_editor(car_sat_summary_df, use_container_width=True, hide_index=True)
 
@@ -344,105 +198,168 @@ tuition_type = st.radio(
     horizontal=True
 )
 
-rate_fee_query = queries.tuition_admrate
-df = utils.query_data(rate_fee_query, params=(selected_year,))
+rate_fee_query = utils.year_query(queries.tuition_admrate)
+df = utils.query_columnar(rate_fee_query, params=(selected_year,))
 
 
-chart = utils.make_tuition_adm_plot(
+# Other institutions are drawn as a binned density, so the chart
+# data does not grow with the number of institutions
+chart = utils.cached_chart(
+    utils.make_tuition_adm_plot,
     df,
     institution_selected=selected_institution_unitid,
     state_selected=selected_state,
-    tuition_type=tuition_type
+    tuition_type=tuition_type,
+    lod=True
 )
 
-st.altair_chart(chart, use_container_width=True)
+st.vega_lite_chart(chart, use_container_width=True)
 
 # PLOT 7
 st.subheader("Map of Faculty Salaries")
 
 # Map showing faculty salaries across the US
 
-faculty_salary_query = queries.faculty_salary_map
-map_faculty_salary_df = utils.query_data(faculty_salary_query,
-                                         params=(selected_year,
-                                                 selected_state,
-                                                 selected_institution))
-map_faculty_salary_df["avg_faculty_salary"] = pd.to_numeric(
-    map_faculty_salary_df["avg_faculty_salary"], errors="coerce")
+faculty_salary_query = utils.year_query(queries.faculty_salary_map)
+map_faculty_salary_df = utils.query_columnar(
+    faculty_salary_query,
+    params=(selected_year, selected_state, selected_institution_unitid))
 
-# Normalize salary → darker color for higher salary
-min_sal = map_faculty_salary_df["avg_faculty_salary"].min()
-max_sal = map_faculty_salary_df["avg_faculty_salary"].max()
+# The color scale is the year's salary range from the statistics catalog
+salary_deck, salary_legend = utils.cached_chart(
+    utils.make_faculty_salary_map,
+    map_faculty_salary_df,
+    salary_range=trend_scales["salary_range"])
 
+st.pydeck_chart(salary_deck)
 
-def salary_to_color(s):
-    if min_sal == max_sal:
-        return [200, 200, 200]   # light grey for missing salary
-    return [
-        0,
-        int(100 + 155 * (s - min_sal) / (max_sal - min_sal)),
-        int(180 - 120 * (s - min_sal) / (max_sal - min_sal))
-    ]
+st.markdown(salary_legend, unsafe_allow_html=True)
 
+# PLOT 8
+st.subheader("Nearby Institutions")
+# Institutions within a radius of the selected institution and its
+# nearest peers, answered from an in-memory spatial index
 
-map_faculty_salary_df["color"] = map_faculty_salary_df["avg_faculty_salary"
-                                                       ].apply(salary_to_color)
-print(map_faculty_salary_df["color"])
 
-layer = pdk.Layer(
-    "ScatterplotLayer",
-    map_faculty_salary_df,
-    get_position='[longitude, latitude]',
-    get_color='color',
-    get_radius=25000,
-    pickable=True,
+@st.cache_resource
+def get_spatial_index():
+    return utils.build_spatial_index()
+
+
+if selected_institution_unitid is None:
+    st.info("Select an institution to see nearby institutions.")
+else:
+    spatial_index = get_spatial_index()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        radius_miles = st.slider("Within (miles):", min_value=5,
+                                 max_value=500, value=50, step=5)
+    with col2:
+        k_peers = st.number_input("Nearest peers:", min_value=1,
+                                  max_value=50, value=10)
+
+    nearby_df = utils.institutions_within_radius(
+        spatial_index, selected_institution_unitid, radius_miles)
+    peers_df = utils.nearest_institutions(
+        spatial_index, selected_institution_unitid, int(k_peers))
+
+    display_cols = {
+        "instnm": "Institution",
+        "city": "City",
+        "stabbr": "State",
+        "distance_miles": "Distance (miles)"
+    }
+
+    with col1:
+        st.markdown(f"**{len(nearby_df)} institutions within "
+                    f"{radius_miles} miles**")
+        st.dataframe(
+            nearby_df[list(display_cols)].rename(columns=display_cols)
+            .round({"Distance (miles)": 1}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    with col2:
+        st.markdown(f"**{int(k_peers)} nearest institutions**")
+        st.dataframe(
+            peers_df[list(display_cols)].rename(columns=display_cols)
+            .round({"Distance (miles)": 1}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+# PLOT 9
+st.subheader("Compare Institutions Over Time")
+# Multi-year panel for several institutions, fetched in one query
+
+compare_options = [int(u) for u in available_institution["unitid"]]
+compare_unitids = st.multiselect(
+    "Institutions (from the sidebar state or search):",
+    options=compare_options,
+    default=([selected_institution_unitid]
+             if selected_institution_unitid in compare_options else []),
+    format_func=institution_label
 )
 
-view_state = pdk.ViewState(
-    latitude=37.5,   # Centers on USA
-    longitude=-96,
-    zoom=3.5,
+compare_years = st.slider(
+    "Years:",
+    min_value=int(min(years)),
+    max_value=int(max(years)),
+    value=(int(min(years)), int(max(years)))
 )
 
-st.pydeck_chart(
-    pdk.Deck(
-        layers=[layer],
-        initial_view_state=view_state,
-        tooltip={
-            "html": "<b>State:</b> {stabbr}<br/>"
-                    "<b>Avg Salary:</b> ${avg_faculty_salary}",
-        }
-    )
+compare_metrics = st.multiselect(
+    "Metrics:",
+    options=list(utils.PANEL_METRICS),
+    default=["tuitionfee_in", "adm_rate"]
 )
 
-low_color = salary_to_color(min_sal)
-high_color = salary_to_color(max_sal)
-
-low_rgb = f"rgb({low_color[0]}, {low_color[1]}, {low_color[2]})"
-high_rgb = f"rgb({high_color[0]}, {high_color[1]}, {high_color[2]})"
-
-st.markdown(
-    f"""
-    <div style="margin-top:20px;">
-        <b>Legend: Faculty Salary Range</b>
-        <div style="
-            height: 20px;
-            background: linear-gradient(to right, {low_rgb}, {high_rgb});
-            border: 1px solid #aaa;
-            margin-top: 5px;
-        "></div>
-        <div style="
-            display: flex;
-            justify-content: space-between;
-            font-size: 15px;
-            color: #222;
-            font-weight: 600;
-            margin-top: 4px;
-        ">
-            <span>${min_sal:,.0f}</span>
-            <span>${(min_sal+max_sal)/2:,.0f}</span>
-            <span>${max_sal:,.0f}</span>
-        </div>
-    </div>
-    """,
-    unsafe_allow_html=True)
+if not compare_unitids or not compare_metrics:
+    st.info("Select institutions and metrics to compare.")
+else:
+    panel_df = utils.get_institution_panel(compare_unitids,
+                                           compare_years[0],
+                                           compare_years[1],
+                                           compare_metrics)
+    if panel_df.empty:
+        st.info("No data available for the selected institutions.")
+    else:
+        panel_chart = (
+            alt.Chart(panel_df)
+            .mark_line(point=True)
+            .encode(
+                x=alt.X("year:O", title="Year"),
+                y=alt.Y("value:Q", title=None),
+                color=alt.Color("instnm:N", title="Institution"),
+                tooltip=["instnm", "year", "metric", "value", "yoy_change"]
+            )
+            .properties(height=200)
+            .facet(row=alt.Row("metric:N", title=None))
+            .resolve_scale(y="independent")
+        )
+        st.altair_chart(panel_chart, use_container_width=True)
+
+# PLOT 10
+st.subheader("Earnings and Debt by Program")
+"""
+Median earnings one and four years after completion and median debt of
+programs (field of study and credential level), from the College
+Scorecard Field of Study data.
+"""
+if not utils.fields_of_study_available():
+    # Fields_Of_Study is only created by load_fieldofstudy.py
+    programs_df = pd.DataFrame()
+elif selected_institution_unitid is None:
+    programs_df = utils.query_data(queries.program_earnings_debt,
+                                   params=(selected_year, selected_state))
+else:
+    programs_df = utils.query_data(queries.institution_programs,
+                                   params=(selected_year,
+                                           selected_institution_unitid))
+
+if programs_df.empty:
+    st.info("No field of study data available for the selected year.")
+else:
+    st.dataframe(programs_df, use_container_width=True, hide_index=True)
@@ -5,6 +5,43 @@ into insert-ready dataframe for different tables.
 import pandas as pd
 import load_data.util_package.logging as log
 
+# Mapping settings for categorical columns.
+# The Institutions table stores the codes; these labels are loaded once
+# into the Dim_<column> dimension tables (see sql_queries.py)
+CATEGORY_MAPPINGS = {
+    "PREDDEG": {
+        0: "Not classified",
+        1: "Predominantly certificate-degree granting",
+        2: "Predominantly associate's-degree granting",
+        3: "Predominantly bachelor's-degree granting",
+        4: "Entirely graduate-degree granting"
+    },
+    "HIGHDEG": {
+        0: "Non-degree-granting",
+        1: "Certificate degree",
+        2: "Associate degree",
+        3: "Bachelor's degree",
+        4: "Graduate degree"
+    },
+    "CONTROL": {
+        1: "Public",
+        2: "Private nonprofit",
+        3: "Private for-profit"
+    },
+    "REGION": {
+        0: "U.S. Service Schools",
+        1: "New England (CT, ME, MA, NH, RI, VT)",
+        2: "Mid East (DE, DC, MD, NJ, NY, PA)",
+        3: "Great Lakes (IL, IN, MI, OH, WI)",
+        4: "Plains (IA, KS, MN, MO, NE, ND, SD)",
+        5: "Southeast (AL, AR, FL, GA, KY, LA, MS, NC, SC, TN, VA, WV)",
+        6: "Southwest (AZ, NM, OK, TX)",
+        7: "Rocky Mountains (CO, ID, MT, UT, WY)",
+        8: "Far West (AK, CA, HI, NV, OR, WA)",
+        9: "Outlying Areas (AS, FM, GU, MH, MP, PR, PW, VI)"
+    }
+}
+
 
 def clean_institutions(df):
     """
@@ -16,41 +53,6 @@ def clean_institutions(df):
     main_cols = ['OPEID', 'UNITID', 'ACCREDAGENCY', 'PREDDEG', 'HIGHDEG',
                  'CONTROL', 'REGION']
 
-    # Mapping settings for categorical columns
-    mapping = {
-        "PREDDEG": {
-            0: "Not classified",
-            1: "Predominantly certificate-degree granting",
-            2: "Predominantly associate's-degree granting",
-            3: "Predominantly bachelor's-degree granting",
-            4: "Entirely graduate-degree granting"
-        },
-        "HIGHDEG": {
-            0: "Non-degree-granting",
-            1: "Certificate degree",
-            2: "Associate degree",
-            3: "Bachelor's degree",
-            4: "Graduate degree"
-        },
-        "CONTROL": {
-            1: "Public",
-            2: "Private nonprofit",
-            3: "Private for-profit"
-        },
-        "REGION": {
-            0: "U.S. Service Schools",
-            1: "New England (CT, ME, MA, NH, RI, VT)",
-            2: "Mid East (DE, DC, MD, NJ, NY, PA)",
-            3: "Great Lakes (IL, IN, MI, OH, WI)",
-            4: "Plains (IA, KS, MN, MO, NE, ND, SD)",
-            5: "Southeast (AL, AR, FL, GA, KY, LA, MS, NC, SC, TN, VA, WV)",
-            6: "Southwest (AZ, NM, OK, TX)",
-            7: "Rocky Mountains (CO, ID, MT, UT, WY)",
-            8: "Far West (AK, CA, HI, NV, OR, WA)",
-            9: "Outlying Areas (AS, FM, GU, MH, MP, PR, PW, VI)"
-        }
-    }
-
     try:
         # Obtain relevant columns
         sub_df = df[main_cols].copy()
@@ -65,12 +67,15 @@ def clean_institutions(df):
         print((f"Unexpected Error: {e}"))
         raise
 
-    # Map categorical variables to relevant strings
-    for cat_col in mapping.keys():
-        sub_df[cat_col] = sub_df[cat_col].map(mapping[cat_col])
+    # Keep categorical codes; codes without a label become NULL so that
+    # they do not violate the foreign key to the dimension table
+    for cat_col, col_map in CATEGORY_MAPPINGS.items():
+        codes = pd.to_numeric(sub_df[cat_col], errors="coerce")
+        sub_df[cat_col] = codes.where(codes.isin(col_map.keys())
+                                      ).astype("Int64")
 
     # Convert NA values to None (for psycopg2)
-    sub_df = sub_df.replace({pd.NA: None})
+    sub_df = sub_df.astype(object).where(pd.notnull(sub_df), None)
     print(f"{sub_df.shape[0]} non-empty rows found for Institutions table.")
 
     return sub_df
@@ -0,0 +1,94 @@
+"""
+Functions to transform chunks of the College Scorecard Field of Study csv
+into insert-ready dataframes for the Fields_Of_Study and Cip_Codes tables.
+"""
+import pandas as pd
+import load_data.util_package.logging as log
+
+# Credential levels of a program, loaded into Dim_CREDLEV
+CATEGORY_MAPPINGS = {
+    "CREDLEV": {
+        1: "Undergraduate Certificate or Diploma",
+        2: "Associate's Degree",
+        3: "Bachelor's Degree",
+        4: "Post-baccalaureate Certificate",
+        5: "Master's Degree",
+        6: "Doctoral Degree",
+        7: "First Professional Degree",
+        8: "Graduate/Professional Certificate"
+    }
+}
+
+# A program is one (institution, 4-digit CIP code, credential level)
+ID_COLS = ['UNITID', 'CIPCODE', 'CREDLEV']
+
+# Counts are stored as INTEGER, medians as FLOAT
+COUNT_COLS = ['IPEDSCOUNT1', 'IPEDSCOUNT2', 'DEBT_ALL_STGP_EVAL_N',
+              'EARN_COUNT_WNE_1YR', 'EARN_COUNT_WNE_4YR']
+MEDIAN_COLS = ['DEBT_ALL_STGP_EVAL_MDN', 'DEBT_ALL_STGP_EVAL_MDN10YRPAY',
+               'EARN_MDN_1YR', 'EARN_MDN_4YR']
+
+# Every column read from the file; the ~150 others are skipped
+READ_COLS = ID_COLS + ['CIPDESC'] + COUNT_COLS + MEDIAN_COLS
+
+
+def clean_fields_of_study(df, year):
+    """
+    Input: Chunk of the raw Field of Study csv (READ_COLS) and its year
+    Output: Cleaned dataframe containing columns for the Fields_Of_Study
+            table. Rows without a valid program key are dropped.
+    """
+    try:
+        sub_df = df[ID_COLS].apply(pd.to_numeric, errors="coerce")
+    except KeyError as e:
+        log.get_logger(__name__).error(
+            f"KeyError: Missing columns for fields of study - {e}",
+            exc_info=True)
+        raise KeyError(f"Missing required columns for fields of study: {e}")
+
+    # Older files lack some of the earnings columns: store them as NULL.
+    # PrivacySuppressed and other text markers become NULL as well
+    measures = df.reindex(columns=COUNT_COLS + MEDIAN_COLS)
+    measures = measures.apply(pd.to_numeric, errors="coerce")
+    sub_df = pd.concat([sub_df, measures], axis=1)
+    sub_df.insert(3, 'YEAR', int(year))
+
+    # The key columns are the primary key: drop rows where they are
+    # missing or the credential level is unknown, and keep the first
+    # row of a program listed twice in the chunk (load_fieldofstudy
+    # drops the programs already seen in earlier chunks)
+    valid = (sub_df[ID_COLS].notna().all(axis=1)
+             & sub_df['CREDLEV'].isin(CATEGORY_MAPPINGS['CREDLEV'].keys()))
+    sub_df = sub_df[valid].drop_duplicates(subset=ID_COLS)
+
+    # Integer columns as Int64 so that COPY gets 12, not 12.0
+    int_cols = ID_COLS + COUNT_COLS
+    sub_df[int_cols] = sub_df[int_cols].round().astype("Int64")
+
+    # Convert NA values to None (for psycopg2)
+    sub_df = sub_df.astype(object).where(pd.notnull(sub_df), None)
+    return sub_df
+
+
+def clean_cip_codes(df):
+    """
+    Input: Chunk of the raw Field of Study csv
+    Output: Cleaned dataframe of distinct CIPCODE, CIPDESC pairs
+            for the Cip_Codes table
+    """
+    try:
+        sub_df = df[['CIPCODE', 'CIPDESC']].copy()
+    except KeyError as e:
+        log.get_logger(__name__).error(
+            f"KeyError: Missing columns for CIP codes - {e}", exc_info=True)
+        raise KeyError(f"Missing required columns for CIP codes: {e}")
+
+    sub_df['CIPCODE'] = pd.to_numeric(sub_df['CIPCODE'], errors="coerce")
+    sub_df['CIPDESC'] = sub_df['CIPDESC'].astype("string").str.strip(" .")
+    sub_df = (sub_df.dropna()
+              .drop_duplicates(subset=['CIPCODE'])
+              .astype({'CIPCODE': int}))
+
+    # Convert NA values to None (for psycopg2)
+    sub_df = sub_df.astype(object).where(pd.notnull(sub_df), None)
+    return sub_df
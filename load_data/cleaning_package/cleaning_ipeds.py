@@ -7,6 +7,145 @@ import pandas as pd
 from load_data.util_package.ipeds_utils import rename_latest_carnegie_columns
 import load_data.util_package.logging as log
 
+# Mapping settings for categorical columns (Carnegie + CBSA).
+# Institutions_IPEDS stores the codes; these labels are loaded once
+# into the Dim_<column> dimension tables (see sql_queries.py)
+CATEGORY_MAPPINGS = {
+    "C_BASIC": {
+        -2: "Not applicable",
+        0: "(Not classified)",
+        1: "Associate's Colleges: High Transfer-High Traditional",
+        2: "Associate's Colleges: "
+        "High Transfer-Mixed Traditional/Nontraditional",
+        3: "Associate's Colleges: High Transfer-High Nontraditional",
+        4: "Associate's Colleges: "
+        "Mixed Transfer/Career & Technical-High Traditional",
+        5: "Associate's Colleges: Mixed Transfer/Career "
+        "& Technical-Mixed Traditional/Nontraditional",
+        6: "Associate's Colleges: "
+        "Mixed Transfer/Career & Technical-High Nontraditional",
+        7: "Associate's Colleges: "
+        "High Career & Technical-High Traditional",
+        8: "Associate's Colleges: "
+        "High Career & Technical-Mixed Traditional/Nontraditional",
+        9: "Associate's Colleges: "
+        "High Career & Technical-High Nontraditional",
+        10: "Special Focus Two-Year: Health Professions",
+        11: "Special Focus Two-Year: Technical Professions",
+        12: "Special Focus Two-Year: Arts & Design",
+        13: "Special Focus Two-Year: Other Fields",
+        14: "Baccalaureate/Associate's Colleges: Associate's Dominant",
+        15: "Doctoral Universities: Very High Research Activity",
+        16: "Doctoral Universities: High Research Activity",
+        17: "Doctoral/Professional Universities",
+        18: "Master's Colleges & Universities: Larger Programs",
+        19: "Master's Colleges & Universities: Medium Programs",
+        20: "Master's Colleges & Universities: Small Programs",
+        21: "Baccalaureate Colleges: Arts & Sciences Focus",
+        22: "Baccalaureate Colleges: Diverse Fields",
+        23: "Baccalaureate/Associate's Colleges: "
+        "Mixed Baccalaureate/Associate's",
+        24: "Special Focus Four-Year: Faith-Related Institutions",
+        25: "Special Focus Four-Year: Medical Schools & Centers",
+        26: "Special Focus Four-Year: Other Health Professions Schools",
+        27: "Special Focus Four-Year: Research Institution",
+        28: "Special Focus Four-Year: "
+        "Engineering and Other Technology-Related Schools",
+        29: "Special Focus Four-Year: Business & Management Schools",
+        30: "Special Focus Four-Year: Arts, Music & Design Schools",
+        31: "Special Focus Four-Year: Law Schools",
+        32: "Special Focus Four-Year: Other Special Focus Institutions",
+        33: "Tribal Colleges"
+    },
+    "C_UGPRF": {
+        -2: "Not applicable",
+        0: "Not classified (Exclusively Graduate)",
+        1: "Two-year, higher part-time",
+        2: "Two-year, mixed part/full-time",
+        3: "Two-year, medium full-time",
+        4: "Two-year, higher full-time",
+        5: "Four-year, higher part-time",
+        6: "Four-year, medium full-time, inclusive, lower transfer-in",
+        7: "Four-year, medium full-time, inclusive, higher transfer-in",
+        8: "Four-year, medium full-time, selective, lower transfer-in",
+        9: "Four-year, medium full-time, selective, higher transfer-in",
+        10: "Four-year, full-time, inclusive, lower transfer-in",
+        11: "Four-year, full-time, inclusive, higher transfer-in",
+        12: "Four-year, full-time, selective, lower transfer-in",
+        13: "Four-year, full-time, selective, higher transfer-in",
+        14: "Four-year, full-time, more selective, lower transfer-in",
+        15: "Four-year, full-time, more selective, higher transfer-in"
+    },
+    "C_SZSET": {
+        -2: "Not applicable",
+        0: "(Not classified)",
+        1: "Two-year, very small",
+        2: "Two-year, small",
+        3: "Two-year, medium",
+        4: "Two-year, large",
+        5: "Two-year, very large",
+        6: "Four-year, very small, primarily nonresidential",
+        7: "Four-year, very small, primarily residential",
+        8: "Four-year, very small, highly residential",
+        9: "Four-year, small, primarily nonresidential",
+        10: "Four-year, small, primarily residential",
+        11: "Four-year, small, highly residential",
+        12: "Four-year, medium, primarily nonresidential",
+        13: "Four-year, medium, primarily residential",
+        14: "Four-year, medium, highly residential",
+        15: "Four-year, large, primarily nonresidential",
+        16: "Four-year, large, primarily residential",
+        17: "Four-year, large, highly residential",
+        18: "Exclusively graduate/professional"
+    },
+    "C_ENPRF": {
+        1: "Exclusively undergraduate two-year",
+        2: "Exclusively undergraduate four-year",
+        3: "Very high undergraduate",
+        4: "High undergraduate",
+        5: "Majority undergraduate",
+        6: "Majority graduate",
+        7: "Exclusively graduate",
+        8: "(Not classified)",
+        9: "Not applicable, not in Carnegie universe "
+        "(not accredited or nondegree-granting)"
+    },
+    "C_IPUG": {
+        1: "Associate's Colleges: High Transfer",
+        2: "Associate's Colleges: Mixed Transfer/Career & Technical",
+        3: "Associate's Colleges: High Career & Technical",
+        4: "Special Focus: Two-Year Institution",
+        5: "Baccalaureate/Associates Colleges",
+        6: "Arts & sciences focus, no graduate coexistence",
+        7: "Arts & sciences focus, some graduate coexistence",
+        8: "Arts & sciences focus, high graduate coexistence",
+        9: "Arts & sciences plus professions, no graduate coexistence",
+        10: "Arts & sciences plus professions, some graduate coexistence",
+        11: "Arts & sciences plus professions, high graduate coexistence",
+        12: "Balanced arts & sciences/professions, "
+        "no graduate coexistence",
+        13: "Balanced arts & sciences/professions, "
+        "some graduate coexistence",
+        14: "Balanced arts & sciences/professions, "
+        "high graduate coexistence",
+        15: "Professions plus arts & sciences, no graduate coexistence",
+        16: "Professions plus arts & sciences, some graduate coexistence",
+        17: "Professions plus arts & sciences, high graduate coexistence",
+        18: "Professions focus, no graduate coexistence",
+        19: "Professions focus, some graduate coexistence",
+        20: "Professions focus, high graduate coexistence",
+        21: "Not Classified (Exclusively Graduate Programs)",
+        22: "Not applicable, not in Carnegie universe "
+        "(not accredited or nondegree-granting)"
+    },
+    "CBSATYPE": {
+        1: "Metropolitan Statistical Area",
+        2: "Micropolitan Statistical Area",
+        -2: "Not applicable",
+        -3: "Not available"
+    }
+}
+
 
 def clean_directory(df):
     """
@@ -40,143 +179,6 @@ def clean_directory(df):
         # we'll add LAST_REPORTED after
     ]
 
-    # Mapping settings for categorical columns (Carnegie + CBSA)
-    mapping = {
-        "C_BASIC": {
-            -2: "Not applicable",
-            0: "(Not classified)",
-            1: "Associate's Colleges: High Transfer-High Traditional",
-            2: "Associate's Colleges: "
-            "High Transfer-Mixed Traditional/Nontraditional",
-            3: "Associate's Colleges: High Transfer-High Nontraditional",
-            4: "Associate's Colleges: "
-            "Mixed Transfer/Career & Technical-High Traditional",
-            5: "Associate's Colleges: Mixed Transfer/Career "
-            "& Technical-Mixed Traditional/Nontraditional",
-            6: "Associate's Colleges: "
-            "Mixed Transfer/Career & Technical-High Nontraditional",
-            7: "Associate's Colleges: "
-            "High Career & Technical-High Traditional",
-            8: "Associate's Colleges: "
-            "High Career & Technical-Mixed Traditional/Nontraditional",
-            9: "Associate's Colleges: "
-            "High Career & Technical-High Nontraditional",
-            10: "Special Focus Two-Year: Health Professions",
-            11: "Special Focus Two-Year: Technical Professions",
-            12: "Special Focus Two-Year: Arts & Design",
-            13: "Special Focus Two-Year: Other Fields",
-            14: "Baccalaureate/Associate's Colleges: Associate's Dominant",
-            15: "Doctoral Universities: Very High Research Activity",
-            16: "Doctoral Universities: High Research Activity",
-            17: "Doctoral/Professional Universities",
-            18: "Master's Colleges & Universities: Larger Programs",
-            19: "Master's Colleges & Universities: Medium Programs",
-            20: "Master's Colleges & Universities: Small Programs",
-            21: "Baccalaureate Colleges: Arts & Sciences Focus",
-            22: "Baccalaureate Colleges: Diverse Fields",
-            23: "Baccalaureate/Associate's Colleges: "
-            "Mixed Baccalaureate/Associate's",
-            24: "Special Focus Four-Year: Faith-Related Institutions",
-            25: "Special Focus Four-Year: Medical Schools & Centers",
-            26: "Special Focus Four-Year: Other Health Professions Schools",
-            27: "Special Focus Four-Year: Research Institution",
-            28: "Special Focus Four-Year: "
-            "Engineering and Other Technology-Related Schools",
-            29: "Special Focus Four-Year: Business & Management Schools",
-            30: "Special Focus Four-Year: Arts, Music & Design Schools",
-            31: "Special Focus Four-Year: Law Schools",
-            32: "Special Focus Four-Year: Other Special Focus Institutions",
-            33: "Tribal Colleges"
-        },
-        "C_UGPRF": {
-            -2: "Not applicable",
-            0: "Not classified (Exclusively Graduate)",
-            1: "Two-year, higher part-time",
-            2: "Two-year, mixed part/full-time",
-            3: "Two-year, medium full-time",
-            4: "Two-year, higher full-time",
-            5: "Four-year, higher part-time",
-            6: "Four-year, medium full-time, inclusive, lower transfer-in",
-            7: "Four-year, medium full-time, inclusive, higher transfer-in",
-            8: "Four-year, medium full-time, selective, lower transfer-in",
-            9: "Four-year, medium full-time, selective, higher transfer-in",
-            10: "Four-year, full-time, inclusive, lower transfer-in",
-            11: "Four-year, full-time, inclusive, higher transfer-in",
-            12: "Four-year, full-time, selective, lower transfer-in",
-            13: "Four-year, full-time, selective, higher transfer-in",
-            14: "Four-year, full-time, more selective, lower transfer-in",
-            15: "Four-year, full-time, more selective, higher transfer-in"
-        },
-        "C_SZSET": {
-            -2: "Not applicable",
-            0: "(Not classified)",
-            1: "Two-year, very small",
-            2: "Two-year, small",
-            3: "Two-year, medium",
-            4: "Two-year, large",
-            5: "Two-year, very large",
-            6: "Four-year, very small, primarily nonresidential",
-            7: "Four-year, very small, primarily residential",
-            8: "Four-year, very small, highly residential",
-            9: "Four-year, small, primarily nonresidential",
-            10: "Four-year, small, primarily residential",
-            11: "Four-year, small, highly residential",
-            12: "Four-year, medium, primarily nonresidential",
-            13: "Four-year, medium, primarily residential",
-            14: "Four-year, medium, highly residential",
-            15: "Four-year, large, primarily nonresidential",
-            16: "Four-year, large, primarily residential",
-            17: "Four-year, large, highly residential",
-            18: "Exclusively graduate/professional"
-        },
-        "C_ENPRF": {
-            1: "Exclusively undergraduate two-year",
-            2: "Exclusively undergraduate four-year",
-            3: "Very high undergraduate",
-            4: "High undergraduate",
-            5: "Majority undergraduate",
-            6: "Majority graduate",
-            7: "Exclusively graduate",
-            8: "(Not classified)",
-            9: "Not applicable, not in Carnegie universe "
-            "(not accredited or nondegree-granting)"
-        },
-        "C_IPUG": {
-            1: "Associate's Colleges: High Transfer",
-            2: "Associate's Colleges: Mixed Transfer/Career & Technical",
-            3: "Associate's Colleges: High Career & Technical",
-            4: "Special Focus: Two-Year Institution",
-            5: "Baccalaureate/Associates Colleges",
-            6: "Arts & sciences focus, no graduate coexistence",
-            7: "Arts & sciences focus, some graduate coexistence",
-            8: "Arts & sciences focus, high graduate coexistence",
-            9: "Arts & sciences plus professions, no graduate coexistence",
-            10: "Arts & sciences plus professions, some graduate coexistence",
-            11: "Arts & sciences plus professions, high graduate coexistence",
-            12: "Balanced arts & sciences/professions, "
-            "no graduate coexistence",
-            13: "Balanced arts & sciences/professions, "
-            "some graduate coexistence",
-            14: "Balanced arts & sciences/professions, "
-            "high graduate coexistence",
-            15: "Professions plus arts & sciences, no graduate coexistence",
-            16: "Professions plus arts & sciences, some graduate coexistence",
-            17: "Professions plus arts & sciences, high graduate coexistence",
-            18: "Professions focus, no graduate coexistence",
-            19: "Professions focus, some graduate coexistence",
-            20: "Professions focus, high graduate coexistence",
-            21: "Not Classified (Exclusively Graduate Programs)",
-            22: "Not applicable, not in Carnegie universe "
-            "(not accredited or nondegree-granting)"
-        },
-        "CBSATYPE": {
-            1: "Metropolitan Statistical Area",
-            2: "Micropolitan Statistical Area",
-            -2: "Not applicable",
-            -3: "Not available"
-        }
-    }
-
     try:
         sub_df = df[main_cols].copy()
     except KeyError as e:
@@ -191,11 +193,13 @@ def clean_directory(df):
     if 'LONGITUD' in sub_df.columns:
         sub_df.rename(columns={'LONGITUD': 'LONGITUDE'}, inplace=True)
 
-    # Map categorical variables (Carnegie + CBSA)
-    for cat_col, col_map in mapping.items():
+    # Keep categorical codes (Carnegie + CBSA); codes without a label
+    # become NULL so that they do not violate the dimension foreign keys
+    for cat_col, col_map in CATEGORY_MAPPINGS.items():
         if cat_col in sub_df.columns:
-            sub_df[cat_col] = pd.to_numeric(sub_df[cat_col], errors="coerce")
-            sub_df[cat_col] = sub_df[cat_col].map(col_map)
+            codes = pd.to_numeric(sub_df[cat_col], errors="coerce")
+            sub_df[cat_col] = codes.where(codes.isin(col_map.keys())
+                                          ).astype("Int64")
 
     # ZIP cleaning – first 5 chars
     if 'ZIP' in sub_df.columns:
@@ -232,3 +236,94 @@ def clean_directory(df):
     )
 
     return sub_df
+
+
+# Survey components beyond HD (registered in ipeds_components.py).
+# Key columns identify a row together with YEAR; every value column is
+# a count, percentage or dollar amount stored as an integer.
+ENROLLMENT_KEYS = ['UNITID', 'EFALEVEL']
+ENROLLMENT_COLS = ['EFTOTLT', 'EFTOTLM', 'EFTOTLW', 'EFAIANT', 'EFASIAT',
+                   'EFBKAAT', 'EFHISPT', 'EFNHPIT', 'EFWHITT', 'EF2MORT',
+                   'EFUNKNT', 'EFNRALT']
+
+SALARIES_KEYS = ['UNITID', 'ARANK']
+SALARIES_COLS = ['SAINSTT', 'SAINSTM', 'SAINSTW', 'SA09MCT', 'SAOUTLT',
+                 'SA09MAT', 'SA09MAM', 'SA09MAW']
+
+AID_KEYS = ['UNITID']
+AID_COLS = ['UAGRNTN', 'UAGRNTP', 'UAGRNTA', 'UPGRNTN', 'UPGRNTP',
+            'UPGRNTA', 'UFLOANN', 'UFLOANP', 'UFLOANA']
+
+GRADUATION_KEYS = ['UNITID', 'GRTYPE']
+GRADUATION_COLS = ['CHRTSTAT', 'SECTION', 'COHORT', 'GRTOTLT', 'GRTOTLM',
+                   'GRTOTLW']
+
+
+def clean_component(df, year, key_cols, value_cols, table_name):
+    """
+    Input: Chunk of a raw IPEDS component csv, its year, and the key and
+           value columns of the component's table
+    Output: Cleaned dataframe with the key columns, YEAR and the value
+            columns as integers. Rows with a missing key are dropped,
+            value columns missing from the file are NULL.
+    """
+    df = df.rename(columns=str.upper)
+    try:
+        keys = df[key_cols].apply(pd.to_numeric, errors="coerce")
+    except KeyError as e:
+        log.get_logger(__name__).error(
+            f"KeyError: Missing columns for {table_name} - {e}",
+            exc_info=True)
+        raise KeyError(f"Missing required columns for {table_name}: {e}")
+
+    values = df.reindex(columns=value_cols).apply(pd.to_numeric,
+                                                  errors="coerce")
+    sub_df = pd.concat([keys, values], axis=1)
+    sub_df.insert(len(key_cols), 'YEAR', int(year))
+
+    # Keys form the primary key: no NULLs, no duplicates
+    sub_df = (sub_df.dropna(subset=key_cols)
+              .drop_duplicates(subset=key_cols))
+
+    # Int64 so that COPY gets 12, not 12.0
+    int_cols = key_cols + value_cols
+    sub_df[int_cols] = sub_df[int_cols].round().astype("Int64")
+
+    # Convert pandas NA to Python None (for psycopg2)
+    sub_df = sub_df.astype(object).where(pd.notnull(sub_df), None)
+    return sub_df
+
+
+def clean_enrollment(df, year):
+    """
+    Input: Chunk of the raw IPEDS EF (part A) csv and its year
+    Output: Cleaned dataframe for the Enrollment_IPEDS table
+    """
+    return clean_component(df, year, ENROLLMENT_KEYS, ENROLLMENT_COLS,
+                           "Enrollment_IPEDS")
+
+
+def clean_salaries(df, year):
+    """
+    Input: Chunk of the raw IPEDS SAL (instructional staff) csv and its year
+    Output: Cleaned dataframe for the Salaries_IPEDS table
+    """
+    return clean_component(df, year, SALARIES_KEYS, SALARIES_COLS,
+                           "Salaries_IPEDS")
+
+
+def clean_aid(df, year):
+    """
+    Input: Chunk of the raw IPEDS SFA csv and its year
+    Output: Cleaned dataframe for the Aid_IPEDS table
+    """
+    return clean_component(df, year, AID_KEYS, AID_COLS, "Aid_IPEDS")
+
+
+def clean_graduation(df, year):
+    """
+    Input: Chunk of the raw IPEDS GR csv and its year
+    Output: Cleaned dataframe for the Graduation_IPEDS table
+    """
+    return clean_component(df, year, GRADUATION_KEYS, GRADUATION_COLS,
+                           "Graduation_IPEDS")
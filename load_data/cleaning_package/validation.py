@@ -0,0 +1,172 @@
+"""
+Functions to validate cleaned dataframes against the table constraints
+before they are written to the database.
+
+The rules below mirror the NOT NULL, CHECK and REFERENCES clauses of the
+CREATE statements in sql_queries.py, so every row that would make the
+database reject a whole table is caught here in a single vectorized pass.
+"""
+import datetime
+import pandas as pd
+import load_data.util_package.logging as log
+
+# Upper bound used by the YEAR / LAST_REPORTED checks
+CURRENT_YEAR = datetime.date.today().year
+
+UGDS_RACE_COLS = ['UGDS_WHITE', 'UGDS_BLACK', 'UGDS_HISP', 'UGDS_ASIAN',
+                  'UGDS_AIAN', 'UGDS_NHPI', 'UGDS_2MOR', 'UGDS_UNKN']
+IRPS_RACE_COLS = ['IRPS_WHITE', 'IRPS_BLACK', 'IRPS_HISP', 'IRPS_ASIAN',
+                  'IRPS_AIAN', 'IRPS_NHPI', 'IRPS_2MOR', 'IRPS_UNKN']
+
+# Rules per table:
+#   not_null : columns declared NOT NULL
+#   ranges   : column -> (low, high, strict_low); None means unbounded
+#   sums     : rule name -> columns whose sum must be below 1.1
+#   fk       : True if UNITID must exist in Institutions
+TABLE_RULES = {
+    "Institutions": {
+        "not_null": ['UNITID', 'OPEID', 'LAST_REPORTED'],
+        "ranges": {
+            'LAST_REPORTED': (None, CURRENT_YEAR, False)
+        }
+    },
+    "Institutions_IPEDS": {
+        "not_null": ['UNITID', 'INSTNM', 'ADDR', 'CITY', 'STABBR', 'ZIP',
+                     'LAST_REPORTED'],
+        "ranges": {
+            'LAST_REPORTED': (None, CURRENT_YEAR, False)
+        }
+    },
+    "Financials": {
+        "ranges": {
+            'YEAR': (None, CURRENT_YEAR, False),
+            'TUITIONFEE_IN': (0, None, False),
+            'TUITIONFEE_OUT': (0, None, False),
+            'TUITIONFEE_PROG': (0, None, False),
+            'TUITFTE': (0, None, False),
+            'AVGFACSAL': (0, None, True),
+            'CDR2': (0, None, False),
+            'CDR3': (0, None, False)
+        },
+        "fk": True
+    },
+    "Academics": {
+        "ranges": {
+            'YEAR': (None, CURRENT_YEAR, False),
+            'ADM_RATE': (0, 1, False),
+            'C100_4': (0, 1, False),
+            'C100_L4': (0, 1, False),
+            'SAT_AVG': (0, 1600, False),
+            'COUNT_NWNE_3YR': (0, None, False),
+            'COUNT_WNE_3YR': (0, None, False),
+            'CNTOVER150_3YR': (0, None, False)
+        },
+        "fk": True
+    },
+    "Demographics": {
+        "ranges": {
+            'YEAR': (None, CURRENT_YEAR, False),
+            'UGDS': (0, None, False),
+            **{col: (0, 1, False) for col in
+               ['UGDS_MEN', 'UGDS_WOMEN'] + UGDS_RACE_COLS +
+               ['IRPS_MEN', 'IRPS_WOMEN'] + IRPS_RACE_COLS}
+        },
+        "sums": {
+            "UGDS_RACE_SUM": UGDS_RACE_COLS,
+            "IRPS_RACE_SUM": IRPS_RACE_COLS
+        },
+        "fk": True
+    }
+}
+
+
+def build_rule_masks(df, table_name, known_unitids=None):
+    """
+    Evaluate every rule of a table against a cleaned dataframe.
+
+    Input: cleaned dataframe, table name (key of TABLE_RULES) and the
+           UNITIDs that exist in Institutions (for the FK rule)
+    Output: boolean dataframe with one column per rule,
+            True where the row violates that rule
+    """
+    rules = TABLE_RULES[table_name]
+    masks = {}
+
+    for col in rules.get("not_null", []):
+        masks[f"NOT_NULL_{col}"] = df[col].isna()
+
+    # NULL values pass a CHECK, and comparisons with NaN are False,
+    # so missing values are never flagged by range or sum rules
+    for col, (low, high, strict_low) in rules.get("ranges", {}).items():
+        values = pd.to_numeric(df[col], errors="coerce")
+        bad = pd.Series(False, index=df.index)
+        if low is not None:
+            bad |= (values <= low) if strict_low else (values < low)
+        if high is not None:
+            bad |= values > high
+        masks[f"CHECK_{col}"] = bad
+
+    for rule_name, cols in rules.get("sums", {}).items():
+        values = df[cols].apply(pd.to_numeric, errors="coerce")
+        total = values.sum(axis=1, min_count=len(cols))
+        masks[f"CHECK_{rule_name}"] = (total - 1) >= 0.1
+
+    if rules.get("fk") and known_unitids is not None:
+        unitids = pd.to_numeric(df['UNITID'], errors="coerce")
+        masks["FK_UNITID"] = ~unitids.isin(known_unitids)
+
+    return pd.DataFrame(masks, index=df.index)
+
+
+def validate(df, table_name, known_unitids=None):
+    """
+    Split a cleaned dataframe into rows that satisfy every rule of the table
+    and rows that would be rejected by the database.
+
+    Input: cleaned dataframe, table name (key of TABLE_RULES) and the
+           UNITIDs that exist in Institutions (for the FK rule)
+    Output: (valid dataframe, quarantine dataframe) where the quarantine
+            dataframe matches the columns of INSERT_QUARANTINE
+    """
+    try:
+        masks = build_rule_masks(df, table_name, known_unitids)
+    except KeyError as e:
+        log.get_logger(__name__).error(
+            f"KeyError: Missing columns for {table_name} validation - {e}",
+            exc_info=True)
+        raise KeyError(
+            f"Missing required columns for {table_name} validation: {e}")
+
+    invalid = masks.any(axis=1)
+    valid_df = df[~invalid]
+    bad_rows = df[invalid]
+    bad_masks = masks[invalid]
+
+    # "RULE_A;RULE_B" for every offending row, without a Python loop
+    rule_names = (bad_masks.astype(object)
+                  .dot(pd.Index(masks.columns) + ";")
+                  .str.rstrip(";"))
+    year_col = 'YEAR' if 'YEAR' in df.columns else 'LAST_REPORTED'
+    quarantine_df = pd.DataFrame({
+        'TABLE_NAME': table_name,
+        'UNITID': bad_rows['UNITID'],
+        'YEAR': bad_rows[year_col],
+        'RULES': rule_names,
+        'ROW_DATA': (bad_rows.to_json(orient="records", lines=True)
+                     .splitlines() if len(bad_rows) else [])
+    }, index=bad_rows.index)
+    quarantine_df = quarantine_df.astype(object).where(
+        pd.notnull(quarantine_df), None)
+
+    if len(bad_rows):
+        counts = bad_masks.sum()
+        counts = counts[counts > 0]
+        print(f"{len(bad_rows)} rows failed validation for {table_name}:")
+        for rule_name, count in counts.items():
+            print(f"    {rule_name}: {count}")
+        log.get_logger(__name__).warning(
+            f"{len(bad_rows)} rows quarantined for {table_name}: "
+            f"{counts.to_dict()}")
+    print(f"{valid_df.shape[0]} valid rows found for {table_name} table.")
+
+    return valid_df, quarantine_df
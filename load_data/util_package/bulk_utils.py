@@ -0,0 +1,359 @@
+'''Utilities file with functions to bulk load data with COPY
+and to reload tables through shadow copies or partitions swapped in'''
+import re
+import time
+import pandas as pd
+from psycopg import sql
+import load_data.util_package.logging as log
+import load_data.util_package.sql_queries as queries
+
+SHADOW_SUFFIX = "_shadow"
+OLD_SUFFIX = "_old"
+
+# Longest wait for running dashboard queries before the swap gives up
+SWAP_LOCK_TIMEOUT = "5s"
+
+
+# Target table and column list of an INSERT statement, also when it
+# follows a WITH clause (the *_HISTORY upserts)
+INSERT_PATTERN = re.compile(r"INSERT\s+INTO\s+(\w+)\s*(?:\(([^)]*)\))?",
+                            re.IGNORECASE)
+
+
+def insert_table_name(query):
+    """
+    Table an INSERT statement of sql_queries.py writes to.
+    """
+    match = INSERT_PATTERN.search(query)
+    if match is None:
+        raise ValueError("Not an INSERT statement: " + query[:60])
+    return match.group(1)
+
+
+def insert_columns(query):
+    """
+    Column names listed by an INSERT statement of sql_queries.py.
+    """
+    match = INSERT_PATTERN.search(query)
+    if match is None or match.group(2) is None:
+        raise ValueError("INSERT statement without a column list: "
+                         + query[:60])
+    return [col.strip() for col in match.group(2).split(",")]
+
+
+def copy_dataframe(cur, table_name, columns, df):
+    """
+    Bulk load a DataFrame into a table with COPY.
+
+    Parameters
+    ----------
+    cur : psycopg.Cursor
+        Cursor of the connection (and transaction) to load with.
+    table_name : str
+        Table to load into.
+    columns : list of str
+        Table columns, in the order of the DataFrame columns.
+    df : pandas.DataFrame
+        Clean data; missing values are written as NULL.
+
+    Returns
+    -------
+    int
+        Number of rows copied.
+    """
+    statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table_name.lower()),
+        sql.SQL(", ").join(sql.Identifier(col.lower()) for col in columns))
+    # object dtype keeps integer columns as Python ints next to floats
+    rows = df.astype(object).where(pd.notnull(df), None).values.tolist()
+    with cur.copy(statement) as copy:
+        for row in rows:
+            copy.write_row(row)
+    return df.shape[0]
+
+
+def _point_references(definition, swapped):
+    """
+    Make a foreign key definition reference the shadow of a table that is
+    swapped in the same reload, e.g. REFERENCES institutions(unitid) ->
+    REFERENCES institutions_shadow(unitid).
+    """
+    def _shadow(match):
+        schema, table = match.group(1) or "", match.group(2)
+        if table in swapped:
+            table += SHADOW_SUFFIX
+        return f"REFERENCES {schema}{table}("
+    return re.sub(r"REFERENCES (\w+\.)?(\w+)\(", _shadow, definition)
+
+
+def build_shadow(conn, table_name, insert_query, df, fill_queries, year,
+                 swapped):
+    """
+    Build the new version of a table in an UNLOGGED shadow table next to
+    the live one, without blocking its readers.
+
+    The file's rows are copied into a staging table, `fill_queries` fill
+    the shadow from the live table and the staging table, and then the
+    shadow is made durable, gets the constraints and indexes of the live
+    table and is analyzed.
+
+    Returns
+    -------
+    list of tuple
+        (kind, table, temporary name, final name) of the constraints and
+        indexes to rename once the shadow is swapped in.
+    """
+    table = table_name.lower()
+    shadow = table + SHADOW_SUFFIX
+    names = {"table": table, "shadow": shadow, "staging": table + "_staging"}
+    # trailing columns filled by NOW() in the INSERT (LAST_UPDATED)
+    # are not part of the cleaned data
+    columns = insert_columns(insert_query)[:df.shape[1]]
+    renames = []
+
+    with conn.transaction(), conn.cursor() as cur:
+        cur.execute(queries.CREATE_SHADOW.format(**names))
+        cur.execute(queries.CREATE_STAGING.format(**names))
+        copy_dataframe(cur, names["staging"], columns, df)
+        for fill in fill_queries:
+            cur.execute(fill.format(columns=", ".join(columns), **names),
+                        {"year": int(year)} if "%(year)s" in fill else None)
+
+        # the rows are in: make the table crash safe, then index it
+        cur.execute(sql.SQL("ALTER TABLE {} SET LOGGED").format(
+            sql.Identifier(shadow)))
+
+        cur.execute(queries.SELECT_TABLE_CONSTRAINTS, (table,))
+        for conname, contype, definition in cur.fetchall():
+            if contype == "f":
+                definition = _point_references(definition, swapped)
+                name = conname
+            else:
+                # index names must be unique next to the live table's
+                name = conname + SHADOW_SUFFIX
+                renames.append(("CONSTRAINT", table, name, conname))
+            cur.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+                sql.Identifier(shadow), sql.Identifier(name),
+                sql.SQL(definition)))
+
+        cur.execute(queries.SELECT_TABLE_INDEXES, (table,))
+        for indexname, definition in cur.fetchall():
+            name = indexname + SHADOW_SUFFIX
+            definition = definition.replace(f"INDEX {indexname} ON",
+                                            f"INDEX {name} ON", 1)
+            definition = re.sub(rf" ON (ONLY )?(\w+\.)?{table} ",
+                                rf" ON \g<1>\g<2>{shadow} ", definition,
+                                count=1)
+            cur.execute(definition)
+            renames.append(("INDEX", None, name, indexname))
+
+        cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(shadow)))
+    return renames
+
+
+def swap_tables(conn, table_names, renames):
+    """
+    Swap the shadow tables in for the live ones in one short transaction:
+    the live tables are renamed away and dropped, the shadows take their
+    names. Readers see either every old table or every new one.
+
+    Foreign keys of other tables referencing a swapped table are moved
+    to the new table and validated afterwards without blocking.
+    """
+    tables = [name.lower() for name in table_names]
+    with conn.transaction(), conn.cursor() as cur:
+        # do not queue dashboard queries behind the lock for long
+        cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+        cur.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(
+            sql.SQL(", ").join(map(sql.Identifier, tables))))
+
+        outside = []
+        for table in tables:
+            cur.execute(queries.SELECT_REFERENCING_FOREIGN_KEYS,
+                        (table, tables))
+            outside += cur.fetchall()
+        for referencing, conname, _ in outside:
+            cur.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+                sql.SQL(referencing), sql.Identifier(conname)))
+
+        for table in tables:
+            cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                sql.Identifier(table), sql.Identifier(table + OLD_SUFFIX)))
+            cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                sql.Identifier(table + SHADOW_SUFFIX), sql.Identifier(table)))
+        cur.execute(sql.SQL("DROP TABLE {}").format(
+            sql.SQL(", ").join(sql.Identifier(table + OLD_SUFFIX)
+                               for table in tables)))
+
+        for kind, table, name, final in renames:
+            if kind == "CONSTRAINT":
+                cur.execute(sql.SQL(
+                    "ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                    sql.Identifier(table), sql.Identifier(name),
+                    sql.Identifier(final)))
+            else:
+                cur.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                    sql.Identifier(name), sql.Identifier(final)))
+
+        for referencing, conname, definition in outside:
+            cur.execute(sql.SQL(
+                "ALTER TABLE {} ADD CONSTRAINT {} {} NOT VALID").format(
+                sql.SQL(referencing), sql.Identifier(conname),
+                sql.SQL(definition)))
+
+    # checked without blocking readers or writers of either table
+    for referencing, conname, _ in outside:
+        with conn.transaction(), conn.cursor() as cur:
+            cur.execute(sql.SQL("ALTER TABLE {} VALIDATE CONSTRAINT {}")
+                        .format(sql.SQL(referencing), sql.Identifier(conname)))
+
+
+def reload_with_swap(get_connection, jobs, year):
+    """
+    Reload several tables together: build a shadow of each one, then swap
+    them all in at once. Nothing changes for readers until the swap, and
+    if any step fails the live tables are left untouched.
+
+    Parameters
+    ----------
+    get_connection : callable
+        Connection factory of the loader's utilities module.
+    jobs : list of (str, str, pandas.DataFrame, list of str)
+        Table name, INSERT statement (for its column list), clean data and
+        the fill queries of each table, referenced tables first.
+    year : str or int
+        Year of the data, for the fill queries that replace a year slice.
+
+    Returns
+    -------
+    dict
+        Table name -> number of rows loaded from the file.
+    """
+    swapped = [table_name.lower() for table_name, _, _, _ in jobs]
+    conn = get_connection()
+    try:
+        renames = []
+        for table_name, insert_query, df, fill_queries in jobs:
+            start_time = time.time()
+            renames += build_shadow(conn, table_name, insert_query, df,
+                                    fill_queries, year, swapped)
+            print(f"SUCCESS: {table_name} shadow built with",
+                  f"{df.shape[0]} new rows in",
+                  f"{time.time() - start_time:.1f} seconds")
+
+        start_time = time.time()
+        swap_tables(conn, swapped, renames)
+        print(f"SUCCESS: {', '.join(t for t, _, _, _ in jobs)} swapped in",
+              f"{time.time() - start_time:.3f} seconds\n")
+    except Exception as e:
+        log.get_logger(__name__).error(
+            f"Swap reload failed: {e}", exc_info=True)
+        print(f"Swap reload failed, live tables unchanged: {e}")
+        # do not leave the shadow tables behind
+        if not conn.closed:
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(
+                    sql.SQL(", ").join(sql.Identifier(table + SHADOW_SUFFIX)
+                                       for table in swapped)))
+        raise
+    finally:
+        conn.close()
+
+    return {table_name: df.shape[0] for table_name, _, df, _ in jobs}
+
+
+def load_year_partition(get_connection, table_name, year, chunks):
+    """
+    Bulk load one year of a table partitioned BY LIST (YEAR), for files
+    too large to hold in memory or to insert row by row.
+
+    The chunks are copied into a standalone table (one commit per chunk),
+    which then gets the parent's keys and indexes, is analyzed and is
+    attached in place of the year's partition in one short transaction.
+    Readers see the previous version of the year until then, and if any
+    step fails the live partition is left untouched.
+
+    Parameters
+    ----------
+    get_connection : callable
+        Connection factory of the loader's utilities module.
+    table_name : str
+        Partitioned table to load, e.g. Fields_Of_Study.
+    year : str or int
+        Year of the data (the partition's value).
+    chunks : iterable of pandas.DataFrame
+        Clean data with the table's column names, e.g. cleaned chunks
+        of file_utils.read_csv_chunks.
+
+    Returns
+    -------
+    int
+        Number of rows loaded.
+    """
+    table = table_name.lower()
+    partition = f"{table}_{int(year)}"
+    staging = partition + "_load"
+    conn = get_connection()
+    try:
+        with conn.transaction(), conn.cursor() as cur:
+            # left behind by an earlier run that failed
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(
+                sql.Identifier(staging)))
+            cur.execute(queries.CREATE_PARTITION_LOAD.format(
+                table=table, partition=partition, year=int(year)))
+
+        start_time = time.time()
+        nrows = 0
+        for chunk in chunks:
+            with conn.transaction(), conn.cursor() as cur:
+                nrows += copy_dataframe(cur, staging, list(chunk.columns),
+                                        chunk)
+            print(f"{nrows} rows copied into {staging}", end="\r")
+        print(f"SUCCESS: {nrows} rows copied into {staging} in",
+              f"{time.time() - start_time:.1f} seconds")
+
+        # keys and indexes are built once over the loaded rows; matching
+        # the parent's, they are attached as its partitions' indexes
+        with conn.transaction(), conn.cursor() as cur:
+            cur.execute(queries.SELECT_TABLE_CONSTRAINTS, (table,))
+            for conname, contype, definition in cur.fetchall():
+                if contype in ("p", "u"):
+                    cur.execute(sql.SQL("ALTER TABLE {} ADD {}").format(
+                        sql.Identifier(staging), sql.SQL(definition)))
+            cur.execute(queries.SELECT_TABLE_INDEXES, (table,))
+            for indexname, definition in cur.fetchall():
+                definition = definition.replace(
+                    f"INDEX {indexname} ON", "INDEX ON", 1)
+                definition = re.sub(rf" ON (ONLY )?(\w+\.)?{table} ",
+                                    rf" ON \g<2>{staging} ", definition,
+                                    count=1)
+                cur.execute(definition)
+            cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(staging)))
+
+        start_time = time.time()
+        with conn.transaction(), conn.cursor() as cur:
+            cur.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(
+                sql.Identifier(partition)))
+            cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                sql.Identifier(staging), sql.Identifier(partition)))
+            # the CHECK (YEAR = year) constraint spares the validation scan
+            cur.execute(sql.SQL(
+                "ALTER TABLE {} ATTACH PARTITION {} FOR VALUES IN ({})").format(
+                sql.Identifier(table), sql.Identifier(partition),
+                sql.Literal(int(year))))
+        print(f"SUCCESS: {partition} attached to {table_name} in",
+              f"{time.time() - start_time:.3f} seconds\n")
+    except Exception as e:
+        log.get_logger(__name__).error(
+            f"Partition load of {partition} failed: {e}", exc_info=True)
+        print(f"Partition load failed, {partition} unchanged: {e}")
+        if not conn.closed:
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(
+                    sql.Identifier(staging)))
+        raise
+    finally:
+        conn.close()
+
+    return nrows
@@ -1,33 +1,87 @@
 '''Utilities file with functions to help
 create, load, update, and delete college score card data'''
+import numpy as np
+import functools
 import pandas as pd
 import psycopg
-from load_data.util_package import credentials as cred
+from psycopg_pool import ConnectionPool
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import load_data.util_package.connection_utils as connection_utils
 import os
 import load_data.util_package.logging as log
+import load_data.util_package.sql_queries as queries
+import load_data.util_package.file_utils as file_utils
+import load_data.util_package.bulk_utils as bulk_utils
+
+# Shared pool used by the concurrent writers, created on first use
+_pool = None
+
+# Rows committed per chunk by insert_data_checkpointed
+CHECKPOINT_ROWS = 1000
+
+# Number of hash partitions of Metric_Values
+METRIC_PARTITIONS = 16
+
+# Identifier columns of the MERGED files are not stored as metrics
+METRIC_ID_COLS = ["UNITID", "OPEID", "OPEID6", "YEAR"]
+
+# Marker the Scorecard uses for values withheld for privacy
+SUPPRESSED = "PrivacySuppressed"
 
 
 def get_connection():
     """
-    Establish and return a PostgreSQL database connection.
-    Uses credentials from config/credentials.py.
+    Establish and return a PostgreSQL database connection to the primary.
+    Uses credentials and hosts from config/credentials.py
+    (see connection_utils.py).
     This function can be imported and reused throughout the ETL pipeline.
     """
-    conn = psycopg.connect(host="debprodserver.postgres.database.azure.com",
-                           dbname=cred.DB_USER,
-                           user=cred.DB_USER,
-                           password=cred.DB_PASSWORD)
-    return conn
+    return connection_utils.get_write_connection()
+
+
+def get_pool(max_size=4):
+    """
+    Return a shared PostgreSQL connection pool, creating it on first use.
+    Used when several tables are written at the same time so that every
+    worker thread gets its own connection. A later call asking for more
+    connections grows the pool to `max_size`.
+    Close it with close_pool once the load is done.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            kwargs=connection_utils.conninfo(
+                connection_utils.primary_host()),
+            min_size=1,
+            max_size=max_size,
+            open=True)
+    elif max_size > _pool.max_size:
+        _pool.resize(min_size=_pool.min_size, max_size=max_size)
+    return _pool
+
+
+def close_pool():
+    """
+    Close the shared connection pool (and its worker threads), if one
+    was created.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
 
 
 def load_data(path_file, year):
     '''
     This function takes in a CSV file and year and returns a pandas DataFrame.
+    The CSV can be compressed (.gz/.bz2) or inside a .zip archive
+    ("bundle.zip::MERGED2021_22_PP.csv"); it is decompressed while parsing.
     Only rows with non-missing dataframe are returned.
     Rows missing required fields are saved and outputted into csv file.
     '''
     try:
-        data = pd.read_csv(path_file, low_memory=False)
+        with file_utils.open_source(path_file) as f:
+            data = pd.read_csv(f, low_memory=False)
         total_rows = data.shape[0]
         print(f"{total_rows} rows read from file.")
         # Add a year column
@@ -88,7 +142,32 @@ def create_table(query):
         conn.close()
 
 
-def insert_data(query, df):
+def fetch_column(query):
+    """
+    Runs a SELECT query from sql_queries.py and
+    returns the values of its first column as a list.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query)
+            return [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def query_rows(query, df):
+    """
+    Convert a DataFrame into the parameter rows of a query.
+    Queries with named placeholders (%(COLUMN)s) get one dict per row,
+    positional queries get one list per row in column order.
+    """
+    if "%(" in query:
+        return df.to_dict("records")
+    return df.values.tolist()
+
+
+def insert_data(query, df, conn=None):
     """
     Insert multiple rows of data from a DataFrame
     into a table using the given SQL query.
@@ -98,25 +177,435 @@ def insert_data(query, df):
     query : str
         SQL INSERT statement from sql_queries.py.
     df : pandas.DataFrame
-        Clean data to insert; each row corresponds to the placeholders.
+        Clean data to insert; each row corresponds to the placeholders
+        (or, for named placeholders, each column to the placeholder name).
+    conn : psycopg.Connection, optional
+        Connection to use (e.g. one borrowed from the pool). If not given,
+        a new connection is opened and closed after the insert.
+
+    Returns
+    -------
+    int or None
+        Number of rows inserted or updated, or None if the insert failed.
     """
-    conn = get_connection()
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
     cur = conn.cursor()
-    table_name = query.split("(")[0].strip().split()[-1]
+    table_name = bulk_utils.insert_table_name(query)
     print(f"====INSERTING TO {table_name} TABLE====")
 
     nrows = df.shape[0]
     try:
         with conn.transaction():
-            cur.executemany(query, df.values.tolist())
+            cur.executemany(query, query_rows(query, df))
             print(f"SUCCESS: {cur.rowcount} / {nrows} rows inserted or",
                   f"updated into {table_name}\n")
+        return cur.rowcount
     except Exception as e:
         log.get_logger(__name__).error(
             f"Insertion failed at row: {e}", exc_info=True)
         print(f"Insert failed at row: {cur.rowcount}")
         print(f"Error: {e}")
         print(df.iloc[[cur.rowcount], :])
+        return None
+    finally:
+        cur.close()
+        if own_conn:
+            conn.close()
+
+
+def _insert_bisect(conn, cur, query, rows, start, end, rejected):
+    """
+    Insert rows[start:end] under a savepoint. If the batch is rejected,
+    split it in half and retry each half until the offending rows are
+    isolated, so k bad rows cost O(k log n) round trips.
+    Rejected rows are appended to `rejected` as (position, sqlstate, error).
+    Returns the number of rows inserted or updated.
+    """
+    try:
+        # a nested transaction block is a SAVEPOINT in psycopg
+        with conn.transaction():
+            cur.executemany(query, rows[start:end])
+        return cur.rowcount
+    except (psycopg.errors.DataError,
+            psycopg.errors.IntegrityError,
+            psycopg.errors.InternalError) as e:
+        if end - start == 1:
+            rejected.append((start, e.sqlstate, str(e).strip()))
+            return 0
+        mid = (start + end) // 2
+        return (_insert_bisect(conn, cur, query, rows, start, mid, rejected)
+                + _insert_bisect(conn, cur, query, rows, mid, end, rejected))
+
+
+def insert_data_isolated(query, df, conn=None, batch_size=500):
+    """
+    Insert multiple rows of data from a DataFrame, isolating bad rows
+    instead of rolling back the whole table.
+
+    Rows are sent in batches, each under its own savepoint. A batch the
+    database rejects is bisected until the offending rows are found; all
+    other rows are committed. Rejected rows are saved with their Postgres
+    error code (SQLSTATE) and message into the Invalid_data folder.
+    Connection errors are not isolated and still abort the insert.
+
+    Parameters
+    ----------
+    query : str
+        SQL INSERT statement from sql_queries.py.
+    df : pandas.DataFrame
+        Clean data to insert; each row corresponds to the placeholders.
+    conn : psycopg.Connection, optional
+        Connection to use. If not given, a new connection is opened and
+        closed after the insert.
+    batch_size : int
+        Number of rows sent under a single savepoint.
+
+    Returns
+    -------
+    int or None
+        Number of rows inserted or updated, or None if the insert failed.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    cur = conn.cursor()
+    table_name = bulk_utils.insert_table_name(query)
+    print(f"====INSERTING TO {table_name} TABLE (ISOLATED)====")
+
+    rows = query_rows(query, df)
+    nrows = len(rows)
+    rejected = []
+    try:
+        with conn.transaction():
+            inserted = 0
+            for start in range(0, nrows, batch_size):
+                end = min(start + batch_size, nrows)
+                inserted += _insert_bisect(conn, cur, query, rows,
+                                           start, end, rejected)
+        print(f"SUCCESS: {inserted} / {nrows} rows inserted or",
+              f"updated into {table_name}")
+    except Exception as e:
+        log.get_logger(__name__).error(
+            f"Isolated insertion failed: {e}", exc_info=True)
+        print(f"Error: {e}")
+        return None
     finally:
         cur.close()
+        if own_conn:
+            conn.close()
+
+    if rejected:
+        positions, sqlstates, errors = zip(*rejected)
+        rejected_data = df.iloc[list(positions)].copy()
+        rejected_data['SQLSTATE'] = sqlstates
+        rejected_data['ERROR'] = errors
+
+        # Folder to save rejected data
+        folder = "Invalid_data"
+        os.makedirs(folder, exist_ok=True)
+
+        # Create a descriptive file name
+        year_col = 'YEAR' if 'YEAR' in df.columns else 'LAST_REPORTED'
+        year = df[year_col].iloc[0]
+        file_name = f"{table_name.lower()}_rejected_{year}.csv"
+        file_path = os.path.join(folder, file_name)
+
+        # rejected data is saved and outputted
+        rejected_data.to_csv(file_path, index=False)
+        print(f"{len(rejected)} rejected rows saved to {file_path}.")
+        log.get_logger(__name__).error(
+            f"{len(rejected)} rows rejected by {table_name}, "
+            f"saved to {file_path}.")
+    print()
+    return inserted
+
+
+def insert_data_checkpointed(query, df, conn=None, file_hash=None,
+                             chunk_rows=CHECKPOINT_ROWS):
+    """
+    Insert multiple rows of data from a DataFrame in chunks, committing
+    each chunk together with its number in Load_Checkpoints. A rerun
+    for the same file (same content hash) skips the chunks already
+    committed. Transient errors (dropped connections, serialization
+    failures) are retried with backoff (connection_utils.retry), on a
+    new connection if the old one was lost.
+
+    Parameters
+    ----------
+    query : str
+        SQL INSERT statement from sql_queries.py (an idempotent upsert).
+    df : pandas.DataFrame
+        Clean data to insert; each row corresponds to the placeholders.
+    conn : psycopg.Connection, optional
+        Connection to start with (e.g. one borrowed from the pool).
+        Connections opened here to replace a lost one are closed after
+        the insert.
+    file_hash : str
+        Content hash of the source file (file_utils.file_hash).
+    chunk_rows : int
+        Number of rows committed at a time. Checkpoints recorded with
+        another chunk size are ignored.
+
+    Returns
+    -------
+    int or None
+        Number of rows inserted or updated by this run, or None if the
+        insert failed.
+    """
+    if file_hash is None:
+        raise ValueError("insert_data_checkpointed needs the file hash.")
+    table_name = bulk_utils.insert_table_name(query)
+    print(f"====INSERTING TO {table_name} TABLE (CHECKPOINTED)====")
+
+    rows = query_rows(query, df)
+    nchunks = -(-len(rows) // chunk_rows)
+    current = [conn]
+    opened = []
+
+    def _connection():
+        if current[0] is None or current[0].closed or current[0].broken:
+            current[0] = get_connection()
+            opened.append(current[0])
+        return current[0]
+
+    def _next_chunk():
+        with _connection().cursor() as cur:
+            cur.execute(queries.SELECT_LOAD_CHECKPOINT,
+                        (file_hash, table_name))
+            checkpoint = cur.fetchone()
+        current[0].rollback()
+        if checkpoint is None or checkpoint[1] != chunk_rows:
+            return 0
+        return checkpoint[0] + 1
+
+    def _commit_chunk(chunk, attempt):
+        # the commit of a failed attempt may have gone through with only
+        # its acknowledgement lost: a retry skips the chunk if its
+        # checkpoint is recorded, so it is not applied and counted again
+        attempt[0] += 1
+        if attempt[0] > 1 and _next_chunk() > chunk:
+            return 0
+        conn = _connection()
+        with conn.transaction(), conn.cursor() as cur:
+            cur.executemany(query, rows[chunk * chunk_rows:
+                                        (chunk + 1) * chunk_rows])
+            rowcount = cur.rowcount
+            cur.execute(queries.UPSERT_LOAD_CHECKPOINT,
+                        (file_hash, table_name, chunk, chunk_rows))
+        return rowcount
+
+    try:
+        start = connection_utils.retry(_next_chunk)
+        if start:
+            print(f"Resuming after chunk {start} / {nchunks}:",
+                  f"{min(start * chunk_rows, len(rows))} rows already",
+                  "committed.")
+        inserted = 0
+        for chunk in range(start, nchunks):
+            inserted += connection_utils.retry(
+                functools.partial(_commit_chunk, chunk, [0]))
+        print(f"SUCCESS: {inserted} / {len(rows)} rows inserted or",
+              f"updated into {table_name}\n")
+        return inserted
+    except Exception as e:
+        log.get_logger(__name__).error(
+            f"Checkpointed insertion failed: {e}", exc_info=True)
+        print(f"Insert failed, committed chunks are kept for a rerun: {e}")
+        return None
+    finally:
+        for opened_conn in opened:
+            opened_conn.close()
+
+
+def clear_checkpoints(file_hash):
+    """
+    Forget the load progress of a file once it has loaded completely,
+    so that loading it again writes every row.
+    """
+    def _clear():
+        conn = get_connection()
+        try:
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute(queries.DELETE_LOAD_CHECKPOINTS, (file_hash,))
+        finally:
+            conn.close()
+    connection_utils.retry(_clear)
+
+
+def load_dimensions(mappings):
+    """
+    Creates and fills the Dim_<column> code -> label tables
+    from the categorical mappings of a cleaning module.
+
+    mappings: dict
+        Column name -> {code: label}, e.g. CATEGORY_MAPPINGS.
+    """
+    for col, col_map in mappings.items():
+        table = f"Dim_{col}"
+        create_table(queries.CREATE_DIMENSION.format(table=table))
+        labels = pd.DataFrame(list(col_map.items()),
+                              columns=["CODE", "LABEL"])
+        insert_data(queries.INSERT_DIMENSION.format(table=table), labels)
+
+
+def melt_metrics(data, year, columns=None):
+    """
+    Reshape the numeric columns of a MERGED file into long format,
+    one row per (metric, institution) value, for the Metric_Values store.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        Raw data returned by load_data.
+    year : str or int
+        Year of the data.
+    columns : list of str, optional
+        Columns to store. Defaults to every numeric column: a column is
+        numeric if every non-null value other than PrivacySuppressed
+        converts to a number.
+
+    Returns
+    -------
+    pandas.DataFrame
+        NAME, UNITID, YEAR, VALUE rows sorted by metric, without the
+        missing and suppressed values.
+    """
+    if columns is None:
+        columns = [c for c in data.columns if c not in METRIC_ID_COLS]
+    else:
+        columns = [c.strip().upper() for c in columns]
+        unknown = [c for c in columns if c not in data.columns]
+        if unknown:
+            raise KeyError(f"Columns not in the file: {', '.join(unknown)}")
+
+    raw = data[columns].replace(SUPPRESSED, np.nan)
+    numeric = raw.apply(pd.to_numeric, errors="coerce")
+    is_numeric = ((numeric.notna().sum() == raw.notna().sum())
+                  & numeric.notna().any())
+    numeric = numeric.loc[:, is_numeric]
+
+    values = numeric.to_numpy(dtype=float)
+    # walk the transposed mask so rows come out grouped by metric,
+    # the order of the Metric_Values primary key
+    cols, rows = np.nonzero(~np.isnan(values.T))
+    metrics = pd.DataFrame({
+        "NAME": numeric.columns.to_numpy()[cols],
+        "UNITID": data["UNITID"].to_numpy()[rows].astype(int),
+        "YEAR": int(year),
+        "VALUE": values[rows, cols]})
+    print(f"{len(metrics)} values of {numeric.shape[1]} metrics melted.")
+    return metrics
+
+
+def create_metric_store(partitions=METRIC_PARTITIONS):
+    """
+    Create the Metrics and Metric_Values tables and the hash partitions
+    of Metric_Values if they do not exist.
+    """
+    create_table(queries.CREATE_METRICS)
+    create_table(queries.CREATE_METRIC_VALUES)
+    conn = get_connection()
+    try:
+        with conn.transaction(), conn.cursor() as cur:
+            for remainder in range(partitions):
+                cur.execute(queries.CREATE_METRIC_VALUES_PARTITION.format(
+                    modulus=partitions, remainder=remainder))
+        print(f"Metric_Values partitions (x{partitions}) created",
+              "or already exist.")
+    finally:
         conn.close()
+
+
+def load_metrics(metrics, year):
+    """
+    Store the output of melt_metrics: register new metric names in
+    Metrics, then replace the year's values of those metrics in
+    Metric_Values with one COPY. Readers see the old values until the
+    transaction commits.
+
+    Returns
+    -------
+    int or None
+        Number of values stored, or None if the load failed.
+    """
+    print("====INSERTING TO Metric_Values TABLE====")
+    names = metrics["NAME"].unique().tolist()
+    conn = get_connection()
+    try:
+        with conn.transaction(), conn.cursor() as cur:
+            cur.executemany(queries.INSERT_METRICS, [(n,) for n in names])
+            cur.execute(queries.SELECT_METRIC_IDS, (names,))
+            metric_ids = dict(cur.fetchall())
+            cur.execute(queries.DELETE_METRIC_VALUES,
+                        (int(year), list(metric_ids.values())))
+            rows = metrics.assign(METRIC_ID=metrics["NAME"].map(metric_ids))
+            nrows = bulk_utils.copy_dataframe(
+                cur, "Metric_Values", ["METRIC_ID", "UNITID", "YEAR", "VALUE"],
+                rows[["METRIC_ID", "UNITID", "YEAR", "VALUE"]])
+        print(f"SUCCESS: {nrows} values of {len(names)} metrics stored",
+              "into Metric_Values\n")
+        return nrows
+    except Exception as e:
+        log.get_logger(__name__).error(
+            f"Metric load failed: {e}", exc_info=True)
+        print(f"Metric load failed: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def insert_data_parallel(jobs, max_workers=None, insert_fn=insert_data):
+    """
+    Insert several DataFrames into their tables at the same time.
+    Each job runs in its own thread on its own pooled connection, so the
+    tables must not depend on each other (e.g. the fact tables once
+    Institutions has been committed).
+
+    Parameters
+    ----------
+    jobs : list of (str, pandas.DataFrame)
+        Pairs of SQL INSERT statement and the clean data to insert.
+    max_workers : int, optional
+        Number of writer threads. Defaults to one per job.
+    insert_fn : callable
+        Insert function taking (query, df, conn), e.g. insert_data
+        or insert_data_isolated.
+
+    Returns
+    -------
+    dict
+        Table name -> number of rows written, or None if that table failed.
+    """
+    max_workers = max_workers or len(jobs)
+    pool = get_pool(max_size=max_workers)
+
+    def _insert(query, df):
+        with pool.connection() as conn:
+            return insert_fn(query, df, conn=conn)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for query, df in jobs:
+            table_name = bulk_utils.insert_table_name(query)
+            futures[executor.submit(_insert, query, df)] = table_name
+        for future in as_completed(futures):
+            table_name = futures[future]
+            try:
+                results[table_name] = future.result()
+            except Exception as e:
+                # e.g. no connection could be obtained from the pool
+                log.get_logger(__name__).error(
+                    f"Parallel insert into {table_name} failed: {e}",
+                    exc_info=True)
+                results[table_name] = None
+
+    print("====PARALLEL INSERT SUMMARY====")
+    for table_name, rowcount in results.items():
+        if rowcount is None:
+            print(f"FAILED : {table_name}")
+        else:
+            print(f"SUCCESS: {table_name} ({rowcount} rows)")
+    return results
@@ -0,0 +1,241 @@
+'''Utilities file with functions to route database connections:
+loads write to the primary, dashboard reads go to the read replicas.
+
+The hosts are set outside the code, in credentials.py or with
+environment variables (which take precedence):
+    DB_HOST / SCORECARD_DB_HOST              primary, "host" or "host:port"
+    DB_READ_HOSTS / SCORECARD_DB_READ_HOSTS  replicas (list, or comma
+                                             separated in the environment);
+                                             reads use the primary if empty
+    DB_MAX_STALENESS / SCORECARD_DB_MAX_STALENESS
+                                             seconds a replica may lag
+'''
+import atexit
+import contextlib
+import os
+import random
+import time
+import threading
+import psycopg
+from psycopg_pool import ConnectionPool, PoolTimeout
+import load_data.util_package.credentials as credentials
+import load_data.util_package.logging as log
+import load_data.util_package.sql_queries as queries
+
+DEFAULT_HOST = "debprodserver.postgres.database.azure.com"
+
+# A replica found fresh enough is not checked again for this many seconds
+STALENESS_CHECK_INTERVAL = 10
+
+# Transient errors are retried this many times in total, waiting a random
+# time up to RETRY_BASE_DELAY * 2^(attempt - 1) seconds (at most
+# RETRY_MAX_DELAY) between attempts
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+# Dashboard / API reads share one pool of connections per host
+READ_POOL_SIZE = 8
+# Seconds to wait for a pooled connection before trying the next host
+READ_POOL_TIMEOUT = 5
+
+_lock = threading.Lock()
+_next_replica = 0
+_replica_checked = {}
+_read_pools = {}
+
+
+def _setting(name, default):
+    """
+    Value of a connection setting: the SCORECARD_<name> environment
+    variable, else <name> in credentials.py, else the default.
+    """
+    value = os.environ.get(f"SCORECARD_{name}")
+    if value is not None:
+        return value
+    return getattr(credentials, name, default)
+
+
+def primary_host():
+    return _setting("DB_HOST", DEFAULT_HOST)
+
+
+def read_hosts():
+    hosts = _setting("DB_READ_HOSTS", [])
+    if isinstance(hosts, str):
+        hosts = [host.strip() for host in hosts.split(",") if host.strip()]
+    return list(hosts)
+
+
+def max_staleness():
+    return float(_setting("DB_MAX_STALENESS", 300))
+
+
+def conninfo(host):
+    """
+    Connection keyword arguments for a "host" or "host:port" target,
+    with the database and user from credentials.py.
+    """
+    kwargs = {"dbname": credentials.DB_USER,
+              "user": credentials.DB_USER,
+              "password": credentials.DB_PASSWORD}
+    if ":" in host:
+        host, port = host.rsplit(":", 1)
+        kwargs["port"] = int(port)
+    kwargs["host"] = host
+    return kwargs
+
+
+def get_write_connection():
+    """
+    Connection to the primary, for everything that creates or writes.
+    """
+    return psycopg.connect(**conninfo(primary_host()))
+
+
+def _fresh_enough(conn, host):
+    """
+    True if the replica behind `conn` lags the primary by no more than
+    the staleness tolerance. Fresh verdicts are cached for a few seconds.
+    """
+    checked_at = _replica_checked.get(host)
+    if checked_at is not None and \
+            time.monotonic() - checked_at < STALENESS_CHECK_INTERVAL:
+        return True
+    with conn.cursor() as cur:
+        cur.execute(queries.SELECT_REPLICA_LAG)
+        lag = cur.fetchone()[0]
+    if lag is not None and float(lag) <= max_staleness():
+        _replica_checked[host] = time.monotonic()
+        return True
+    _replica_checked.pop(host, None)
+    log.get_logger(__name__).warning(
+        f"Replica {host} skipped: {lag} seconds behind the primary.")
+    return False
+
+
+def _read_pool(host):
+    """
+    Connection pool of a read host, opened on first use and closed at exit.
+    Its connections are in autocommit mode, so a read leaves no transaction
+    open and they go back to the pool without being rolled back.
+    """
+    with _lock:
+        if host not in _read_pools:
+            if not _read_pools:
+                atexit.register(close_read_pools)
+            _read_pools[host] = ConnectionPool(
+                kwargs=dict(conninfo(host), connect_timeout=3,
+                            autocommit=True),
+                min_size=1, max_size=READ_POOL_SIZE,
+                check=ConnectionPool.check_connection,
+                name=f"read-{host}", open=True)
+        return _read_pools[host]
+
+
+def close_read_pools():
+    """
+    Close the read pools and their worker threads.
+    """
+    with _lock:
+        pools = list(_read_pools.values())
+        _read_pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+@contextlib.contextmanager
+def read_connection():
+    """
+    Pooled connection for read-only queries, as a context manager that
+    gives it back to its pool:
+
+        with read_connection() as conn:
+            ...
+
+    Replicas are used in turn (round-robin); one that is down or lags
+    more than the staleness tolerance is skipped. Falls back to the
+    primary if no replica is configured or usable.
+    """
+    global _next_replica
+    hosts = read_hosts()
+    with _lock:
+        start = _next_replica
+        _next_replica = (_next_replica + 1) % max(len(hosts), 1)
+
+    for i in range(len(hosts)):
+        host = hosts[(start + i) % len(hosts)]
+        pool = _read_pool(host)
+        try:
+            conn = pool.getconn(timeout=READ_POOL_TIMEOUT)
+        except PoolTimeout as e:
+            log.get_logger(__name__).warning(
+                f"Replica {host} unavailable: {e}")
+            continue
+        try:
+            fresh = _fresh_enough(conn, host)
+        except psycopg.Error as e:
+            log.get_logger(__name__).warning(
+                f"Replica {host} lag check failed: {e}")
+            fresh = False
+        if not fresh:
+            pool.putconn(conn)
+            continue
+        try:
+            yield conn
+        finally:
+            pool.putconn(conn)
+        return
+
+    if hosts:
+        log.get_logger(__name__).warning(
+            "No read replica usable; reading from the primary.")
+    pool = _read_pool(primary_host())
+    conn = pool.getconn(timeout=READ_POOL_TIMEOUT)
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def is_transient(error):
+    """
+    True for errors that may succeed when retried: lost or refused
+    connections, server restarts, serialization failures and deadlocks.
+    """
+    if isinstance(error, (psycopg.errors.SerializationFailure,
+                          psycopg.errors.DeadlockDetected)):
+        return True
+    if isinstance(error, psycopg.OperationalError):
+        # no SQLSTATE: the connection itself failed; class 08 is a
+        # connection exception, 57P01-57P03 a server shutdown or restart
+        sqlstate = error.sqlstate
+        return (sqlstate is None or sqlstate.startswith("08")
+                or sqlstate in ("57P01", "57P02", "57P03"))
+    return False
+
+
+def retry(fn, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+          max_delay=RETRY_MAX_DELAY):
+    """
+    Call fn() and return its result, retrying transient errors (see
+    is_transient) with exponential backoff and full jitter. Any other
+    error, or the last transient one, is raised.
+
+    fn must be safe to call again: a failed transaction is rolled back,
+    and fn should reconnect if its connection was lost.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts or not is_transient(e):
+                raise
+            delay = random.uniform(0, min(max_delay,
+                                          base_delay * 2 ** (attempt - 1)))
+            log.get_logger(__name__).warning(
+                f"Transient error, retry {attempt} / {attempts - 1} "
+                f"in {delay:.1f} seconds: {e}")
+            print(f"Transient error ({str(e).strip()}); retrying in",
+                  f"{delay:.1f} seconds ({attempt} / {attempts - 1})")
+            time.sleep(delay)
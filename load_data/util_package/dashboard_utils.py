@@ -1,54 +1,846 @@
 
+import io
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 import psycopg
+from psycopg import sql
 import altair as alt
-import load_data.util_package.credentials as credentials
+import pydeck as pdk
+from scipy.spatial import cKDTree
+import load_data.util_package.connection_utils as connection_utils
+
+# pyarrow is optional: without it query_columnar falls back to query_data
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+import load_data.util_package.sql_queries as queries
+
+# Metrics available to get_institution_panel, by source table
+PANEL_METRICS = {
+    "tuitionfee_in": "financials",
+    "tuitionfee_out": "financials",
+    "tuitionfee_prog": "financials",
+    "tuitfte": "financials",
+    "avgfascal": "financials",
+    "cdr2": "financials",
+    "cdr3": "financials",
+    "adm_rate": "academics",
+    "c100_4": "academics",
+    "c100_l4": "academics",
+    "sat_avg": "academics",
+    "count_nwne_3yr": "academics",
+    "count_wne_3yr": "academics",
+    "cntover150_3yr": "academics",
+    "ugds": "demographics",
+    "ugds_men": "demographics",
+    "ugds_women": "demographics",
+    "ugds_white": "demographics",
+    "ugds_black": "demographics",
+    "ugds_hisp": "demographics",
+    "ugds_asian": "demographics",
+    "ugds_aian": "demographics",
+    "ugds_nhpi": "demographics",
+    "ugds_2mor": "demographics",
+    "ugds_unkn": "demographics",
+}
+
+# Arrow type of each Postgres result type (by type OID); others are text
+ARROW_TYPES = {} if pa is None else {
+    16: pa.bool_(), 20: pa.int64(), 21: pa.int64(), 23: pa.int64(),
+    # NUMERIC aggregates (AVG, ROUND) become floats instead of Decimals
+    700: pa.float64(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(), 1114: pa.timestamp("us")
+}
+
+# Tuition x admission rate bins of the level-of-detail scatter (PLOT 6)
+LOD_BINS = (40, 25)
+
+# Built charts kept by fingerprint of their inputs (see cached_chart),
+# shared by every session of the dashboard process
+CHART_CACHE_SIZE = 64
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+
+# Seconds a load version read from Load_History is reused (see
+# get_load_version)
+LOAD_VERSION_TTL = 60
+_load_version = {"version": None, "checked_at": None}
+_load_version_lock = threading.Lock()
+
+# Year-scoped queries -> their variants joining the *_history tables,
+# used instead once loads have run with --history (see year_query)
+AS_OF_QUERIES = {
+    queries.tuition_rate_summary: queries.tuition_rate_summary_as_of,
+    queries.loan_repayment_performance:
+        queries.loan_repayment_performance_as_of,
+    queries.tuition_admrate: queries.tuition_admrate_as_of,
+    queries.faculty_salary_map: queries.faculty_salary_map_as_of,
+    queries.cube_facts: queries.cube_facts_as_of,
+}
+# Load version -> whether the history tables existed at it
+_history_available = {}
+# Load version -> whether Fields_Of_Study existed at it
+_fields_of_study_available = {}
+
+# Dimensions (integer encoded) and measures of the in-memory cube
+CUBE_DIMENSIONS = ["year", "stabbr", "control", "c_basic"]
+CUBE_MEASURES = ["tuitionfee_in", "tuitionfee_out", "avgfascal",
+                 "repayment_rate", "adm_rate", "sat_avg", "ugds"]
+
+# Mean Earth radius, used to convert miles to distances on the unit sphere
+EARTH_RADIUS_MILES = 3958.8
 
 
 def get_connection():
     """
-    Establish and return a PostgreSQL database connection.
-    Uses credentials from config/credentials.py.
-    This function can be imported and reused throughout the ETL pipeline.
+    Read-only PostgreSQL database connection from the shared pools, to a
+    read replica if one is configured (see connection_utils.py). Use it
+    as `with get_connection() as conn:`; the connection goes back to its
+    pool at the end of the block.
     """
-    conn = psycopg.connect(host="debprodserver.postgres.database.azure.com",
-                           dbname=credentials.DB_USER,
-                           user=credentials.DB_USER,
-                           password=credentials.DB_PASSWORD)
-    return conn
+    return connection_utils.read_connection()
 
 
 def query_data(query: str, params: tuple = None) -> pd.DataFrame:
     """
     Execute a SQL query and return the result as a pandas DataFrame.
     """
-    conn = get_connection()
-    try:
+    with get_connection() as conn:
         df = pd.read_sql(query, conn, params=params)
-    finally:
-        conn.close()
     return df
 
 
+def query_columnar(query: str, params: tuple = None,
+                   dtype_backend: str = "numpy") -> pd.DataFrame:
+    """
+    Execute a SQL query and return the result as a pandas DataFrame,
+    fetched column by column instead of row by row.
+
+    The result is streamed with COPY (query) TO STDOUT and parsed by
+    pyarrow's multithreaded CSV reader with the column types of the query,
+    so no Python tuple is built per row and NUMERIC columns arrive as
+    float64 (no pd.to_numeric needed). Meant for large results such as
+    tuition_admrate and tuition_repayment_over_time.
+
+    dtype_backend: "numpy" for NumPy dtypes, "pyarrow" for Arrow-backed
+    columns. Falls back to query_data when pyarrow is not installed.
+    """
+    if pa is None:
+        return query_data(query, params=params)
+
+    with get_connection() as conn:
+        # COPY takes no bind parameters: merge them in client side
+        if params:
+            with psycopg.ClientCursor(conn) as cur:
+                query = cur.mogrify(query, params)
+        query = query.strip().rstrip(";")
+
+        with conn.cursor() as cur:
+            # names and types of the result columns, without running it
+            cur.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+            columns = [(col.name, col.type_code) for col in cur.description]
+
+            data = io.BytesIO()
+            with cur.copy(f"COPY ({query}) TO STDOUT (FORMAT csv)") as copy:
+                for block in copy:
+                    data.write(block)
+
+    names = [name for name, _ in columns]
+    data.seek(0)
+    table = pa_csv.read_csv(
+        data,
+        read_options=pa_csv.ReadOptions(column_names=names),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: ARROW_TYPES.get(oid, pa.string())
+                          for name, oid in columns},
+            # unquoted empty fields are NULL, "" is an empty string
+            null_values=[""], strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=["t"], false_values=["f"]))
+
+    if dtype_backend == "pyarrow":
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas()
+
+
+def get_column_stats(columns) -> pd.DataFrame:
+    """
+    Load-time statistics (null fraction, min / quantiles / max, distinct
+    count) of the given columns for every table and year, from the
+    Column_Stats catalog. Empty if the catalog has not been created yet.
+    """
+    try:
+        return query_data(queries.get_column_stats,
+                          params=([c.upper() for c in columns],))
+    except psycopg.errors.UndefinedTable:
+        return pd.DataFrame(columns=["table_name", "year", "column_name"])
+
+
+def catalog_value(stats, column, stat, agg="min", year=None, default=None):
+    """
+    Aggregate one statistic of a column from get_column_stats output,
+    e.g. the smallest 25th percentile of TUITIONFEE_IN over all years.
+    Returns `default` when the catalog has no value.
+    """
+    if stat not in stats.columns:
+        return default
+    rows = stats[stats["column_name"] == column.upper()]
+    if year is not None:
+        rows = rows[rows["year"] == int(year)]
+    values = pd.to_numeric(rows[stat]).dropna()
+    if values.empty:
+        return default
+    return float(values.agg(agg))
+
+
+def get_directory_as_of(year, unitids=None) -> pd.DataFrame:
+    """
+    IPEDS directory attributes (name, city, state, location, Carnegie
+    class) and Scorecard control / predominant degree as they were in
+    `year`, for the given institutions or all of them. Requires
+    directory loads with --history.
+    """
+    return query_data(queries.institutions_ipeds_as_of,
+                      params={"year": int(year),
+                              "unitids": (None if unitids is None
+                                          else [int(u) for u in unitids])})
+
+
+def get_institutions_as_of(year, unitids=None) -> pd.DataFrame:
+    """
+    Scorecard institution attributes (control, predominant / highest
+    degree, region) as they were in `year`. Requires loads with --history.
+    """
+    return query_data(queries.institutions_as_of,
+                      params={"year": int(year),
+                              "unitids": (None if unitids is None
+                                          else [int(u) for u in unitids])})
+
+
+def history_available() -> bool:
+    """
+    True if the *_history tables exist (loads run with --history).
+    Checked once per load version.
+    """
+    version = get_load_version()
+    if version not in _history_available:
+        _history_available.clear()
+        _history_available[version] = bool(
+            query_data(queries.history_tables_exist).iloc[0, 0])
+    return _history_available[version]
+
+
+def fields_of_study_available() -> bool:
+    """
+    True if the Fields_Of_Study table exists (load_fieldofstudy.py was
+    run). Checked once per load version.
+    """
+    version = get_load_version()
+    if version not in _fields_of_study_available:
+        _fields_of_study_available.clear()
+        _fields_of_study_available[version] = bool(
+            query_data(queries.fields_of_study_exists).iloc[0, 0])
+    return _fields_of_study_available[version]
+
+
+def year_query(query):
+    """
+    The query to run for a year-scoped dashboard query: its as-of variant
+    (AS_OF_QUERIES) when the history tables exist, so that the facts of
+    year Y are joined to the names, states, control and Carnegie classes
+    valid in year Y; else the query itself.
+    """
+    if query in AS_OF_QUERIES and history_available():
+        return AS_OF_QUERIES[query]
+    return query
+
+
+def search_institutions(search: str, state: str = "",
+                        limit: int = 20) -> pd.DataFrame:
+    """
+    Return the top `limit` institutions (unitid, instnm, city, stabbr)
+    whose name contains `search`, optionally within one state.
+    Prefix matches are listed first.
+    """
+    return query_data(queries.search_institutions,
+                      params={"search": search.strip(),
+                              "state": state,
+                              "limit": limit})
+
+
+def get_institution_panel(unitids, start_year, end_year,
+                          metrics) -> pd.DataFrame:
+    """
+    Multi-year panel of metrics for a set of institutions in one query.
+
+    Parameters
+    ----------
+    unitids : list of int
+        Institutions to compare.
+    start_year, end_year : int
+        Inclusive year range.
+    metrics : list of str
+        Keys of PANEL_METRICS (columns of Financials/Academics/Demographics).
+
+    Returns
+    -------
+    pandas.DataFrame
+        Tidy frame with unitid, instnm, year, metric, value and yoy_change
+        (change from the previous year, NULL if that year is missing).
+    """
+    unknown = set(metrics) - set(PANEL_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown panel metrics: {sorted(unknown)}")
+    id_cols = ["unitid", "instnm", "year"]
+    if not unitids or not metrics:
+        return pd.DataFrame(columns=id_cols + ["metric", "value",
+                                               "yoy_change"])
+
+    tables = sorted({PANEL_METRICS[m] for m in metrics})
+
+    # every (unitid, year) present in any of the requested tables
+    keys = sql.SQL(" UNION ").join(
+        sql.SQL("SELECT unitid, year FROM {} "
+                "WHERE unitid = ANY(%(unitids)s) "
+                "AND year BETWEEN %(start)s AND %(end)s"
+                ).format(sql.Identifier(table))
+        for table in tables)
+    joins = sql.SQL(" ").join(
+        sql.SQL("LEFT JOIN {table} ON {table}.unitid = keys.unitid "
+                "AND {table}.year = keys.year"
+                ).format(table=sql.Identifier(table))
+        for table in tables)
+    columns = []
+    for metric in metrics:
+        col = sql.SQL("{}.{}").format(sql.Identifier(PANEL_METRICS[metric]),
+                                      sql.Identifier(metric))
+        columns.append(sql.SQL("{} AS {}").format(col, sql.Identifier(metric)))
+        columns.append(sql.SQL(
+            "CASE WHEN LAG(keys.year) OVER w = keys.year - 1 "
+            "THEN {col} - LAG({col}) OVER w END AS {alias}"
+        ).format(col=col, alias=sql.Identifier(f"{metric}_yoy")))
+
+    query = sql.SQL("""
+SELECT keys.unitid, ipd.instnm, keys.year, {columns}
+FROM ({keys}) AS keys
+{joins}
+LEFT JOIN institutions_ipeds AS ipd
+    ON ipd.unitid = keys.unitid
+WINDOW w AS (PARTITION BY keys.unitid ORDER BY keys.year)
+ORDER BY keys.unitid, keys.year
+""").format(columns=sql.SQL(", ").join(columns), keys=keys, joins=joins)
+
+    with get_connection() as conn:
+        wide = pd.read_sql(query.as_string(conn), conn,
+                           params={"unitids": [int(u) for u in unitids],
+                                   "start": int(start_year),
+                                   "end": int(end_year)})
+
+    # wide -> tidy: one row per institution, year and metric
+    values = wide.melt(id_vars=id_cols, value_vars=metrics,
+                       var_name="metric", value_name="value")
+    changes = wide.melt(id_vars=id_cols,
+                        value_vars=[f"{m}_yoy" for m in metrics],
+                        value_name="yoy_change")
+    values["value"] = pd.to_numeric(values["value"])
+    values["yoy_change"] = pd.to_numeric(changes["yoy_change"]).values
+    return values
+
+
+def get_metric_frame(names, unitids=None, start_year=None,
+                     end_year=None) -> pd.DataFrame:
+    """
+    Any set of metrics of the long-format store as a wide frame,
+    pivoted by the database in one query.
+
+    Parameters
+    ----------
+    names : list of str
+        Metric names (MERGED column names, see queries.get_metric_names).
+    unitids : list of int, optional
+        Institutions to keep (default: all).
+    start_year, end_year : int, optional
+        Inclusive year range (default: every year).
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per unitid and year, one lowercase column per metric
+        (NaN where the institution did not report it).
+    """
+    names = [name.strip().upper() for name in names]
+    if not names:
+        return pd.DataFrame(columns=["unitid", "year"])
+
+    columns = sql.SQL(", ").join(
+        sql.SQL("MAX(v.value) FILTER (WHERE m.name = {}) AS {}").format(
+            sql.Literal(name), sql.Identifier(name.lower()))
+        for name in names)
+    # the metric ids are resolved before the scan, so only the hash
+    # partitions holding the requested metrics are read
+    query = sql.SQL("""
+SELECT v.unitid, v.year, {columns}
+FROM metric_values AS v
+JOIN metrics AS m
+    ON m.metric_id = v.metric_id
+WHERE v.metric_id = ANY(ARRAY(SELECT metric_id FROM metrics
+                              WHERE name = ANY(%(names)s)))
+  AND (%(unitids)s::INTEGER[] IS NULL OR v.unitid = ANY(%(unitids)s))
+  AND v.year BETWEEN COALESCE(%(start)s::INTEGER, v.year)
+                 AND COALESCE(%(end)s::INTEGER, v.year)
+GROUP BY v.unitid, v.year
+ORDER BY v.unitid, v.year
+""").format(columns=columns)
+
+    with get_connection() as conn:
+        wide = pd.read_sql(query.as_string(conn), conn, params={
+            "names": names,
+            "unitids": None if unitids is None else [int(u) for u in unitids],
+            "start": None if start_year is None else int(start_year),
+            "end": None if end_year is None else int(end_year)})
+    return wide
+
+
+def _to_unit_sphere(latitude, longitude):
+    """
+    Convert latitude / longitude in degrees to 3D points on the unit sphere.
+    """
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+class SpatialIndex:
+    """
+    KD-tree over institution locations on the unit sphere.
+
+    Straight-line (chord) distance between points on the sphere grows with
+    the great-circle distance, so radius and nearest-neighbour searches on
+    the tree give the same answers as haversine without scanning every row.
+    """
+
+    def __init__(self, locations):
+        """
+        locations: DataFrame with unitid, instnm, city, stabbr,
+                   latitude, longitude (see get_institution_locations)
+        """
+        locations = locations.copy()
+        locations["latitude"] = pd.to_numeric(locations["latitude"])
+        locations["longitude"] = pd.to_numeric(locations["longitude"])
+        self.locations = locations.dropna(
+            subset=["latitude", "longitude"]).reset_index(drop=True)
+        self.tree = cKDTree(_to_unit_sphere(self.locations["latitude"],
+                                            self.locations["longitude"]))
+        self._position = pd.Series(self.locations.index,
+                                   index=self.locations["unitid"])
+
+    def location_of(self, unitid):
+        """
+        Return (latitude, longitude) of an institution, or None if unknown.
+        """
+        if unitid not in self._position.index:
+            return None
+        row = self.locations.iloc[self._position[unitid]]
+        return row["latitude"], row["longitude"]
+
+    def _result(self, positions, chord):
+        result = self.locations.iloc[positions].copy()
+        result["distance_miles"] = (
+            2 * EARTH_RADIUS_MILES * np.arcsin(np.clip(chord / 2, 0, 1)))
+        return result.sort_values("distance_miles").reset_index(drop=True)
+
+    def within_radius(self, latitude, longitude, miles):
+        """
+        Institutions within `miles` of a point, nearest first.
+        """
+        point = _to_unit_sphere([latitude], [longitude])[0]
+        radius = 2 * np.sin(min(miles / EARTH_RADIUS_MILES, np.pi) / 2)
+        positions = np.asarray(self.tree.query_ball_point(point, r=radius),
+                               dtype=int)
+        chord = np.linalg.norm(
+            self.tree.data[positions] - point, axis=1)
+        return self._result(positions, chord)
+
+    def nearest(self, latitude, longitude, k=10):
+        """
+        The k institutions closest to a point, nearest first.
+        """
+        point = _to_unit_sphere([latitude], [longitude])[0]
+        k = min(k, len(self.locations))
+        chord, positions = self.tree.query(point, k=k)
+        return self._result(np.atleast_1d(positions),
+                            np.atleast_1d(chord))
+
+
+def build_spatial_index() -> SpatialIndex:
+    """
+    Build the spatial index from the IPEDS directory locations.
+    """
+    return SpatialIndex(query_data(queries.get_institution_locations))
+
+
+def institutions_within_radius(index, unitid, miles):
+    """
+    Institutions within `miles` of the given institution (excluding it).
+    """
+    location = index.location_of(unitid)
+    if location is None:
+        return index.locations.iloc[0:0].assign(distance_miles=[])
+    result = index.within_radius(*location, miles)
+    return result[result["unitid"] != unitid].reset_index(drop=True)
+
+
+def nearest_institutions(index, unitid, k=10):
+    """
+    The k peers closest to the given institution (excluding it).
+    """
+    location = index.location_of(unitid)
+    if location is None:
+        return index.locations.iloc[0:0].assign(distance_miles=[])
+    result = index.nearest(*location, k=k + 1)
+    return result[result["unitid"] != unitid].head(k).reset_index(drop=True)
+
+
+def get_load_version(max_age=LOAD_VERSION_TTL) -> int:
+    """
+    Latest load version: LOAD_ID of the last load recorded in
+    Load_History (0 before the first one). The value is reused for
+    `max_age` seconds, so callers may ask on every rerun.
+    """
+    with _load_version_lock:
+        checked_at = _load_version["checked_at"]
+        if checked_at is not None and time.monotonic() - checked_at < max_age:
+            return _load_version["version"]
+
+    try:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(queries.get_load_version)
+            version = int(cur.fetchone()[0])
+    except psycopg.errors.UndefinedTable:
+        # no load recorded yet
+        version = 0
+
+    with _load_version_lock:
+        _load_version["version"] = version
+        _load_version["checked_at"] = time.monotonic()
+    return version
+
+
+class Cube:
+    """
+    In-memory column store of the (unitid, year) facts, for group-by and
+    filter slices without a round trip to Postgres.
+
+    Each dimension is stored as integer codes into its sorted labels
+    (-1 when missing) and each measure as a float array (NaN when
+    missing). Filters are boolean masks over the codes; group-by
+    aggregates are np.bincount over one combined group code, min / max
+    are ufunc.reduceat over the rows sorted by group.
+    """
+
+    def __init__(self, facts, version=None):
+        """
+        facts: DataFrame with unitid, instnm, CUBE_DIMENSIONS and
+               CUBE_MEASURES columns (see the cube_facts query)
+        version: load version the facts were read at
+        """
+        self.version = version
+        self.size = len(facts)
+        self.unitid = facts["unitid"].to_numpy(dtype=np.int64)
+        self.instnm = facts["instnm"].to_numpy(dtype=object)
+        self.codes = {}
+        self.labels = {}
+        for dim in CUBE_DIMENSIONS:
+            codes, labels = pd.factorize(facts[dim], sort=True)
+            self.codes[dim] = codes.astype(np.int32)
+            self.labels[dim] = labels
+        self.measures = {
+            measure: pd.to_numeric(facts[measure], errors="coerce")
+            .to_numpy(dtype=float, na_value=np.nan)
+            for measure in CUBE_MEASURES}
+
+    def _decode(self, dim, codes):
+        """
+        Labels of dimension codes, None for -1 (or the number of labels).
+        """
+        labels = np.append(self.labels[dim].to_numpy(dtype=object), None)
+        return labels[codes]
+
+    def mask(self, unitid=None, require=(), **filters):
+        """
+        Boolean mask of the rows matching every filter.
+
+        filters: dimension=label or list of labels (year=2021,
+                 stabbr=["NY", "NJ"]); None or "" keeps every row
+        unitid: institution or list of institutions
+        require: measures that must not be missing
+        """
+        keep = np.ones(self.size, dtype=bool)
+        for dim, value in filters.items():
+            if value is None or (isinstance(value, str) and value == ""):
+                continue
+            values = [value] if np.isscalar(value) else list(value)
+            codes = self.labels[dim].get_indexer(values)
+            # labels the cube does not know match no row
+            keep &= np.isin(self.codes[dim], codes[codes >= 0])
+        if unitid is not None:
+            keep &= np.isin(self.unitid, np.atleast_1d(unitid))
+        for measure in require:
+            keep &= ~np.isnan(self.measures[measure])
+        return keep
+
+    def aggregate(self, measures, by=(), agg="mean", unitid=None,
+                  require=(), **filters):
+        """
+        Aggregate measures over the rows matching the filters (see mask),
+        grouped by dimensions.
+
+        agg: "mean", "sum", "count", "min" or "max" of the non-missing
+             values of each measure (NaN for a group without any)
+
+        Returns a DataFrame with one row per non-empty group, ordered by
+        the `by` labels: the labels, `rows` and one column per measure.
+        """
+        keep = self.mask(unitid=unitid, require=require, **filters)
+
+        # one integer per group: the dimension codes as digits of a
+        # mixed-radix number, with missing labels (-1) as the last digit
+        sizes = [len(self.labels[dim]) + 1 for dim in by]
+        group = np.zeros(self.size, dtype=np.int64)
+        for dim, size in zip(by, sizes):
+            group = group * size + self.codes[dim] % size
+        group = group[keep]
+        n_groups = int(np.prod(sizes))
+
+        result = {"rows": np.bincount(group, minlength=n_groups)}
+        for measure in measures:
+            values = self.measures[measure][keep]
+            valid = ~np.isnan(values)
+            groups, values = group[valid], values[valid]
+            count = np.bincount(groups, minlength=n_groups)
+            if agg == "count":
+                result[measure] = count
+            elif agg in ("sum", "mean"):
+                total = np.bincount(groups, weights=values,
+                                    minlength=n_groups)
+                if agg == "mean":
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        total = total / count
+                result[measure] = np.where(count > 0, total, np.nan)
+            elif agg in ("min", "max"):
+                ufunc = np.minimum if agg == "min" else np.maximum
+                extreme = np.full(n_groups, np.nan)
+                if len(values):
+                    order = np.argsort(groups, kind="stable")
+                    groups = groups[order]
+                    starts = np.flatnonzero(
+                        np.r_[True, groups[1:] != groups[:-1]])
+                    extreme[groups[starts]] = ufunc.reduceat(values[order],
+                                                             starts)
+                result[measure] = extreme
+            else:
+                raise ValueError(f"Unknown aggregate: {agg}")
+
+        present = np.flatnonzero(result["rows"] > 0)
+        digits = np.unravel_index(present, sizes) if sizes else ()
+        frame = {dim: self._decode(dim, codes)
+                 for dim, codes in zip(by, digits)}
+        frame.update({name: column[present]
+                      for name, column in result.items()})
+        return pd.DataFrame(frame)
+
+    def rows(self, measures=None, unitid=None, require=(), **filters):
+        """
+        Rows matching the filters (see mask): unitid, instnm, the
+        dimension labels and the measures (default: all of them).
+        """
+        keep = self.mask(unitid=unitid, require=require, **filters)
+        frame = {"unitid": self.unitid[keep], "instnm": self.instnm[keep]}
+        for dim in CUBE_DIMENSIONS:
+            frame[dim] = self._decode(dim, self.codes[dim][keep])
+        for measure in measures or CUBE_MEASURES:
+            frame[measure] = self.measures[measure][keep]
+        return pd.DataFrame(frame)
+
+
+def build_cube(version=None) -> Cube:
+    """
+    Build the cube from the fact tables, for a load version
+    (see get_load_version).
+    """
+    return Cube(query_columnar(year_query(queries.cube_facts)),
+                version=version)
+
+
+def cube_tuition_summary(cube, year, state="", unitid=None):
+    """
+    Average in-state and out-of-state tuition by state and Carnegie
+    classification, from the cube: the tuition_rate_summary columns
+    (PLOT 2).
+    """
+    summary = cube.aggregate(
+        ["tuitionfee_in", "tuitionfee_out"], by=["stabbr", "c_basic"],
+        unitid=unitid, require=["tuitionfee_in", "tuitionfee_out"],
+        year=year, stabbr=state)
+    # institutions without an IPEDS directory entry have no state
+    summary = summary.dropna(subset=["stabbr"])
+    return pd.DataFrame({
+        "stabbr": summary["stabbr"],
+        "c_basic": summary["c_basic"],
+        "avg_in_state_tuition": summary["tuitionfee_in"].round(2),
+        "avg_out_state_tuition": summary["tuitionfee_out"].round(2),
+    }).reset_index(drop=True)
+
+
+def cube_loan_repayment(cube, year):
+    """
+    Repayment rate of every institution in a year, from the cube: the
+    loan_repayment_performance columns (PLOT 3).
+    """
+    loans = cube.rows(["repayment_rate"], require=["repayment_rate"],
+                      year=year)
+    loans = loans.dropna(subset=["stabbr"])
+    return loans[["unitid", "instnm", "stabbr", "control",
+                  "repayment_rate"]].reset_index(drop=True)
+
+
+def bin_tuition_adm(df, tuition_col, bins=LOD_BINS):
+    """
+    2D histogram of institutions by tuition and admission rate, in one
+    vectorized pass. Rows missing either value are left out.
+
+    Returns one row per non-empty bin with its edges (tuition_lo,
+    tuition_hi, adm_lo, adm_hi) and the number of institutions, so the
+    size is bounded by the number of bins, not of institutions.
+    """
+    tuition = pd.to_numeric(df[tuition_col], errors="coerce") \
+        .to_numpy(dtype=float, na_value=np.nan)
+    adm = pd.to_numeric(df["adm_rate"], errors="coerce") \
+        .to_numpy(dtype=float, na_value=np.nan)
+    keep = ~(np.isnan(tuition) | np.isnan(adm))
+    tuition, adm = tuition[keep], adm[keep]
+
+    if tuition.size == 0:
+        return pd.DataFrame(columns=["tuition_lo", "tuition_hi", "adm_lo",
+                                     "adm_hi", "institutions"])
+
+    counts, tuition_edges, adm_edges = np.histogram2d(
+        tuition, adm, bins=bins,
+        range=[[0, max(tuition.max(), 1)], [0, 1]])
+    ix, iy = np.nonzero(counts)
+    return pd.DataFrame({
+        "tuition_lo": tuition_edges[ix],
+        "tuition_hi": tuition_edges[ix + 1],
+        "adm_lo": adm_edges[iy],
+        "adm_hi": adm_edges[iy + 1],
+        "institutions": counts[ix, iy].astype(int)
+    })
+
+
+def _make_tuition_adm_lod_plot(df, tuition_col, tuition_type,
+                               institution_selected, state_selected, bins):
+    """
+    Level-of-detail version of the tuition-admission rate plot:
+    a density of binned institutions in the background, and only the
+    selected state's and institution's points drawn individually.
+    """
+    state_legend = f"State selected: {state_selected}"
+    insitution_legend = "Institution selected"
+
+    density = (
+        alt.Chart(bin_tuition_adm(df, tuition_col, bins))
+        .mark_rect()
+        .encode(
+            x=alt.X("tuition_lo:Q", title=f"{tuition_type} Tuition Fee"),
+            x2="tuition_hi:Q",
+            y=alt.Y("adm_lo:Q", title="Admission Rate"),
+            y2="adm_hi:Q",
+            color=alt.Color("institutions:Q", title="Institutions",
+                            scale=alt.Scale(scheme="greys")),
+            tooltip=["tuition_lo", "tuition_hi", "adm_lo", "adm_hi",
+                     "institutions"]
+        )
+    )
+
+    # Masks are built on the key columns only, the frame is not copied
+    selected_mask_inst = pd.Series(False, index=df.index)
+    selected_mask_state = pd.Series(False, index=df.index)
+    if institution_selected:
+        selected_mask_inst = df["unitid"] == institution_selected
+    if state_selected:
+        selected_mask_state = df["stabbr"] == state_selected
+
+    selected = df.loc[selected_mask_inst | selected_mask_state,
+                      ["unitid", "instnm", "stabbr", tuition_col,
+                       "adm_rate"]]
+    selected = selected.assign(Filter=np.where(
+        selected_mask_inst[selected.index], insitution_legend,
+        state_legend))
+
+    points = (
+        alt.Chart(selected)
+        .mark_circle(size=60)
+        .encode(
+            x=f"{tuition_col}:Q",
+            y="adm_rate:Q",
+            tooltip=["instnm", "stabbr", tuition_col, "adm_rate"],
+            color=alt.Color("Filter:N", scale=alt.Scale(
+                domain=[state_legend, insitution_legend],
+                range=["steelblue", "red"]))
+        )
+    )
+
+    labels = (
+        alt.Chart(selected[selected["Filter"] == insitution_legend])
+        .mark_text(dx=5, dy=-5)
+        .encode(
+            x=f"{tuition_col}:Q",
+            y="adm_rate:Q",
+            text="instnm:N"
+        )
+    )
+
+    return ((density + points + labels)
+            .resolve_scale(color="independent")
+            .interactive())
+
+
 def make_tuition_adm_plot(
     df,
     institution_selected=None,
     state_selected=None,
-    tuition_type="In-state"
+    tuition_type="In-state",
+    lod=False,
+    bins=LOD_BINS
 ):
     """
     Generate the tuition-admission rate plot based on the applied filters
-    """
-
-    df = df.copy()
 
+    With lod=True the other institutions are drawn as a binned density
+    (bins = tuition x admission rate bins) instead of one point each, so
+    the chart data stays the same size however many institutions exist.
+    """
     # Determine which tuition column to use
     if tuition_type == "In-state":
         tuition_col = "tuitionfee_in"
     else:
         tuition_col = "tuitionfee_out"
 
+    if lod:
+        return _make_tuition_adm_lod_plot(df, tuition_col, tuition_type,
+                                          institution_selected,
+                                          state_selected, bins)
+
+    df = df.copy()
+
     # Create a boolean column indicating how points should be highlighted
     selected_mask_state = pd.Series(False, index=df.index)
     selected_mask_inst = pd.Series(False, index=df.index)
@@ -108,3 +900,396 @@ def make_tuition_adm_plot(
     )
 
     return (base + labels).interactive()
+
+
+def fingerprint(df, **params):
+    """
+    Hash of a frame's content (values, column names and dtypes)
+    together with the parameters a chart is built with.
+    """
+    digest = hashlib.sha1(
+        pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(repr((list(df.columns), [str(t) for t in df.dtypes],
+                        sorted(params.items()))).encode())
+    return digest.hexdigest()
+
+
+def cached_chart(builder, df, **params):
+    """
+    Build a chart with builder(df, **params) once per distinct input and
+    reuse it on later reruns, in any session, while the input is unchanged.
+
+    Altair charts are kept as their Vega-Lite spec (pass it to
+    st.vega_lite_chart), already serialized, with the data stored once
+    under "datasets" and referenced by its content hash. Other results
+    (pydeck decks, tuples, None) are kept as returned.
+    """
+    key = (builder.__name__, fingerprint(df, **params))
+    with _chart_cache_lock:
+        if key in _chart_cache:
+            _chart_cache.move_to_end(key)
+            result = _chart_cache[key]
+            # Streamlit may pop keys (e.g. "datasets") from the spec
+            return dict(result) if isinstance(result, dict) else result
+
+    result = builder(df, **params)
+    if isinstance(result, alt.TopLevelMixin):
+        result = result.to_dict()
+
+    with _chart_cache_lock:
+        _chart_cache[key] = result
+        if len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return dict(result) if isinstance(result, dict) else result
+
+
+# ---- Report builders ----
+# Shared by education-report.py and the render_report.py pre-renderer
+
+
+# Columns whose catalog statistics set the report scales
+SCALE_COLUMNS = ["TUITIONFEE_IN", "TUITIONFEE_OUT", "CDR2", "CDR3",
+                 "AVGFACSAL"]
+
+
+def report_scales(year, tuition_type="In-state"):
+    """
+    Axis floors and color ranges of the report charts for a year,
+    read from the statistics catalog in one query.
+
+    Returns dict with tuition_floor, repayment_floor and salary_range.
+    """
+    stats = get_column_stats(SCALE_COLUMNS)
+    tuition_col = ("TUITIONFEE_IN" if tuition_type == "In-state"
+                   else "TUITIONFEE_OUT")
+    worst_default = max(catalog_value(stats, "CDR3", "p95", agg="max",
+                                      default=0),
+                        catalog_value(stats, "CDR2", "p95", agg="max",
+                                      default=0))
+    return {
+        # averages rarely fall below the lowest yearly 25th percentile
+        "tuition_floor": catalog_value(stats, tuition_col, "p25",
+                                       default=5000),
+        # repayment rate = 1 - default rate
+        "repayment_floor": (100 * (1 - worst_default)
+                            if worst_default else 70),
+        "salary_range": (
+            catalog_value(stats, "AVGFACSAL", "min_value", year=year),
+            catalog_value(stats, "AVGFACSAL", "max_value", year=year))
+    }
+
+
+def get_institution_summary(state_selected=""):
+    """
+    Query institution counts by state and type for the most recent year.
+
+    Returns (most recent year, raw summary DataFrame)
+    """
+    max_year = query_data(queries.get_most_recent_year,
+                          params=())['max'].to_list()[0]
+    params = [max_year]
+
+    inst_summary_query = queries.year_institute_summary_begin
+    if state_selected:
+        inst_summary_query += " AND iped_ins.STABBR = %s"
+        params.append(state_selected)
+    inst_summary_query += queries.year_institute_summary_end
+
+    return max_year, query_data(inst_summary_query, params=params)
+
+
+def make_institution_summary(df):
+    """
+    Pivot institution counts into a State x Type table (PLOT 1)
+    """
+    df = df.rename(columns={
+        "control": "Type",
+        "stabbr": "State",
+        "count": "Institution Count"
+    })
+
+    df["Type"] = df["Type"].fillna("Unknown")
+
+    pivot_df = (
+        df.pivot_table(
+            index="State",
+            columns="Type",
+            values="Institution Count",
+            aggfunc="sum",
+            fill_value=0
+        )
+        .reset_index()
+    )
+
+    pivot_df.columns.name = None
+    return pivot_df
+
+
+def make_tuition_summary_table(df):
+    """
+    Format the tuition summary by state and Carnegie class (PLOT 2)
+    """
+    df = df.copy()
+
+    # map to get "$"
+    df["avg_in_state_tuition"] = df[
+        "avg_in_state_tuition"].map("${:,.0f}".format)
+    df["avg_out_state_tuition"] = df[
+        "avg_out_state_tuition"].map("${:,.0f}".format)
+
+    return df.rename(columns={
+        "stabbr": "State",
+        "c_basic": "Carnegie Classification",
+        "avg_in_state_tuition": "Avg In-State Tuition",
+        "avg_out_state_tuition": "Avg Out of State Tuition"
+    })
+
+
+def make_loan_performance_tables(loan_df, state_selected=None, top_n=10):
+    """
+    Best- and worst-performing institutions by loan repayment rate (PLOT 3)
+
+    Returns (best DataFrame, worst DataFrame)
+    """
+    # filter by state if one is selected
+    if state_selected:
+        loan_df = loan_df[loan_df["stabbr"] == state_selected]
+
+    # Clean up / rename columns
+    loan_df = loan_df.rename(columns={
+        "instnm": "Institution",
+        "stabbr": "State",
+        "control": "Type",
+        "repayment_rate": "Repayment Rate"
+    })
+
+    # If repayment is 0–1, you can convert to %
+    if loan_df["Repayment Rate"].max() <= 1.0:
+        loan_df["Repayment Rate"] = loan_df["Repayment Rate"] * 100
+
+    # Sort for best / worst
+    display_cols = ["Institution", "State", "Type", "Repayment Rate"]
+    best_df = (
+        loan_df.sort_values("Repayment Rate", ascending=False)
+        .head(top_n)
+    )
+    worst_df = (
+        loan_df.sort_values("Repayment Rate", ascending=True)
+        .head(top_n)
+    )
+    return best_df[display_cols], worst_df[display_cols]
+
+
+def make_tuition_repayment_charts(
+    tuition_repay_df,
+    state_selected=None,
+    agg_level="All Institutions",
+    tuition_type="In-state",
+    tuition_floor=5000,
+    repayment_floor=70
+):
+    """
+    Tuition and loan repayment rate over time charts (PLOT 4)
+
+    tuition_floor / repayment_floor set the bottom of the y axes
+    (see report_scales for values from the statistics catalog).
+    Returns the stacked Altair chart, or None if there is no data.
+    """
+    # state filter
+    if state_selected:
+        tuition_repay_df = tuition_repay_df[tuition_repay_df["stabbr"]
+                                            == state_selected]
+
+    if tuition_repay_df.empty:
+        return None
+
+    # Basic cleanup / rename
+    tuition_repay_df = tuition_repay_df.rename(columns={
+        "year": "Year",
+        "control": "Type",
+        "avg_in_state_tuition": "Avg In-State Tuition",
+        "avg_out_state_tuition": "Avg Out-of-State Tuition",
+        "avg_repayment_rate": "Avg Repayment Rate"
+    })
+
+    # If Avg Repayment is 0–1, convert to percentage
+    if tuition_repay_df["Avg Repayment Rate"].max() <= 1.0:
+        tuition_repay_df["Avg Repayment Rate"] = (
+            tuition_repay_df["Avg Repayment Rate"] * 100
+        )
+
+    # Choose tuition metric
+    if tuition_type == "In-state":
+        tuition_col = "Avg In-State Tuition"
+    else:
+        tuition_col = "Avg Out-of-State Tuition"
+
+    # Decide grouping based on aggregation level
+    if agg_level == "All Institutions":
+        # Aggregate across all Types if not already aggregated
+        group_cols = ["Year"]
+        color_encoding = alt.value("steelblue")  # single color
+    else:
+        # Group by Year + Type (Public / Private / For-profit)
+        group_cols = ["Year", "Type"]
+        color_encoding = "Type:N"
+
+    df_agg = (tuition_repay_df
+              .groupby(group_cols, as_index=False)
+              .agg({
+                  tuition_col: "mean",
+                  "Avg Repayment Rate": "mean"
+              }))
+
+    # Tuition chart over time
+    tuition_chart = (
+        alt.Chart(df_agg)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("Year:O", title="Year"),
+            y=alt.Y(
+                f"{tuition_col}:Q",
+                title=tuition_col,
+                scale=alt.Scale(domain=[tuition_floor,
+                                        df_agg[tuition_col].max()])
+            ),
+            color=color_encoding,
+            tooltip=(
+                ["Year", "Type", tuition_col]
+                if "Type" in df_agg.columns
+                else ["Year", tuition_col]
+            )
+        )
+        .properties(
+            height=250,
+            title="Average Tuition Over Time"
+        )
+    )
+
+    # Repayment chart over time
+    repay_chart = (
+        alt.Chart(df_agg)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X("Year:O", title="Year"),
+            y=alt.Y(
+                "Avg Repayment Rate:Q",
+                title="Avg Repayment Rate (%)",
+                scale=alt.Scale(domain=[repayment_floor,
+                                        df_agg["Avg Repayment Rate"].max()])
+            ),
+            color=color_encoding,
+            tooltip=(
+                ["Year", "Type", "Avg Repayment Rate"]
+                if "Type" in df_agg.columns
+                else ["Year", "Avg Repayment Rate"])
+        )
+        .properties(
+            height=250,
+            title="Average Loan Repayment Rate Over Time"
+        )
+    )
+
+    return tuition_chart & repay_chart
+
+
+def make_sat_carnegie_table(df):
+    """
+    Average SAT score by Carnegie Basic Classification (PLOT 5)
+    """
+    df = df.rename(
+        columns={"carnegie_basic": "Carnegie Classification",
+                 "avg_sat_score": "Average SAT Score"})
+    df["Average SAT Score"] = df["Average SAT Score"].round(0)
+    return df
+
+
+def salary_to_color(s, min_sal, max_sal):
+    """
+    Map a salary to an RGB color, darker for higher salaries.
+    """
+    if min_sal == max_sal:
+        return [200, 200, 200]   # light grey for missing salary
+    return [
+        0,
+        int(100 + 155 * (s - min_sal) / (max_sal - min_sal)),
+        int(180 - 120 * (s - min_sal) / (max_sal - min_sal))
+    ]
+
+
+def make_faculty_salary_map(df, salary_range=None):
+    """
+    Map of average faculty salaries and its color legend (PLOT 7)
+
+    salary_range: (min, max) of the color scale, e.g. from the statistics
+    catalog; computed from df when not given.
+    Returns (pydeck Deck, legend HTML)
+    """
+    df = df.copy()
+    df["avg_faculty_salary"] = pd.to_numeric(
+        df["avg_faculty_salary"], errors="coerce")
+
+    # Normalize salary → darker color for higher salary
+    if salary_range is not None and None not in salary_range:
+        min_sal, max_sal = salary_range
+    else:
+        min_sal = df["avg_faculty_salary"].min()
+        max_sal = df["avg_faculty_salary"].max()
+
+    df["color"] = df["avg_faculty_salary"].apply(
+        salary_to_color, args=(min_sal, max_sal))
+
+    layer = pdk.Layer(
+        "ScatterplotLayer",
+        df,
+        get_position='[longitude, latitude]',
+        get_color='color',
+        get_radius=25000,
+        pickable=True,
+    )
+
+    view_state = pdk.ViewState(
+        latitude=37.5,   # Centers on USA
+        longitude=-96,
+        zoom=3.5,
+    )
+
+    deck = pdk.Deck(
+        layers=[layer],
+        initial_view_state=view_state,
+        tooltip={
+            "html": "<b>State:</b> {stabbr}<br/>"
+                    "<b>Avg Salary:</b> ${avg_faculty_salary}",
+        }
+    )
+
+    low_color = salary_to_color(min_sal, min_sal, max_sal)
+    high_color = salary_to_color(max_sal, min_sal, max_sal)
+
+    low_rgb = f"rgb({low_color[0]}, {low_color[1]}, {low_color[2]})"
+    high_rgb = f"rgb({high_color[0]}, {high_color[1]}, {high_color[2]})"
+
+    legend_html = f"""
+    <div style="margin-top:20px;">
+        <b>Legend: Faculty Salary Range</b>
+        <div style="
+            height: 20px;
+            background: linear-gradient(to right, {low_rgb}, {high_rgb});
+            border: 1px solid #aaa;
+            margin-top: 5px;
+        "></div>
+        <div style="
+            display: flex;
+            justify-content: space-between;
+            font-size: 15px;
+            color: #222;
+            font-weight: 600;
+            margin-top: 4px;
+        ">
+            <span>${min_sal:,.0f}</span>
+            <span>${(min_sal+max_sal)/2:,.0f}</span>
+            <span>${max_sal:,.0f}</span>
+        </div>
+    </div>
+    """
+    return deck, legend_html
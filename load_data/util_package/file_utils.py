@@ -0,0 +1,123 @@
+'''Utilities file with functions to read source files
+directly from .zip / .gz / .bz2 downloads without extracting them'''
+import bz2
+import gzip
+import hashlib
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+import pandas as pd
+
+# Separates an archive from one of its members: "bundle.zip::MERGED.csv"
+MEMBER_SEPARATOR = "::"
+
+
+def split_source(path):
+    """
+    Split a source path into (file path, archive member).
+    The member is None when the path does not name one.
+    """
+    if MEMBER_SEPARATOR in path:
+        archive, member = path.split(MEMBER_SEPARATOR, 1)
+        return archive, member
+    return path, None
+
+
+def source_name(path):
+    """
+    Name used to find the year of a source:
+    the archive member if there is one, else the file name
+    (without folders, which may contain other digits).
+    """
+    archive, member = split_source(path)
+    name = os.path.basename(member if member is not None else archive)
+    # data.csv.gz -> data.csv
+    return re.sub(r"\.(gz|bz2)$", "", name, flags=re.IGNORECASE)
+
+
+def expand_sources(path, member_pattern):
+    """
+    List the sources to load from a path.
+
+    A .zip without a member becomes one source per CSV member whose name
+    matches `member_pattern` (e.g. every MERGED file of the Scorecard
+    bundle), in name order. Any other path is returned as is.
+    """
+    archive, member = split_source(path)
+    if member is not None or not zipfile.is_zipfile(archive):
+        return [path]
+
+    pattern = re.compile(member_pattern, re.IGNORECASE)
+    with zipfile.ZipFile(archive) as zf:
+        members = sorted(
+            name for name in zf.namelist()
+            if pattern.search(os.path.basename(name)))
+    if not members:
+        raise FileNotFoundError(
+            f"No member matching {member_pattern} found in {archive}.")
+    return [f"{archive}{MEMBER_SEPARATOR}{name}" for name in members]
+
+
+@contextmanager
+def open_source(path):
+    """
+    Open a source for reading as a binary stream, decompressing on the fly.
+
+    Supports plain files, .gz, .bz2, and .zip archives
+    ("bundle.zip::member.csv", or "file.zip" holding a single CSV).
+    Nothing is extracted to disk.
+    """
+    archive, member = split_source(path)
+
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            if member is None:
+                csvs = [name for name in zf.namelist()
+                        if name.lower().endswith(".csv")]
+                if len(csvs) != 1:
+                    raise ValueError(
+                        f"{archive} holds {len(csvs)} CSV files; "
+                        f"name one as {archive}{MEMBER_SEPARATOR}<member>.")
+                member = csvs[0]
+            with zf.open(member) as f:
+                yield f
+    elif member is not None:
+        raise ValueError(f"{archive} is not a zip archive.")
+    elif archive.lower().endswith(".gz"):
+        with gzip.open(archive, "rb") as f:
+            yield f
+    elif archive.lower().endswith(".bz2"):
+        with bz2.open(archive, "rb") as f:
+            yield f
+    else:
+        with open(archive, "rb") as f:
+            yield f
+
+
+def read_csv_chunks(path, chunksize, usecols=None, dtype=None,
+                    encoding=None):
+    """
+    Read a source (see open_source) as DataFrames of at most `chunksize`
+    rows, so that files larger than memory can be loaded chunk by chunk.
+
+    usecols: columns to parse (list, or callable taking a column name);
+             the other columns are skipped by the parser.
+    """
+    with open_source(path) as f:
+        with pd.read_csv(f, chunksize=chunksize, usecols=usecols,
+                         dtype=dtype, encoding=encoding,
+                         low_memory=False) as reader:
+            yield from reader
+
+
+def file_hash(path):
+    """
+    SHA-256 of a source's (decompressed) content, identifying a file
+    independently of its name or location.
+    """
+    digest = hashlib.sha256()
+    with open_source(path) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,111 @@
+'''Registry of the IPEDS survey components load_ipeds.py can load.
+Each component declares the files it reads, the columns it keeps,
+its cleaner and its target table; the driver dispatches on file name'''
+import re
+import load_data.util_package.sql_queries as queries
+import load_data.cleaning_package.cleaning_ipeds as clean_ipeds
+
+# Component name -> declaration (see register)
+COMPONENTS = {}
+
+
+def register(name, pattern, table, create_query=None, columns=None,
+             keys=None, cleaner=None, loader=None):
+    """
+    Declare an IPEDS survey component.
+
+    Parameters
+    ----------
+    name : str
+        Short IPEDS name, e.g. "EF".
+    pattern : str
+        Regex matching the component's file names (case insensitive),
+        with a named group `year`: 4 digits, or the first 2 digits of an
+        academic year (sfa2122 -> 2021).
+    table : str
+        Target table.
+    create_query : str, optional
+        CREATE TABLE statement of a table partitioned BY LIST (YEAR).
+    columns : list of str, optional
+        Columns to read from the file; the others are not parsed.
+    keys : list of str, optional
+        Columns that identify a row of the file (the table's primary key
+        without YEAR); a row whose keys were already loaded is dropped.
+    cleaner : callable, optional
+        Function (chunk, year) -> clean DataFrame with the table's columns.
+    loader : callable, optional
+        Function (path, year, **options) -> {table: rows} for components
+        that need their own load (e.g. HD). Without one, the component is
+        bulk loaded chunk by chunk (ipeds_utils.load_component).
+
+    Returns
+    -------
+    dict
+        The component's declaration.
+    """
+    COMPONENTS[name] = {
+        "name": name,
+        "pattern": re.compile(pattern, re.IGNORECASE),
+        "table": table,
+        "create_query": create_query,
+        "columns": columns,
+        "keys": keys,
+        "cleaner": cleaner,
+        "loader": loader,
+    }
+    return COMPONENTS[name]
+
+
+def find_component(file_name):
+    """
+    Component whose pattern matches a file name (see
+    file_utils.source_name), or None.
+    """
+    for component in COMPONENTS.values():
+        if component["pattern"].search(file_name):
+            return component
+    return None
+
+
+def component_year(component, file_name):
+    """
+    Year of a component file, from the `year` group of its pattern.
+    """
+    year = component["pattern"].search(file_name).group("year")
+    return year if len(year) == 4 else f"20{year}"
+
+
+def sources_pattern():
+    """
+    Regex matching the files of every registered component, to pick the
+    members of a .zip bundle.
+    """
+    patterns = [component["pattern"].pattern for component in
+                COMPONENTS.values()]
+    # one `year` group per alternative would clash
+    return "|".join(f"(?:{p})".replace("(?P<year>", "(") for p in patterns)
+
+
+register("EF", r"^ef(?P<year>\d{4})a(_rv)?\.csv$", "Enrollment_IPEDS",
+         create_query=queries.CREATE_ENROLLMENT_IPEDS,
+         columns=clean_ipeds.ENROLLMENT_KEYS + clean_ipeds.ENROLLMENT_COLS,
+         keys=clean_ipeds.ENROLLMENT_KEYS,
+         cleaner=clean_ipeds.clean_enrollment)
+
+register("SAL", r"^sal(?P<year>\d{4})_is(_rv)?\.csv$", "Salaries_IPEDS",
+         create_query=queries.CREATE_SALARIES_IPEDS,
+         columns=clean_ipeds.SALARIES_KEYS + clean_ipeds.SALARIES_COLS,
+         keys=clean_ipeds.SALARIES_KEYS,
+         cleaner=clean_ipeds.clean_salaries)
+
+register("SFA", r"^sfa(?P<year>\d{2})\d{2}(_rv)?\.csv$", "Aid_IPEDS",
+         create_query=queries.CREATE_AID_IPEDS,
+         columns=clean_ipeds.AID_KEYS + clean_ipeds.AID_COLS,
+         keys=clean_ipeds.AID_KEYS,
+         cleaner=clean_ipeds.clean_aid)
+
+register("GR", r"^gr(?P<year>\d{4})(_rv)?\.csv$", "Graduation_IPEDS",
+         create_query=queries.CREATE_GRADUATION_IPEDS,
+         columns=clean_ipeds.GRADUATION_KEYS + clean_ipeds.GRADUATION_COLS,
+         keys=clean_ipeds.GRADUATION_KEYS,
+         cleaner=clean_ipeds.clean_graduation)
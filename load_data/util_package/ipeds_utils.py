@@ -1,34 +1,45 @@
 '''Utilities file with functions to help
-create, load, update, and delete college score card data'''
+create, load, update, and delete IPEDS data: the HD directory with its
+Carnegie classifications, and the survey components of the registry
+(ipeds_components.py), bulk loaded chunk by chunk'''
 import pandas as pd
 import psycopg
 import os
 import re
-import load_data.util_package.credentials as credentials
+import load_data.util_package.connection_utils as connection_utils
 import load_data.util_package.logging as log
+import load_data.util_package.sql_queries as queries
+import load_data.util_package.file_utils as file_utils
+import load_data.util_package.bulk_utils as bulk_utils
+# the Dim_<column> tables are shared with the College Scorecard loader
+from load_data.util_package.collegescorecard_utils import load_dimensions
+
+# Rows parsed, cleaned and copied at a time by load_component
+CHUNK_ROWS = 50000
 
 
 def get_connection():
     """
-    Establish and return a PostgreSQL database connection.
-    Uses credentials from config/credentials.py.
+    Establish and return a PostgreSQL database connection to the primary.
+    Uses credentials and hosts from config/credentials.py
+    (see connection_utils.py).
     This function can be imported and reused throughout the ETL pipeline.
     """
-    conn = psycopg.connect(host="debprodserver.postgres.database.azure.com",
-                           dbname=credentials.DB_USER,
-                           user=credentials.DB_USER,
-                           password=credentials.DB_PASSWORD)
-    return conn
+    return connection_utils.get_write_connection()
 
 
 def load_data(path_file, year):
     '''
     This function takes in a CSV file and year and returns a pandas DataFrame.
+    The CSV can be compressed (.gz/.bz2) or inside a .zip archive
+    ("HD2022.zip" or "bundle.zip::hd2022.csv"); it is decompressed while
+    parsing.
     Only rows with non-missing dataframe are returned.
     Rows missing required fields are saved and outputted into csv file.
     '''
     try:
-        data = pd.read_csv(path_file, encoding="latin1", dtype=str)
+        with file_utils.open_source(path_file) as f:
+            data = pd.read_csv(f, encoding="latin1", dtype=str)
         print(f"{data.shape[0]} rows read from file.")
 
         # Add a year column
@@ -103,28 +114,80 @@ def insert_data(query, df):
     query : str
         SQL INSERT statement from sql_queries.py.
     df : pandas.DataFrame
-        Clean data to insert; each row corresponds to the placeholders.
+        Clean data to insert; each row corresponds to the placeholders
+        (or, for named placeholders, each column to the placeholder name).
+
+    Returns
+    -------
+    int or None
+        Number of rows inserted or updated, or None if the insert failed.
     """
     conn = get_connection()
     cur = conn.cursor()
-    table_name = query.split("(")[0].strip().split()[-1]
+    table_name = bulk_utils.insert_table_name(query)
     print(f"====INSERTING TO {table_name} TABLE====")
     try:
         with conn.transaction():
-            cur.executemany(query, df.values.tolist())
+            # named placeholders (%(COLUMN)s) take the values by column
+            if "%(" in query:
+                rows = df.to_dict("records")
+            else:
+                rows = df.values.tolist()
+            cur.executemany(query, rows)
             print(
                 f"SUCCESS: {cur.rowcount} rows inserted",
                 f"or updated into {table_name}\n")
+        return cur.rowcount
     except Exception as e:
         log.get_logger(__name__).error(
             f"Insertion failed at row: {e}", exc_info=True)
         print(f"Insert failed at row: {cur.rowcount}")
         print(f"Error: {e}")
         print(df.iloc[[cur.rowcount], :])
+        return None
     finally:
         cur.close()
         conn.close()
 
+
+def load_component(component, path_file, year, chunk_rows=CHUNK_ROWS):
+    """
+    Bulk load one file of an IPEDS survey component (see
+    ipeds_components.py) into the year's partition of its table.
+
+    The file is read `chunk_rows` rows at a time, only the component's
+    columns are parsed, and each cleaned chunk is copied with COPY
+    (bulk_utils.load_year_partition), so files of any size load in
+    bounded memory. A row whose component keys were already loaded from
+    an earlier chunk is dropped, as the cleaner only sees its own chunk.
+
+    Returns
+    -------
+    dict
+        Table name -> number of rows loaded.
+    """
+    create_table(component["create_query"])
+    columns = set(component["columns"])
+    seen = set()
+
+    def cleaned_chunks():
+        for chunk in file_utils.read_csv_chunks(
+                path_file, chunk_rows,
+                usecols=lambda col: col.strip().upper() in columns,
+                dtype=str, encoding="latin1"):
+            clean = component["cleaner"](chunk, year)
+            if component["keys"]:
+                keys = list(zip(*(clean[col] for col in component["keys"])))
+                new = [key not in seen for key in keys]
+                seen.update(keys)
+                clean = clean[new]
+            yield clean
+
+    rows = bulk_utils.load_year_partition(get_connection, component["table"],
+                                          year, cleaned_chunks())
+    return {component["table"]: rows}
+
+
 # Carnegie Classification Variable Cleaning
 
 
@@ -0,0 +1,135 @@
+'''Utilities file with functions to refresh planner statistics,
+vacuum the tables touched by a load and record the load'''
+import time
+from psycopg import sql
+import load_data.util_package.logging as log
+import load_data.util_package.sql_queries as queries
+
+# A load that changed at least this fraction of a table's live rows
+# gets VACUUM (ANALYZE) instead of a plain ANALYZE
+VACUUM_FRACTION = 0.1
+
+
+def add_changed(changed, rowcounts):
+    """
+    Add the rows inserted or updated per table of one insert step
+    ({table name: rowcount or None}) to the running totals of a load.
+    """
+    for table_name, rowcount in rowcounts.items():
+        if rowcount:
+            changed[table_name] = changed.get(table_name, 0) + rowcount
+    return changed
+
+
+def run_maintenance(get_connection, changed,
+                    vacuum_fraction=VACUUM_FRACTION, analyzed=()):
+    """
+    Refresh planner statistics of the tables a load changed, so the first
+    dashboard queries after a load do not wait for autovacuum.
+
+    Tables where the load changed at least `vacuum_fraction` of the live
+    rows are vacuumed as well (upserts leave dead tuples behind).
+    Failures are logged and reported but do not fail the load.
+
+    Parameters
+    ----------
+    get_connection : callable
+        Connection factory of the loader's utilities module.
+    changed : dict
+        Table name -> number of rows inserted or updated.
+    analyzed : list of str, optional
+        Tables the load already analyzed (e.g. swapped in by --swap);
+        they are listed in the results but not maintained again.
+
+    Returns
+    -------
+    list of dict
+        One entry per table: table, changed, action, seconds
+        (action is None if maintenance failed).
+    """
+    results = []
+    if not changed:
+        return results
+
+    conn = get_connection()
+    # VACUUM cannot run inside a transaction block
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for table_name, rows in changed.items():
+                start_time = time.time()
+                if table_name in analyzed:
+                    results.append({"table": table_name, "changed": rows,
+                                    "action": "ANALYZE (during load)",
+                                    "seconds": 0.0})
+                    continue
+                try:
+                    cur.execute(queries.SELECT_LIVE_TUPLES,
+                                (table_name.lower(),))
+                    row = cur.fetchone()
+                    live_rows = max(row[0] if row else 0, 1)
+                    action = ("VACUUM (ANALYZE)"
+                              if rows >= vacuum_fraction * live_rows
+                              else "ANALYZE")
+                    # tables are created unquoted, so their names are
+                    # stored in lower case
+                    cur.execute(sql.SQL(action + " {}").format(
+                        sql.Identifier(table_name.lower())))
+                except Exception as e:
+                    log.get_logger(__name__).error(
+                        f"Maintenance of {table_name} failed: {e}",
+                        exc_info=True)
+                    print(f"Maintenance of {table_name} failed: {e}")
+                    action = None
+                results.append({"table": table_name, "changed": rows,
+                                "action": action,
+                                "seconds": time.time() - start_time})
+    finally:
+        conn.close()
+    return results
+
+
+def print_load_summary(changed, maintenance):
+    """
+    Print the rows changed per table and the maintenance run on each.
+    """
+    print("====LOAD SUMMARY====")
+    for result in maintenance:
+        if result["action"] is None:
+            print(f"FAILED : {result['table']} ({result['changed']} rows",
+                  "changed, maintenance failed)")
+        else:
+            print(f"SUCCESS: {result['table']} ({result['changed']} rows",
+                  f"changed, {result['action']} in",
+                  f"{result['seconds']:.2f} seconds)")
+    if not changed:
+        print("No rows changed; maintenance skipped.")
+    total = sum(result["seconds"] for result in maintenance)
+    print(f"{total:.2f} seconds taken by post-load maintenance.")
+
+
+def record_load(get_connection, changed):
+    """
+    Record a completed run in Load_History. Its LOAD_ID becomes the load
+    version the dashboard caches are keyed by, so they are rebuilt on
+    their next use. Failures are logged and reported but do not fail
+    the load.
+
+    Returns the LOAD_ID, or None if it could not be recorded.
+    """
+    conn = get_connection()
+    try:
+        with conn.transaction(), conn.cursor() as cur:
+            cur.execute(queries.CREATE_LOAD_HISTORY)
+            cur.execute(queries.INSERT_LOAD_HISTORY,
+                        (sorted(changed), sum(changed.values())))
+            load_id = cur.fetchone()[0]
+        print(f"Load recorded as load version {load_id}.")
+        return load_id
+    except Exception as e:
+        log.get_logger(__name__).error(
+            f"Recording the load failed: {e}", exc_info=True)
+        print(f"Recording the load failed: {e}")
+        return None
+    finally:
+        conn.close()
@@ -0,0 +1,171 @@
+'''Utilities file with functions to profile the stages of a load
+(--profile): a CPU profile and the top memory allocations per stage.
+Nothing is wrapped, and nothing costs anything, unless enable() is called'''
+import cProfile
+import functools
+import os
+import re
+import threading
+import time
+import tracemalloc
+import pandas as pd
+import load_data.util_package.bulk_utils as bulk_utils
+
+# pyinstrument (sampling) writes speedscope flamegraphs; without it the
+# stages are profiled with cProfile
+try:
+    import pyinstrument
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    pyinstrument = None
+
+PROFILE_DIR = "profiles"
+
+# Lines listed in each stage's allocation report
+TOP_ALLOCATIONS = 20
+
+# Profiling session, set by enable()
+_session = None
+
+
+def enable(out_dir=PROFILE_DIR):
+    """
+    Start a profiling session writing to a new timestamped folder of
+    `out_dir`, and start tracing memory allocations.
+    Returns the folder.
+    """
+    global _session
+    folder = os.path.join(out_dir, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(folder, exist_ok=True)
+    _session = {"folder": folder, "stages": [], "started": 0,
+                "active": False}
+    tracemalloc.start()
+    profiler = "pyinstrument" if pyinstrument is not None else "cProfile"
+    print(f"Profiling enabled ({profiler} + tracemalloc), writing to",
+          f"{folder}\n")
+    return folder
+
+
+def _stage_name(fn, args):
+    """
+    Name of a stage: the function name, with the table for functions
+    taking an INSERT statement first (insert_data[Institutions]).
+    """
+    if args and isinstance(args[0], str) and \
+            bulk_utils.INSERT_PATTERN.search(args[0]):
+        return f"{fn.__name__}[{bulk_utils.insert_table_name(args[0])}]"
+    return fn.__name__
+
+
+def _write_allocations(path, before, after, peak):
+    """
+    Top allocations of a stage: the lines whose allocated memory grew
+    the most between the two snapshots.
+    """
+    stats = after.compare_to(before, "lineno")
+    with open(path, "w") as f:
+        if peak is not None:
+            f.write(f"Peak traced memory: {peak / 2**20:.1f} MiB\n")
+        f.write(f"Top {TOP_ALLOCATIONS} allocations (size, change):\n\n")
+        for stat in stats[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+
+def _run_stage(fn, args, kwargs):
+    """
+    Run one call as a profiled stage.
+
+    Only one CPU profiler runs at a time: a stage nested in another one
+    (rename_latest_carnegie_columns in clean_directory) gets its own
+    allocation report and shows up inside the outer stage's profile.
+    Calls from other threads (the --parallel writers) are only timed.
+    """
+    name = _stage_name(fn, args)
+    start_time = time.perf_counter()
+    if threading.current_thread() is not threading.main_thread():
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _session["stages"].append({
+                "stage": name, "seconds": time.perf_counter() - start_time,
+                "allocated_mib": None, "peak_mib": None, "profile": None})
+
+    _session["started"] += 1
+    prefix = os.path.join(_session["folder"],
+                          f"{_session['started']:02d}_"
+                          + re.sub(r"[^\w.-]+", "_", name).strip("_"))
+    outer = not _session["active"]
+    profiler = None
+    if outer:
+        _session["active"] = True
+        tracemalloc.reset_peak()
+        if pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+    before = tracemalloc.take_snapshot()
+    start_time = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        seconds = time.perf_counter() - start_time
+        after = tracemalloc.take_snapshot()
+        profile_path = None
+        if profiler is not None and pyinstrument is not None:
+            profiler.stop()
+            profile_path = f"{prefix}.speedscope.json"
+            with open(profile_path, "w") as f:
+                f.write(profiler.output(SpeedscopeRenderer()))
+        elif profiler is not None:
+            profiler.disable()
+            profile_path = f"{prefix}.prof"
+            profiler.dump_stats(profile_path)
+        if outer:
+            _session["active"] = False
+
+        # the peak of a nested stage is part of the outer one's
+        peak = tracemalloc.get_traced_memory()[1] if outer else None
+        _write_allocations(f"{prefix}.allocations.txt", before, after, peak)
+        allocated = sum(stat.size_diff
+                        for stat in after.compare_to(before, "filename"))
+        _session["stages"].append({
+            "stage": name, "seconds": seconds,
+            "allocated_mib": allocated / 2**20,
+            "peak_mib": peak / 2**20 if outer else None,
+            "profile": profile_path and os.path.basename(profile_path)})
+
+
+def instrument(module, *names):
+    """
+    Replace functions of a module with versions that run as profiled
+    stages. Callers must look them up on the module (utils.load_data),
+    as the drivers do. Does nothing unless enable() was called.
+    """
+    if _session is None:
+        return
+    for name in names:
+        fn = getattr(module, name)
+
+        @functools.wraps(fn)
+        def _profiled(*args, _fn=fn, **kwargs):
+            return _run_stage(_fn, args, kwargs)
+        setattr(module, name, _profiled)
+
+
+def report():
+    """
+    Print the time and memory of every stage and save them to
+    summary.csv in the session folder. Does nothing unless enabled.
+    """
+    if _session is None:
+        return
+    summary = pd.DataFrame(_session["stages"],
+                           columns=["stage", "seconds", "allocated_mib",
+                                    "peak_mib", "profile"])
+    summary.to_csv(os.path.join(_session["folder"], "summary.csv"),
+                   index=False)
+    print("====PROFILE SUMMARY====")
+    print(summary.round(2).to_string(index=False))
+    print(f"Profiles and allocation reports written to {_session['folder']}")
@@ -5,6 +5,33 @@
 # QUERY FOR LOADING ##
 #######################
 
+'''
+Dimensions
+'''
+# One small code -> label table per categorical column, named
+# Dim_<column> (e.g. Dim_CONTROL, Dim_C_BASIC). The labels come from
+# CATEGORY_MAPPINGS in the cleaning modules; format with table=...
+
+# --- CREATE ---
+CREATE_DIMENSION = """
+CREATE TABLE IF NOT EXISTS {table}(
+    CODE SMALLINT PRIMARY KEY,
+    LABEL TEXT NOT NULL
+);
+"""
+
+# --- INSERT ---
+INSERT_DIMENSION = """
+INSERT INTO {table}
+    (CODE, LABEL)
+VALUES (%s, %s)
+ON CONFLICT (CODE) DO UPDATE
+SET
+    LABEL = EXCLUDED.LABEL
+WHERE
+    {table}.LABEL IS DISTINCT FROM EXCLUDED.LABEL;
+"""
+
 '''
 Institutions
 '''
@@ -15,10 +42,10 @@ CREATE TABLE IF NOT EXISTS Institutions(
     UNITID INTEGER PRIMARY KEY,
     OPEID INTEGER NOT NULL,
     ACCREDAGENCY TEXT,
-    PREDDEG TEXT,
-    HIGHDEG TEXT,
-    CONTROL TEXT,
-    REGION TEXT,
+    PREDDEG SMALLINT REFERENCES Dim_PREDDEG(CODE),
+    HIGHDEG SMALLINT REFERENCES Dim_HIGHDEG(CODE),
+    CONTROL SMALLINT REFERENCES Dim_CONTROL(CODE),
+    REGION SMALLINT REFERENCES Dim_REGION(CODE),
     LAST_REPORTED INTEGER CHECK (LAST_REPORTED <=
         EXTRACT(YEAR FROM CURRENT_DATE)) NOT NULL,
     LAST_UPDATED TIMESTAMP CHECK (LAST_UPDATED <= NOW()) NOT NULL,
@@ -38,11 +65,11 @@ CREATE TABLE IF NOT EXISTS Institutions_IPEDS(
     LATITUDE NUMERIC(10,7),
     LONGITUDE NUMERIC(10,7),
 
-    C_BASIC VARCHAR,
-    C_IPUG VARCHAR,
-    C_UGPRF VARCHAR,
-    C_ENPRF VARCHAR,
-    C_SZSET VARCHAR,
+    C_BASIC SMALLINT REFERENCES Dim_C_BASIC(CODE),
+    C_IPUG SMALLINT REFERENCES Dim_C_IPUG(CODE),
+    C_UGPRF SMALLINT REFERENCES Dim_C_UGPRF(CODE),
+    C_ENPRF SMALLINT REFERENCES Dim_C_ENPRF(CODE),
+    C_SZSET SMALLINT REFERENCES Dim_C_SZSET(CODE),
 
     COUNTYCD VARCHAR(5),
 
@@ -55,6 +82,13 @@ CREATE TABLE IF NOT EXISTS Institutions_IPEDS(
 );
 """
 
+# Trigram index behind the dashboard institution search (search_institutions)
+CREATE_INSTNM_SEARCH_INDEX = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS Institutions_IPEDS_INSTNM_TRGM
+    ON Institutions_IPEDS USING GIN (LOWER(INSTNM) gin_trgm_ops);
+"""
+
 # --- INSERT ---
 
 INSERT_INSTITUTIONS = """
@@ -166,6 +200,187 @@ WHERE
         FROM EXCLUDED.LAST_REPORTED;
 """
 
+'''
+History (temporal versions of Institutions and Institutions_IPEDS)
+'''
+# Every change to an institution's attributes is kept as a version valid
+# for the years [VALID_FROM, VALID_TO); VALID_TO IS NULL is the current one.
+# The exclusion constraint forbids overlapping versions and its GiST index
+# on (UNITID, int4range(VALID_FROM, VALID_TO)) serves the as-of lookups.
+# Files must be loaded oldest first; an older year than the current
+# version is ignored, and a reload of the same year corrects it in place.
+
+# --- CREATE ---
+CREATE_INSTITUTIONS_HISTORY = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE TABLE IF NOT EXISTS Institutions_history(
+    UNITID INTEGER NOT NULL,
+    OPEID INTEGER NOT NULL,
+    ACCREDAGENCY TEXT,
+    PREDDEG SMALLINT REFERENCES Dim_PREDDEG(CODE),
+    HIGHDEG SMALLINT REFERENCES Dim_HIGHDEG(CODE),
+    CONTROL SMALLINT REFERENCES Dim_CONTROL(CODE),
+    REGION SMALLINT REFERENCES Dim_REGION(CODE),
+    VALID_FROM INTEGER NOT NULL,
+    VALID_TO INTEGER CHECK (VALID_TO > VALID_FROM),
+    RECORDED_AT TIMESTAMP DEFAULT NOW() NOT NULL,
+    EXCLUDE USING GIST (UNITID WITH =,
+                        int4range(VALID_FROM, VALID_TO) WITH &&)
+);
+"""
+
+CREATE_INSTITUTIONS_IPEDS_HISTORY = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE TABLE IF NOT EXISTS Institutions_IPEDS_history(
+    UNITID INTEGER NOT NULL,
+    INSTNM VARCHAR(255) NOT NULL,
+    ADDR VARCHAR(255) NOT NULL,
+    CITY VARCHAR(100) NOT NULL,
+    STABBR VARCHAR(10) NOT NULL,
+    ZIP VARCHAR(5) NOT NULL,
+    LATITUDE NUMERIC(10,7),
+    LONGITUDE NUMERIC(10,7),
+    C_BASIC SMALLINT REFERENCES Dim_C_BASIC(CODE),
+    C_IPUG SMALLINT REFERENCES Dim_C_IPUG(CODE),
+    C_UGPRF SMALLINT REFERENCES Dim_C_UGPRF(CODE),
+    C_ENPRF SMALLINT REFERENCES Dim_C_ENPRF(CODE),
+    C_SZSET SMALLINT REFERENCES Dim_C_SZSET(CODE),
+    COUNTYCD VARCHAR(5),
+    CSA VARCHAR(3),
+    CBSA VARCHAR(5),
+    VALID_FROM INTEGER NOT NULL,
+    VALID_TO INTEGER CHECK (VALID_TO > VALID_FROM),
+    RECORDED_AT TIMESTAMP DEFAULT NOW() NOT NULL,
+    EXCLUDE USING GIST (UNITID WITH =,
+                        int4range(VALID_FROM, VALID_TO) WITH &&)
+);
+"""
+
+# --- INSERT ---
+# Named placeholders: the values are taken from the cleaned dataframe
+# columns (LAST_REPORTED is the year the values are valid from)
+INSERT_INSTITUTIONS_HISTORY = """
+WITH current_version AS (
+    SELECT VALID_FROM,
+        (OPEID, ACCREDAGENCY, PREDDEG, HIGHDEG, CONTROL, REGION)
+        IS NOT DISTINCT FROM
+        (%(OPEID)s::INTEGER, %(ACCREDAGENCY)s::TEXT,
+         %(PREDDEG)s::SMALLINT, %(HIGHDEG)s::SMALLINT,
+         %(CONTROL)s::SMALLINT, %(REGION)s::SMALLINT) AS UNCHANGED
+    FROM Institutions_history
+    WHERE UNITID = %(UNITID)s::INTEGER
+      AND VALID_TO IS NULL
+),
+closed AS (
+    -- a newer year with different values ends the current version
+    UPDATE Institutions_history h
+    SET VALID_TO = %(LAST_REPORTED)s::INTEGER
+    FROM current_version c
+    WHERE h.UNITID = %(UNITID)s::INTEGER
+      AND h.VALID_TO IS NULL
+      AND NOT c.UNCHANGED
+      AND c.VALID_FROM < %(LAST_REPORTED)s::INTEGER
+    RETURNING h.UNITID
+),
+corrected AS (
+    -- a reload of the same year corrects the current version in place
+    UPDATE Institutions_history h
+    SET OPEID        = %(OPEID)s::INTEGER,
+        ACCREDAGENCY = %(ACCREDAGENCY)s::TEXT,
+        PREDDEG      = %(PREDDEG)s::SMALLINT,
+        HIGHDEG      = %(HIGHDEG)s::SMALLINT,
+        CONTROL      = %(CONTROL)s::SMALLINT,
+        REGION       = %(REGION)s::SMALLINT,
+        RECORDED_AT  = NOW()
+    FROM current_version c
+    WHERE h.UNITID = %(UNITID)s::INTEGER
+      AND h.VALID_TO IS NULL
+      AND NOT c.UNCHANGED
+      AND c.VALID_FROM = %(LAST_REPORTED)s::INTEGER
+    RETURNING h.UNITID
+)
+INSERT INTO Institutions_history
+    (UNITID, OPEID, ACCREDAGENCY, PREDDEG,
+     HIGHDEG, CONTROL, REGION, VALID_FROM)
+SELECT %(UNITID)s::INTEGER, %(OPEID)s::INTEGER, %(ACCREDAGENCY)s::TEXT,
+    %(PREDDEG)s::SMALLINT, %(HIGHDEG)s::SMALLINT,
+    %(CONTROL)s::SMALLINT, %(REGION)s::SMALLINT,
+    %(LAST_REPORTED)s::INTEGER
+WHERE NOT EXISTS (SELECT 1 FROM current_version)
+   OR EXISTS (SELECT 1 FROM closed);
+"""
+
+INSERT_INSTITUTIONS_IPEDS_HISTORY = """
+WITH current_version AS (
+    SELECT VALID_FROM,
+        (INSTNM, ADDR, CITY, STABBR, ZIP, LATITUDE, LONGITUDE,
+         C_BASIC, C_IPUG, C_UGPRF, C_ENPRF, C_SZSET,
+         COUNTYCD, CSA, CBSA)
+        IS NOT DISTINCT FROM
+        (%(INSTNM)s::VARCHAR, %(ADDR)s::VARCHAR, %(CITY)s::VARCHAR,
+         %(STABBR)s::VARCHAR, %(ZIP)s::VARCHAR,
+         %(LATITUDE)s::NUMERIC(10,7), %(LONGITUDE)s::NUMERIC(10,7),
+         %(C_BASIC)s::SMALLINT, %(C_IPUG)s::SMALLINT, %(C_UGPRF)s::SMALLINT,
+         %(C_ENPRF)s::SMALLINT, %(C_SZSET)s::SMALLINT,
+         %(COUNTYCD)s::VARCHAR, %(CSA)s::VARCHAR, %(CBSA)s::VARCHAR)
+        AS UNCHANGED
+    FROM Institutions_IPEDS_history
+    WHERE UNITID = %(UNITID)s::INTEGER
+      AND VALID_TO IS NULL
+),
+closed AS (
+    -- a newer year with different values ends the current version
+    UPDATE Institutions_IPEDS_history h
+    SET VALID_TO = %(LAST_REPORTED)s::INTEGER
+    FROM current_version c
+    WHERE h.UNITID = %(UNITID)s::INTEGER
+      AND h.VALID_TO IS NULL
+      AND NOT c.UNCHANGED
+      AND c.VALID_FROM < %(LAST_REPORTED)s::INTEGER
+    RETURNING h.UNITID
+),
+corrected AS (
+    -- a reload of the same year corrects the current version in place
+    UPDATE Institutions_IPEDS_history h
+    SET INSTNM      = %(INSTNM)s::VARCHAR,
+        ADDR        = %(ADDR)s::VARCHAR,
+        CITY        = %(CITY)s::VARCHAR,
+        STABBR      = %(STABBR)s::VARCHAR,
+        ZIP         = %(ZIP)s::VARCHAR,
+        LATITUDE    = %(LATITUDE)s::NUMERIC(10,7),
+        LONGITUDE   = %(LONGITUDE)s::NUMERIC(10,7),
+        C_BASIC     = %(C_BASIC)s::SMALLINT,
+        C_IPUG      = %(C_IPUG)s::SMALLINT,
+        C_UGPRF     = %(C_UGPRF)s::SMALLINT,
+        C_ENPRF     = %(C_ENPRF)s::SMALLINT,
+        C_SZSET     = %(C_SZSET)s::SMALLINT,
+        COUNTYCD    = %(COUNTYCD)s::VARCHAR,
+        CSA         = %(CSA)s::VARCHAR,
+        CBSA        = %(CBSA)s::VARCHAR,
+        RECORDED_AT = NOW()
+    FROM current_version c
+    WHERE h.UNITID = %(UNITID)s::INTEGER
+      AND h.VALID_TO IS NULL
+      AND NOT c.UNCHANGED
+      AND c.VALID_FROM = %(LAST_REPORTED)s::INTEGER
+    RETURNING h.UNITID
+)
+INSERT INTO Institutions_IPEDS_history
+    (UNITID, INSTNM, ADDR, CITY, STABBR, ZIP,
+     LATITUDE, LONGITUDE,
+     C_BASIC, C_IPUG, C_UGPRF, C_ENPRF, C_SZSET,
+     COUNTYCD, CSA, CBSA, VALID_FROM)
+SELECT %(UNITID)s::INTEGER, %(INSTNM)s::VARCHAR, %(ADDR)s::VARCHAR,
+    %(CITY)s::VARCHAR, %(STABBR)s::VARCHAR, %(ZIP)s::VARCHAR,
+    %(LATITUDE)s::NUMERIC(10,7), %(LONGITUDE)s::NUMERIC(10,7),
+    %(C_BASIC)s::SMALLINT, %(C_IPUG)s::SMALLINT, %(C_UGPRF)s::SMALLINT,
+    %(C_ENPRF)s::SMALLINT, %(C_SZSET)s::SMALLINT,
+    %(COUNTYCD)s::VARCHAR, %(CSA)s::VARCHAR, %(CBSA)s::VARCHAR,
+    %(LAST_REPORTED)s::INTEGER
+WHERE NOT EXISTS (SELECT 1 FROM current_version)
+   OR EXISTS (SELECT 1 FROM closed);
+"""
+
 '''
 Financials
 '''
@@ -319,6 +534,469 @@ SET
     IRPS_UNKN   = EXCLUDED.IRPS_UNKN
 """
 
+'''
+Metric store
+'''
+# Long-format values of any numeric MERGED column, so new variables can
+# be explored without a schema change. Metric_Values is hash partitioned
+# on METRIC_ID (a metric's values sit in one partition) and its primary
+# key orders them by metric, institution and year.
+
+# --- CREATE ---
+CREATE_METRICS = """
+CREATE TABLE IF NOT EXISTS Metrics(
+    METRIC_ID SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    NAME TEXT NOT NULL UNIQUE
+);
+"""
+
+CREATE_METRIC_VALUES = """
+CREATE TABLE IF NOT EXISTS Metric_Values(
+    METRIC_ID SMALLINT NOT NULL REFERENCES Metrics(METRIC_ID),
+    UNITID INTEGER NOT NULL,
+    YEAR INTEGER NOT NULL CHECK (YEAR <= EXTRACT(YEAR FROM CURRENT_DATE)),
+    VALUE DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (METRIC_ID, UNITID, YEAR)
+) PARTITION BY HASH (METRIC_ID);
+"""
+
+# Format with modulus (number of partitions) and remainder
+CREATE_METRIC_VALUES_PARTITION = """
+CREATE TABLE IF NOT EXISTS Metric_Values_p{remainder}
+    PARTITION OF Metric_Values
+    FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder});
+"""
+
+# --- INSERT ---
+INSERT_METRICS = """
+INSERT INTO Metrics
+    (NAME)
+VALUES (%s)
+ON CONFLICT (NAME) DO NOTHING
+"""
+
+# --- SELECT / DELETE ---
+SELECT_METRIC_IDS = """
+SELECT NAME, METRIC_ID
+FROM Metrics
+WHERE NAME = ANY(%s);
+"""
+
+# A reloaded year replaces the stored values of its metrics
+DELETE_METRIC_VALUES = """
+DELETE FROM Metric_Values
+WHERE YEAR = %s
+  AND METRIC_ID = ANY(%s);
+"""
+
+'''
+Fields of study
+'''
+# Earnings and debt per program (institution x CIP code x credential
+# level) from the Field of Study files. Each year is a LIST partition,
+# bulk loaded next to the live one and attached in its place
+# (see bulk_utils.load_year_partition).
+
+# --- CREATE ---
+CREATE_FIELDS_OF_STUDY = """
+CREATE TABLE IF NOT EXISTS Fields_Of_Study(
+    UNITID INTEGER NOT NULL,
+    CIPCODE SMALLINT NOT NULL,
+    CREDLEV SMALLINT NOT NULL,
+    YEAR INTEGER NOT NULL CHECK (YEAR <= EXTRACT(YEAR FROM CURRENT_DATE)),
+    IPEDSCOUNT1 INTEGER CHECK(IPEDSCOUNT1 >= 0),
+    IPEDSCOUNT2 INTEGER CHECK(IPEDSCOUNT2 >= 0),
+    DEBT_ALL_STGP_EVAL_N INTEGER CHECK(DEBT_ALL_STGP_EVAL_N >= 0),
+    EARN_COUNT_WNE_1YR INTEGER CHECK(EARN_COUNT_WNE_1YR >= 0),
+    EARN_COUNT_WNE_4YR INTEGER CHECK(EARN_COUNT_WNE_4YR >= 0),
+    DEBT_ALL_STGP_EVAL_MDN FLOAT CHECK(DEBT_ALL_STGP_EVAL_MDN >= 0),
+    DEBT_ALL_STGP_EVAL_MDN10YRPAY FLOAT
+        CHECK(DEBT_ALL_STGP_EVAL_MDN10YRPAY >= 0),
+    EARN_MDN_1YR FLOAT CHECK(EARN_MDN_1YR >= 0),
+    EARN_MDN_4YR FLOAT CHECK(EARN_MDN_4YR >= 0),
+    PRIMARY KEY (UNITID, CIPCODE, CREDLEV, YEAR)
+) PARTITION BY LIST (YEAR);
+"""
+
+CREATE_CIP_CODES = """
+CREATE TABLE IF NOT EXISTS Cip_Codes(
+    CIPCODE SMALLINT PRIMARY KEY,
+    CIPDESC TEXT NOT NULL
+);
+"""
+
+# Format with table, partition and year. Holds one year's rows until
+# it is attached in place of the year's partition
+CREATE_PARTITION_LOAD = """
+CREATE TABLE {partition}_load (
+    LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    CHECK (YEAR = {year})
+);
+"""
+
+# --- INSERT ---
+INSERT_CIP_CODES = """
+INSERT INTO Cip_Codes
+    (CIPCODE, CIPDESC)
+VALUES (%s, %s)
+ON CONFLICT (CIPCODE) DO UPDATE
+SET
+    CIPDESC = EXCLUDED.CIPDESC
+WHERE
+    Cip_Codes.CIPDESC IS DISTINCT FROM EXCLUDED.CIPDESC;
+"""
+
+'''
+IPEDS survey components
+'''
+# Tables of the IPEDS components beyond HD (see ipeds_components.py).
+# Like Fields_Of_Study, each year is a LIST partition bulk loaded by
+# bulk_utils.load_year_partition.
+
+# --- CREATE ---
+# EF (fall enrollment, part A): one row per institution and student level
+CREATE_ENROLLMENT_IPEDS = """
+CREATE TABLE IF NOT EXISTS Enrollment_IPEDS(
+    UNITID INTEGER NOT NULL,
+    EFALEVEL SMALLINT NOT NULL,
+    YEAR INTEGER NOT NULL CHECK (YEAR <= EXTRACT(YEAR FROM CURRENT_DATE)),
+    EFTOTLT INTEGER CHECK(EFTOTLT >= 0),
+    EFTOTLM INTEGER CHECK(EFTOTLM >= 0),
+    EFTOTLW INTEGER CHECK(EFTOTLW >= 0),
+    EFAIANT INTEGER CHECK(EFAIANT >= 0),
+    EFASIAT INTEGER CHECK(EFASIAT >= 0),
+    EFBKAAT INTEGER CHECK(EFBKAAT >= 0),
+    EFHISPT INTEGER CHECK(EFHISPT >= 0),
+    EFNHPIT INTEGER CHECK(EFNHPIT >= 0),
+    EFWHITT INTEGER CHECK(EFWHITT >= 0),
+    EF2MORT INTEGER CHECK(EF2MORT >= 0),
+    EFUNKNT INTEGER CHECK(EFUNKNT >= 0),
+    EFNRALT INTEGER CHECK(EFNRALT >= 0),
+    PRIMARY KEY (UNITID, EFALEVEL, YEAR)
+) PARTITION BY LIST (YEAR);
+"""
+
+# SAL (instructional staff salaries): one row per institution and rank
+CREATE_SALARIES_IPEDS = """
+CREATE TABLE IF NOT EXISTS Salaries_IPEDS(
+    UNITID INTEGER NOT NULL,
+    ARANK SMALLINT NOT NULL,
+    YEAR INTEGER NOT NULL CHECK (YEAR <= EXTRACT(YEAR FROM CURRENT_DATE)),
+    SAINSTT INTEGER CHECK(SAINSTT >= 0),
+    SAINSTM INTEGER CHECK(SAINSTM >= 0),
+    SAINSTW INTEGER CHECK(SAINSTW >= 0),
+    SA09MCT INTEGER CHECK(SA09MCT >= 0),
+    SAOUTLT BIGINT CHECK(SAOUTLT >= 0),
+    SA09MAT INTEGER CHECK(SA09MAT >= 0),
+    SA09MAM INTEGER CHECK(SA09MAM >= 0),
+    SA09MAW INTEGER CHECK(SA09MAW >= 0),
+    PRIMARY KEY (UNITID, ARANK, YEAR)
+) PARTITION BY LIST (YEAR);
+"""
+
+# SFA (student financial aid): one row per institution
+CREATE_AID_IPEDS = """
+CREATE TABLE IF NOT EXISTS Aid_IPEDS(
+    UNITID INTEGER NOT NULL,
+    YEAR INTEGER NOT NULL CHECK (YEAR <= EXTRACT(YEAR FROM CURRENT_DATE)),
+    UAGRNTN INTEGER CHECK(UAGRNTN >= 0),
+    UAGRNTP INTEGER CHECK(UAGRNTP >= 0),
+    UAGRNTA INTEGER CHECK(UAGRNTA >= 0),
+    UPGRNTN INTEGER CHECK(UPGRNTN >= 0),
+    UPGRNTP INTEGER CHECK(UPGRNTP >= 0),
+    UPGRNTA INTEGER CHECK(UPGRNTA >= 0),
+    UFLOANN INTEGER CHECK(UFLOANN >= 0),
+    UFLOANP INTEGER CHECK(UFLOANP >= 0),
+    UFLOANA INTEGER CHECK(UFLOANA >= 0),
+    PRIMARY KEY (UNITID, YEAR)
+) PARTITION BY LIST (YEAR);
+"""
+
+# GR (graduation rates): one row per institution and cohort / status
+CREATE_GRADUATION_IPEDS = """
+CREATE TABLE IF NOT EXISTS Graduation_IPEDS(
+    UNITID INTEGER NOT NULL,
+    GRTYPE SMALLINT NOT NULL,
+    YEAR INTEGER NOT NULL CHECK (YEAR <= EXTRACT(YEAR FROM CURRENT_DATE)),
+    CHRTSTAT SMALLINT,
+    SECTION SMALLINT,
+    COHORT SMALLINT,
+    GRTOTLT INTEGER CHECK(GRTOTLT >= 0),
+    GRTOTLM INTEGER CHECK(GRTOTLM >= 0),
+    GRTOTLW INTEGER CHECK(GRTOTLW >= 0),
+    PRIMARY KEY (UNITID, GRTYPE, YEAR)
+) PARTITION BY LIST (YEAR);
+"""
+
+'''
+Load checkpoints
+'''
+# Progress of checkpointed loads (load_scorecard.py --resume): the last
+# chunk of rows committed per source file (by content hash) and table.
+# A file's rows are removed once it has loaded completely.
+
+# --- CREATE ---
+CREATE_LOAD_CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS Load_Checkpoints(
+    FILE_HASH TEXT NOT NULL,
+    TABLE_NAME TEXT NOT NULL,
+    LAST_CHUNK INTEGER NOT NULL CHECK (LAST_CHUNK >= 0),
+    CHUNK_ROWS INTEGER NOT NULL CHECK (CHUNK_ROWS > 0),
+    UPDATED_AT TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (FILE_HASH, TABLE_NAME)
+);
+"""
+
+# --- INSERT ---
+# Runs in the transaction of the chunk it records
+UPSERT_LOAD_CHECKPOINT = """
+INSERT INTO Load_Checkpoints
+    (FILE_HASH, TABLE_NAME, LAST_CHUNK, CHUNK_ROWS)
+VALUES (%s, %s, %s, %s)
+ON CONFLICT (FILE_HASH, TABLE_NAME) DO UPDATE
+SET
+    LAST_CHUNK = EXCLUDED.LAST_CHUNK,
+    CHUNK_ROWS = EXCLUDED.CHUNK_ROWS,
+    UPDATED_AT = NOW();
+"""
+
+# --- SELECT / DELETE ---
+SELECT_LOAD_CHECKPOINT = """
+SELECT LAST_CHUNK, CHUNK_ROWS
+FROM Load_Checkpoints
+WHERE FILE_HASH = %s
+  AND TABLE_NAME = %s;
+"""
+
+DELETE_LOAD_CHECKPOINTS = """
+DELETE FROM Load_Checkpoints
+WHERE FILE_HASH = %s;
+"""
+
+'''
+Load history
+'''
+# One row per completed loader run. The latest LOAD_ID is the load
+# version: caches of the dashboard data are keyed by it.
+
+# --- CREATE ---
+CREATE_LOAD_HISTORY = """
+CREATE TABLE IF NOT EXISTS Load_History(
+    LOAD_ID BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    LOADED_AT TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    TABLES TEXT[] NOT NULL,
+    ROWS_CHANGED BIGINT NOT NULL CHECK (ROWS_CHANGED >= 0)
+);
+"""
+
+# --- INSERT ---
+INSERT_LOAD_HISTORY = """
+INSERT INTO Load_History
+    (TABLES, ROWS_CHANGED)
+VALUES (%s, %s)
+RETURNING LOAD_ID;
+"""
+
+'''
+Quarantine
+'''
+# Rows rejected by the validation stage, with the names of the rules
+# they violated and the full row as JSON
+# --- CREATE ---
+CREATE_QUARANTINE = """
+CREATE TABLE IF NOT EXISTS Quarantine(
+    TABLE_NAME TEXT NOT NULL,
+    UNITID INTEGER,
+    YEAR INTEGER,
+    RULES TEXT NOT NULL,
+    ROW_DATA JSONB NOT NULL,
+    QUARANTINED_AT TIMESTAMP DEFAULT NOW() NOT NULL
+);
+"""
+
+# --- INSERT ---
+INSERT_QUARANTINE = """
+INSERT INTO Quarantine
+    (TABLE_NAME, UNITID, YEAR, RULES, ROW_DATA)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+# --- SELECT ---
+SELECT_INSTITUTION_UNITIDS = """
+SELECT UNITID
+FROM Institutions;
+"""
+
+'''
+Column statistics catalog
+'''
+# Per-table, per-year, per-column statistics of the loaded data, computed
+# from the cleaned frames during each load (see stats_utils.py)
+# --- CREATE ---
+CREATE_COLUMN_STATS = """
+CREATE TABLE IF NOT EXISTS Column_Stats(
+    TABLE_NAME TEXT NOT NULL,
+    YEAR INTEGER NOT NULL,
+    COLUMN_NAME TEXT NOT NULL,
+    ROW_COUNT INTEGER NOT NULL CHECK (ROW_COUNT >= 0),
+    NULL_FRAC FLOAT CHECK (NULL_FRAC BETWEEN 0 AND 1),
+    MIN_VALUE FLOAT,
+    P05 FLOAT,
+    P25 FLOAT,
+    P50 FLOAT,
+    P75 FLOAT,
+    P95 FLOAT,
+    MAX_VALUE FLOAT,
+    N_DISTINCT INTEGER CHECK (N_DISTINCT >= 0),
+    COMPUTED_AT TIMESTAMP DEFAULT NOW() NOT NULL,
+    PRIMARY KEY (TABLE_NAME, YEAR, COLUMN_NAME)
+);
+"""
+
+# --- INSERT ---
+INSERT_COLUMN_STATS = """
+INSERT INTO Column_Stats
+    (TABLE_NAME, YEAR, COLUMN_NAME, ROW_COUNT, NULL_FRAC,
+     MIN_VALUE, P05, P25, P50, P75, P95, MAX_VALUE, N_DISTINCT)
+VALUES (%s, %s, %s, %s, %s,
+        %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (TABLE_NAME, YEAR, COLUMN_NAME) DO UPDATE
+SET
+    ROW_COUNT   = EXCLUDED.ROW_COUNT,
+    NULL_FRAC   = EXCLUDED.NULL_FRAC,
+    MIN_VALUE   = EXCLUDED.MIN_VALUE,
+    P05         = EXCLUDED.P05,
+    P25         = EXCLUDED.P25,
+    P50         = EXCLUDED.P50,
+    P75         = EXCLUDED.P75,
+    P95         = EXCLUDED.P95,
+    MAX_VALUE   = EXCLUDED.MAX_VALUE,
+    N_DISTINCT  = EXCLUDED.N_DISTINCT,
+    COMPUTED_AT = NOW()
+"""
+
+
+'''
+Maintenance
+'''
+# Live row estimate of a table, used to decide between ANALYZE and
+# VACUUM (ANALYZE) after a load (see maintenance_utils.py). A partitioned
+# table holds no rows itself, so its partitions (found through
+# pg_inherits, at any depth) are summed; 0 if the table does not exist
+SELECT_LIVE_TUPLES = """
+WITH RECURSIVE tree AS (
+    SELECT to_regclass(%s) AS relid
+    UNION ALL
+    SELECT i.inhrelid
+    FROM pg_inherits AS i
+    JOIN tree ON i.inhparent = tree.relid
+)
+SELECT COALESCE(SUM(s.n_live_tup), 0)::BIGINT
+FROM tree
+JOIN pg_stat_user_tables AS s ON s.relid = tree.relid;
+"""
+
+
+# Seconds a read replica lags the primary (0 on the primary itself, and
+# on a replica that has replayed everything it received)
+SELECT_REPLICA_LAG = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+END;
+"""
+
+'''
+Blue/green reloads
+'''
+# A reload builds the new version of each table in an UNLOGGED shadow
+# table next to it and swaps it in with a rename (see bulk_utils.py).
+# Format with table, shadow and staging (the file's rows) names.
+
+# --- CREATE ---
+CREATE_SHADOW = """
+DROP TABLE IF EXISTS {shadow};
+CREATE UNLOGGED TABLE {shadow}
+    (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+"""
+
+# No constraints: the rows are validated when they reach the shadow table
+CREATE_STAGING = """
+CREATE TEMP TABLE {staging} ON COMMIT DROP
+    AS TABLE {table} WITH NO DATA;
+"""
+
+# --- FILL ---
+# Yearly tables: every other year as is, then the reloaded year
+SWAP_KEEP_OTHER_YEARS = """
+INSERT INTO {shadow}
+SELECT * FROM {table}
+WHERE YEAR IS DISTINCT FROM %(year)s;
+"""
+
+SWAP_INSERT_STAGED = """
+INSERT INTO {shadow} ({columns})
+SELECT {columns} FROM {staging};
+"""
+
+# Institutions: institutions missing from the file are kept, the others
+# are overwritten; LAST_UPDATED only moves when a core field changed
+SWAP_KEEP_UNCHANGED_INSTITUTIONS = """
+INSERT INTO {shadow}
+SELECT * FROM {table} AS o
+WHERE NOT EXISTS (
+    SELECT 1 FROM {staging} AS n WHERE n.UNITID = o.UNITID);
+"""
+
+SWAP_MERGE_INSTITUTIONS = """
+INSERT INTO {shadow}
+    (OPEID, UNITID, ACCREDAGENCY, PREDDEG,
+     HIGHDEG, CONTROL, REGION,
+     LAST_REPORTED, LAST_UPDATED)
+SELECT n.OPEID, n.UNITID, n.ACCREDAGENCY, n.PREDDEG,
+    n.HIGHDEG, n.CONTROL, n.REGION,
+    n.LAST_REPORTED,
+    CASE
+        WHEN (o.OPEID, o.ACCREDAGENCY, o.PREDDEG,
+              o.HIGHDEG, o.CONTROL, o.REGION)
+            IS NOT DISTINCT FROM
+             (n.OPEID, n.ACCREDAGENCY, n.PREDDEG,
+              n.HIGHDEG, n.CONTROL, n.REGION)
+        THEN o.LAST_UPDATED
+        ELSE NOW()
+    END
+FROM {staging} AS n
+LEFT JOIN {table} AS o ON o.UNITID = n.UNITID;
+"""
+
+# --- CATALOG ---
+# Keys, unique and exclusion constraints and foreign keys of a table
+SELECT_TABLE_CONSTRAINTS = """
+SELECT conname, contype, pg_get_constraintdef(oid)
+FROM pg_constraint
+WHERE conrelid = %s::regclass
+  AND contype IN ('p', 'u', 'x', 'f');
+"""
+
+# Indexes of a table that do not back a constraint
+SELECT_TABLE_INDEXES = """
+SELECT idx.relname, pg_get_indexdef(i.indexrelid)
+FROM pg_index AS i
+JOIN pg_class AS idx ON idx.oid = i.indexrelid
+WHERE i.indrelid = %s::regclass
+  AND NOT EXISTS (
+      SELECT 1 FROM pg_constraint AS c WHERE c.conindid = i.indexrelid);
+"""
+
+# Foreign keys of other tables (not being swapped) referencing a table
+SELECT_REFERENCING_FOREIGN_KEYS = """
+SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+FROM pg_constraint
+WHERE contype = 'f'
+  AND confrelid = %s::regclass
+  AND NOT conrelid = ANY(%s::regclass[]);
+"""
 
 #############################
 # QUERY FOR DASHBOARD #######
@@ -330,11 +1008,39 @@ FROM ACADEMICS
 ORDER BY YEAR DESC;
 """
 
+get_load_version = """
+SELECT COALESCE(MAX(load_id), 0)
+FROM load_history;
+"""
+
+history_tables_exist = """
+SELECT to_regclass('institutions_history') IS NOT NULL
+    AND to_regclass('institutions_ipeds_history') IS NOT NULL;
+"""
+
+fields_of_study_exists = """
+SELECT to_regclass('fields_of_study') IS NOT NULL;
+"""
+
 get_most_recent_year = """
 SELECT MAX(LAST_REPORTED)
 FROM Institutions
 """
 
+get_column_stats = """
+/* Catalog statistics of the given columns, for every table and year. */
+SELECT table_name, year, column_name, row_count, null_frac,
+    min_value, p05, p25, p50, p75, p95, max_value, n_distinct
+FROM Column_Stats
+WHERE column_name = ANY(%s);
+"""
+
+get_metric_names = """
+SELECT name
+FROM Metrics
+ORDER BY name;
+"""
+
 get_states = """
 SELECT distinct STABBR
 FROM Institutions_IPEDS
@@ -342,45 +1048,182 @@ ORDER BY stabbr;
 """
 
 get_institutes_by_state = """
-SELECT distinct UNITID, INSTNM
+SELECT distinct UNITID, INSTNM, CITY, STABBR
 FROM Institutions_IPEDS
 WHERE STABBR = %s
 ORDER BY INSTNM;
 """
 
-get_all_institutes = """
-SELECT distinct UNITID, INSTNM
+
+search_institutions = """
+/*
+Top matches for a typed institution name. Substring matches use the
+trigram index; prefix matches rank first, then the closest names.
+\, % and _ in the typed text are escaped, so they match themselves
+instead of acting as LIKE wildcards.
+*/
+SELECT UNITID, INSTNM, CITY, STABBR
 FROM Institutions_IPEDS
-ORDER BY INSTNM;
+WHERE LOWER(INSTNM) LIKE '%%' || replace(replace(replace(
+        LOWER(%(search)s), '\\', '\\\\'), '%%', '\\%%'), '_', '\\_')
+        || '%%' ESCAPE '\\'
+    AND (STABBR = COALESCE(NULLIF(%(state)s, ''), STABBR))
+ORDER BY LOWER(INSTNM) LIKE replace(replace(replace(
+        LOWER(%(search)s), '\\', '\\\\'), '%%', '\\%%'), '_', '\\_')
+        || '%%' ESCAPE '\\' DESC,
+    similarity(LOWER(INSTNM), LOWER(%(search)s)) DESC,
+    INSTNM
+LIMIT %(limit)s;
+"""
+
+get_institution_locations = """
+SELECT UNITID, INSTNM, CITY, STABBR, LATITUDE, LONGITUDE
+FROM Institutions_IPEDS
+WHERE LATITUDE IS NOT NULL
+  AND LONGITUDE IS NOT NULL;
 """
 
 
 year_institute_summary_begin = """
-SELECT sc_inst.CONTROL, iped_ins.STABBR, COUNT(*)
-FROM Institutions_IPEDS iped_ins
-LEFT JOIN Institutions sc_inst
-ON iped_ins.UNITID = sc_inst.UNITID
-WHERE iped_ins.LAST_REPORTED = %s
+SELECT ctrl.LABEL AS CONTROL, summary.STABBR, summary.COUNT
+FROM (
+    SELECT sc_inst.CONTROL AS CONTROL_CODE, iped_ins.STABBR, COUNT(*)
+    FROM Institutions_IPEDS iped_ins
+    LEFT JOIN Institutions sc_inst
+    ON iped_ins.UNITID = sc_inst.UNITID
+    WHERE iped_ins.LAST_REPORTED = %s
 """
 
 year_institute_summary_end = """
- GROUP BY sc_inst.CONTROL, iped_ins.STABBR;
+    GROUP BY sc_inst.CONTROL, iped_ins.STABBR
+) AS summary
+LEFT JOIN Dim_CONTROL ctrl
+ON summary.CONTROL_CODE = ctrl.CODE;
 """
 
 tuition_rate_summary = """
-SELECT iped_ins.stabbr, iped_ins.c_basic,
-    ROUND(COALESCE(AVG(tuitionfee_in),0),2) AS avg_in_state_tuition,
-    ROUND(COALESCE(AVG(tuitionfee_out),0),2) AS avg_out_state_tuition
-FROM financials AS f
-JOIN institutions_ipeds AS iped_ins
-    ON f.unitid = iped_ins.unitid
-WHERE f.year = %s
-    AND (iped_ins.stabbr = COALESCE(NULLIF(%s, ''), iped_ins.stabbr))
-    AND (iped_ins.instnm = COALESCE(NULLIF(%s, ''), iped_ins.instnm))
-    AND tuitionfee_in IS NOT NULL
-    AND tuitionfee_out IS NOT NULL
-GROUP BY iped_ins.stabbr, iped_ins.c_basic
-ORDER BY iped_ins.stabbr, iped_ins.c_basic;
+SELECT summary.stabbr, carnegie.label AS c_basic,
+    summary.avg_in_state_tuition, summary.avg_out_state_tuition
+FROM (
+    SELECT iped_ins.stabbr, iped_ins.c_basic,
+        ROUND(COALESCE(AVG(tuitionfee_in),0),2) AS avg_in_state_tuition,
+        ROUND(COALESCE(AVG(tuitionfee_out),0),2) AS avg_out_state_tuition
+    FROM financials AS f
+    JOIN institutions_ipeds AS iped_ins
+        ON f.unitid = iped_ins.unitid
+    WHERE f.year = %s
+        AND (iped_ins.stabbr = COALESCE(NULLIF(%s, ''), iped_ins.stabbr))
+        AND (iped_ins.unitid = COALESCE(%s::INTEGER, iped_ins.unitid))
+        AND tuitionfee_in IS NOT NULL
+        AND tuitionfee_out IS NOT NULL
+    GROUP BY iped_ins.stabbr, iped_ins.c_basic
+) AS summary
+LEFT JOIN dim_c_basic AS carnegie
+    ON summary.c_basic = carnegie.code
+ORDER BY summary.stabbr, summary.c_basic;
+"""
+
+tuition_rate_summary_as_of = """
+/*
+Same as tuition_rate_summary, grouped by the state and Carnegie class
+each institution had in the selected year (see tuition_admrate_as_of).
+*/
+SELECT summary.stabbr, carnegie.label AS c_basic,
+    summary.avg_in_state_tuition, summary.avg_out_state_tuition
+FROM (
+    SELECT dir.stabbr, dir.c_basic,
+        ROUND(COALESCE(AVG(tuitionfee_in),0),2) AS avg_in_state_tuition,
+        ROUND(COALESCE(AVG(tuitionfee_out),0),2) AS avg_out_state_tuition
+    FROM financials AS f
+    JOIN institutions_ipeds AS iped_ins
+        ON f.unitid = iped_ins.unitid
+    LEFT JOIN institutions_ipeds_history AS hist
+        ON hist.unitid = f.unitid
+        AND int4range(hist.valid_from, hist.valid_to) @> f.year
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(hist.stabbr, iped_ins.stabbr) AS stabbr,
+            CASE WHEN hist.unitid IS NULL THEN iped_ins.c_basic
+                 ELSE hist.c_basic END AS c_basic
+    ) AS dir
+    WHERE f.year = %s
+        AND (dir.stabbr = COALESCE(NULLIF(%s, ''), dir.stabbr))
+        AND (f.unitid = COALESCE(%s::INTEGER, f.unitid))
+        AND tuitionfee_in IS NOT NULL
+        AND tuitionfee_out IS NOT NULL
+    GROUP BY dir.stabbr, dir.c_basic
+) AS summary
+LEFT JOIN dim_c_basic AS carnegie
+    ON summary.c_basic = carnegie.code
+ORDER BY summary.stabbr, summary.c_basic;
+"""
+
+institutions_ipeds_as_of = """
+/*
+IPEDS directory attributes as they were in a given year, with the
+Scorecard control and predominant degree valid in the same year.
+unitids may be NULL for every institution. Uses the GiST index of the
+exclusion constraint on (UNITID, int4range(VALID_FROM, VALID_TO)).
+*/
+SELECT h.UNITID, h.INSTNM, h.CITY, h.STABBR, h.ZIP,
+    h.LATITUDE, h.LONGITUDE, carnegie.LABEL AS C_BASIC,
+    ctrl.LABEL AS CONTROL, pred.LABEL AS PREDDEG,
+    h.VALID_FROM, h.VALID_TO
+FROM Institutions_IPEDS_history h
+LEFT JOIN Institutions_history inst
+    ON inst.UNITID = h.UNITID
+    AND int4range(inst.VALID_FROM, inst.VALID_TO) @> %(year)s::INTEGER
+LEFT JOIN Dim_C_BASIC carnegie
+    ON h.C_BASIC = carnegie.CODE
+LEFT JOIN Dim_CONTROL ctrl
+    ON inst.CONTROL = ctrl.CODE
+LEFT JOIN Dim_PREDDEG pred
+    ON inst.PREDDEG = pred.CODE
+WHERE int4range(h.VALID_FROM, h.VALID_TO) @> %(year)s::INTEGER
+    AND (%(unitids)s::INTEGER[] IS NULL OR h.UNITID = ANY(%(unitids)s));
+"""
+
+institutions_as_of = """
+/*
+Scorecard institution attributes (control, predominant and highest
+degree, region) as they were in a given year, from Institutions_history.
+unitids may be NULL for every institution.
+*/
+SELECT h.UNITID, h.OPEID, h.ACCREDAGENCY,
+    pred.LABEL AS PREDDEG, high.LABEL AS HIGHDEG,
+    ctrl.LABEL AS CONTROL, region.LABEL AS REGION,
+    h.VALID_FROM, h.VALID_TO
+FROM Institutions_history h
+LEFT JOIN Dim_PREDDEG pred
+    ON h.PREDDEG = pred.CODE
+LEFT JOIN Dim_HIGHDEG high
+    ON h.HIGHDEG = high.CODE
+LEFT JOIN Dim_CONTROL ctrl
+    ON h.CONTROL = ctrl.CODE
+LEFT JOIN Dim_REGION region
+    ON h.REGION = region.CODE
+WHERE int4range(h.VALID_FROM, h.VALID_TO) @> %(year)s::INTEGER
+    AND (%(unitids)s::INTEGER[] IS NULL OR h.UNITID = ANY(%(unitids)s));
+"""
+
+tuition_admrate_as_of = """
+/*
+Same as tuition_admrate, but names and states are the ones each
+institution had in the selected year (joined on the directory history),
+or the current ones for years loaded before --history.
+*/
+SELECT acad.unitid,
+COALESCE(hist.instnm, ipd.instnm) AS instnm,
+COALESCE(hist.stabbr, ipd.stabbr) AS stabbr,
+acad.adm_rate, fin.tuitionfee_in, fin.tuitionfee_out
+FROM ACADEMICS acad
+JOIN FINANCIALS fin
+ON acad.unitid = fin.unitid AND fin.year = acad.year
+LEFT JOIN Institutions_IPEDS ipd
+ON ipd.unitid = acad.unitid
+LEFT JOIN Institutions_IPEDS_history hist
+ON hist.unitid = acad.unitid
+AND int4range(hist.valid_from, hist.valid_to) @> acad.year
+WHERE acad.year = %s
 """
 
 tuition_admrate = """
@@ -405,11 +1248,38 @@ JOIN institutions_ipeds AS iped_ins
     ON f.unitid = iped_ins.unitid
 WHERE f.year = %s
     AND (iped_ins.stabbr = COALESCE(NULLIF(%s, ''), iped_ins.stabbr))
-    AND (iped_ins.instnm = COALESCE(NULLIF(%s, ''), iped_ins.instnm))
+    AND (iped_ins.unitid = COALESCE(%s::INTEGER, iped_ins.unitid))
     AND avgfascal > 0
 GROUP BY iped_ins.longitude, iped_ins.latitude, iped_ins.stabbr;
 """
 
+faculty_salary_map_as_of = """
+/*
+Same as faculty_salary_map, with each institution's location and state
+as of the selected year (see tuition_admrate_as_of).
+*/
+SELECT dir.longitude, dir.latitude, dir.stabbr,
+    ROUND(COALESCE(AVG(f.avgfascal), 0),2) AS avg_faculty_salary
+FROM financials AS f
+JOIN institutions_ipeds AS iped_ins
+    ON f.unitid = iped_ins.unitid
+LEFT JOIN institutions_ipeds_history AS hist
+    ON hist.unitid = f.unitid
+    AND int4range(hist.valid_from, hist.valid_to) @> f.year
+CROSS JOIN LATERAL (
+    SELECT CASE WHEN hist.unitid IS NULL THEN iped_ins.longitude
+                ELSE hist.longitude END AS longitude,
+        CASE WHEN hist.unitid IS NULL THEN iped_ins.latitude
+             ELSE hist.latitude END AS latitude,
+        COALESCE(hist.stabbr, iped_ins.stabbr) AS stabbr
+) AS dir
+WHERE f.year = %s
+    AND (dir.stabbr = COALESCE(NULLIF(%s, ''), dir.stabbr))
+    AND (f.unitid = COALESCE(%s::INTEGER, f.unitid))
+    AND avgfascal > 0
+GROUP BY dir.longitude, dir.latitude, dir.stabbr;
+"""
+
 loan_repayment_performance = """
 /*
 Best / worst loan repayment performance by institution for a given year.
@@ -424,55 +1294,290 @@ SELECT
     ipd.unitid,
     ipd.instnm,
     ipd.stabbr,
-    inst.control,
+    ctrl.label AS control,
     1 - COALESCE(fin.cdr3, fin.cdr2) AS repayment_rate
 FROM financials AS fin
 JOIN institutions AS inst
     ON fin.unitid = inst.unitid
 JOIN institutions_ipeds AS ipd
     ON fin.unitid = ipd.unitid
+LEFT JOIN dim_control AS ctrl
+    ON inst.control = ctrl.code
 WHERE fin.year = %s
   AND (fin.cdr2 IS NOT NULL OR fin.cdr3 IS NOT NULL);
 """
 
-tuition_repayment_over_time = """
-/* Tuition and loan repayment trends over time. */
+loan_repayment_performance_as_of = """
+/*
+Same as loan_repayment_performance, with each institution's name, state
+and control as of the selected year (see tuition_admrate_as_of).
+*/
 SELECT
-    fin.year,
-    inst.control,
-    ipd.stabbr,
-    AVG(fin.tuitionfee_in)  AS avg_in_state_tuition,
-    AVG(fin.tuitionfee_out) AS avg_out_state_tuition,
-    AVG(1 - COALESCE(fin.cdr3, fin.cdr2)) AS avg_repayment_rate
+    ipd.unitid,
+    COALESCE(ipd_hist.instnm, ipd.instnm) AS instnm,
+    COALESCE(ipd_hist.stabbr, ipd.stabbr) AS stabbr,
+    ctrl.label AS control,
+    1 - COALESCE(fin.cdr3, fin.cdr2) AS repayment_rate
 FROM financials AS fin
 JOIN institutions AS inst
     ON fin.unitid = inst.unitid
 JOIN institutions_ipeds AS ipd
     ON fin.unitid = ipd.unitid
-WHERE fin.tuitionfee_in  IS NOT NULL
-  AND fin.tuitionfee_out IS NOT NULL
-  AND (fin.cdr2 IS NOT NULL OR fin.cdr3 IS NOT NULL)
-GROUP BY
-    fin.year,
-    inst.control,
-    ipd.stabbr
+LEFT JOIN institutions_history AS inst_hist
+    ON inst_hist.unitid = fin.unitid
+    AND int4range(inst_hist.valid_from, inst_hist.valid_to) @> fin.year
+LEFT JOIN institutions_ipeds_history AS ipd_hist
+    ON ipd_hist.unitid = fin.unitid
+    AND int4range(ipd_hist.valid_from, ipd_hist.valid_to) @> fin.year
+LEFT JOIN dim_control AS ctrl
+    ON ctrl.code = CASE WHEN inst_hist.unitid IS NULL THEN inst.control
+                        ELSE inst_hist.control END
+WHERE fin.year = %s
+  AND (fin.cdr2 IS NOT NULL OR fin.cdr3 IS NOT NULL);
+"""
+
+tuition_repayment_over_time = """
+/* Tuition and loan repayment trends over time. */
+SELECT
+    trend.year,
+    ctrl.label AS control,
+    trend.stabbr,
+    trend.avg_in_state_tuition,
+    trend.avg_out_state_tuition,
+    trend.avg_repayment_rate
+FROM (
+    SELECT
+        fin.year,
+        inst.control,
+        ipd.stabbr,
+        AVG(fin.tuitionfee_in)  AS avg_in_state_tuition,
+        AVG(fin.tuitionfee_out) AS avg_out_state_tuition,
+        AVG(1 - COALESCE(fin.cdr3, fin.cdr2)) AS avg_repayment_rate
+    FROM financials AS fin
+    JOIN institutions AS inst
+        ON fin.unitid = inst.unitid
+    JOIN institutions_ipeds AS ipd
+        ON fin.unitid = ipd.unitid
+    WHERE fin.tuitionfee_in  IS NOT NULL
+      AND fin.tuitionfee_out IS NOT NULL
+      AND (fin.cdr2 IS NOT NULL OR fin.cdr3 IS NOT NULL)
+    GROUP BY
+        fin.year,
+        inst.control,
+        ipd.stabbr
+) AS trend
+LEFT JOIN dim_control AS ctrl
+    ON trend.control = ctrl.code
 ORDER BY
-    fin.year,
-    inst.control,
-    ipd.stabbr;
+    trend.year,
+    trend.control,
+    trend.stabbr;
+"""
+
+
+program_earnings_debt = """
+/*
+Earnings and debt of the programs of a year, by field of study and
+credential level, for a state ('' for all).
+
+Median earnings / debt are the medians of the programs' medians.
+
+Returned columns:
+    cipcode, cipdesc, credlev, programs, completers,
+    median_earnings_1yr, median_earnings_4yr, median_debt,
+    debt_to_earnings
+*/
+SELECT
+    summary.cipcode,
+    cip.cipdesc,
+    cred.label AS credlev,
+    summary.programs,
+    summary.completers,
+    summary.median_earnings_1yr,
+    summary.median_earnings_4yr,
+    summary.median_debt,
+    ROUND((summary.median_debt
+           / NULLIF(summary.median_earnings_1yr, 0))::NUMERIC, 2)
+        AS debt_to_earnings
+FROM (
+    SELECT
+        fos.cipcode,
+        fos.credlev,
+        COUNT(*) AS programs,
+        SUM(fos.ipedscount2) AS completers,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY fos.earn_mdn_1yr)
+            AS median_earnings_1yr,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY fos.earn_mdn_4yr)
+            AS median_earnings_4yr,
+        PERCENTILE_CONT(0.5) WITHIN GROUP
+            (ORDER BY fos.debt_all_stgp_eval_mdn) AS median_debt
+    FROM fields_of_study AS fos
+    JOIN institutions_ipeds AS ipd
+        ON fos.unitid = ipd.unitid
+    WHERE fos.year = %s
+      AND ipd.stabbr = COALESCE(NULLIF(%s, ''), ipd.stabbr)
+      AND (fos.earn_mdn_1yr IS NOT NULL
+           OR fos.debt_all_stgp_eval_mdn IS NOT NULL)
+    GROUP BY fos.cipcode, fos.credlev
+) AS summary
+LEFT JOIN cip_codes AS cip
+    ON summary.cipcode = cip.cipcode
+LEFT JOIN dim_credlev AS cred
+    ON summary.credlev = cred.code
+ORDER BY summary.median_earnings_1yr DESC NULLS LAST;
+"""
+
+institution_programs = """
+/*
+Earnings and debt of every program of one institution in a year.
+
+Returned columns:
+    cipcode, cipdesc, credlev, completers, earnings_1yr, earnings_4yr,
+    median_debt, debt_to_earnings
+*/
+SELECT
+    fos.cipcode,
+    cip.cipdesc,
+    cred.label AS credlev,
+    fos.ipedscount2 AS completers,
+    fos.earn_mdn_1yr AS earnings_1yr,
+    fos.earn_mdn_4yr AS earnings_4yr,
+    fos.debt_all_stgp_eval_mdn AS median_debt,
+    ROUND((fos.debt_all_stgp_eval_mdn
+           / NULLIF(fos.earn_mdn_1yr, 0))::NUMERIC, 2) AS debt_to_earnings
+FROM fields_of_study AS fos
+LEFT JOIN cip_codes AS cip
+    ON fos.cipcode = cip.cipcode
+LEFT JOIN dim_credlev AS cred
+    ON fos.credlev = cred.code
+WHERE fos.year = %s
+  AND fos.unitid = %s
+ORDER BY fos.credlev, fos.cipcode;
+"""
+
+
+cube_facts = """
+/*
+Every (unitid, year) of the fact tables with its dimensions, for the
+in-memory cube (dashboard_utils.Cube).
+
+Returned columns:
+    unitid, year, instnm, stabbr, control, c_basic,
+    tuitionfee_in, tuitionfee_out, avgfascal, repayment_rate,
+    adm_rate, sat_avg, ugds
+*/
+SELECT
+    keys.unitid,
+    keys.year,
+    ipd.instnm,
+    ipd.stabbr,
+    ctrl.label AS control,
+    carnegie.label AS c_basic,
+    fin.tuitionfee_in,
+    fin.tuitionfee_out,
+    fin.avgfascal,
+    1 - COALESCE(fin.cdr3, fin.cdr2) AS repayment_rate,
+    acad.adm_rate,
+    acad.sat_avg,
+    dem.ugds
+FROM (
+    SELECT unitid, year FROM financials
+    UNION
+    SELECT unitid, year FROM academics
+    UNION
+    SELECT unitid, year FROM demographics
+) AS keys
+JOIN institutions AS inst
+    ON keys.unitid = inst.unitid
+LEFT JOIN institutions_ipeds AS ipd
+    ON keys.unitid = ipd.unitid
+LEFT JOIN financials AS fin
+    ON keys.unitid = fin.unitid AND keys.year = fin.year
+LEFT JOIN academics AS acad
+    ON keys.unitid = acad.unitid AND keys.year = acad.year
+LEFT JOIN demographics AS dem
+    ON keys.unitid = dem.unitid AND keys.year = dem.year
+LEFT JOIN dim_control AS ctrl
+    ON inst.control = ctrl.code
+LEFT JOIN dim_c_basic AS carnegie
+    ON ipd.c_basic = carnegie.code
+ORDER BY keys.year, keys.unitid;
+"""
+
+cube_facts_as_of = """
+/*
+Same as cube_facts, with each year's name, state, control and Carnegie
+class taken from the *_history tables (the current ones for years
+loaded before --history).
+
+Returned columns:
+    unitid, year, instnm, stabbr, control, c_basic,
+    tuitionfee_in, tuitionfee_out, avgfascal, repayment_rate,
+    adm_rate, sat_avg, ugds
+*/
+SELECT
+    keys.unitid,
+    keys.year,
+    COALESCE(ipd_hist.instnm, ipd.instnm) AS instnm,
+    COALESCE(ipd_hist.stabbr, ipd.stabbr) AS stabbr,
+    ctrl.label AS control,
+    carnegie.label AS c_basic,
+    fin.tuitionfee_in,
+    fin.tuitionfee_out,
+    fin.avgfascal,
+    1 - COALESCE(fin.cdr3, fin.cdr2) AS repayment_rate,
+    acad.adm_rate,
+    acad.sat_avg,
+    dem.ugds
+FROM (
+    SELECT unitid, year FROM financials
+    UNION
+    SELECT unitid, year FROM academics
+    UNION
+    SELECT unitid, year FROM demographics
+) AS keys
+JOIN institutions AS inst
+    ON keys.unitid = inst.unitid
+LEFT JOIN institutions_ipeds AS ipd
+    ON keys.unitid = ipd.unitid
+LEFT JOIN institutions_history AS inst_hist
+    ON inst_hist.unitid = keys.unitid
+    AND int4range(inst_hist.valid_from, inst_hist.valid_to) @> keys.year
+LEFT JOIN institutions_ipeds_history AS ipd_hist
+    ON ipd_hist.unitid = keys.unitid
+    AND int4range(ipd_hist.valid_from, ipd_hist.valid_to) @> keys.year
+LEFT JOIN financials AS fin
+    ON keys.unitid = fin.unitid AND keys.year = fin.year
+LEFT JOIN academics AS acad
+    ON keys.unitid = acad.unitid AND keys.year = acad.year
+LEFT JOIN demographics AS dem
+    ON keys.unitid = dem.unitid AND keys.year = dem.year
+LEFT JOIN dim_control AS ctrl
+    ON ctrl.code = CASE WHEN inst_hist.unitid IS NULL THEN inst.control
+                        ELSE inst_hist.control END
+LEFT JOIN dim_c_basic AS carnegie
+    ON carnegie.code = CASE WHEN ipd_hist.unitid IS NULL THEN ipd.c_basic
+                            ELSE ipd_hist.c_basic END
+ORDER BY keys.year, keys.unitid;
 """
 
 
 SAT_avg_carnegie = """
 /* Carnegie Classification and Average SAT score */
 
-SELECT ipeds.C_BASIC AS carnegie_basic,
-    AVG(academic.SAT_AVG) AS avg_sat_score
-FROM Institutions_IPEDS ipeds
-JOIN Academics academic
-    ON ipeds.unitid = academic.unitid
-WHERE academic.SAT_AVG IS NOT NULL
-GROUP BY ipeds.C_BASIC
-ORDER BY ipeds.C_BASIC
+SELECT carnegie.label AS carnegie_basic,
+    summary.avg_sat_score
+FROM (
+    SELECT ipeds.C_BASIC,
+        AVG(academic.SAT_AVG) AS avg_sat_score
+    FROM Institutions_IPEDS ipeds
+    JOIN Academics academic
+        ON ipeds.unitid = academic.unitid
+    WHERE academic.SAT_AVG IS NOT NULL
+    GROUP BY ipeds.C_BASIC
+) AS summary
+LEFT JOIN Dim_C_BASIC carnegie
+    ON summary.C_BASIC = carnegie.CODE
+ORDER BY summary.C_BASIC
 
 """
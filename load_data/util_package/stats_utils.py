@@ -0,0 +1,56 @@
+'''Utilities file with functions to compute per-column statistics
+of the cleaned data for the Column_Stats catalog table'''
+import pandas as pd
+import load_data.util_package.logging as log
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Identifier columns are not profiled
+ID_COLS = ['UNITID', 'OPEID', 'YEAR', 'LAST_REPORTED']
+
+
+def compute_column_stats(df, table_name, year):
+    """
+    Compute per-column statistics of a cleaned dataframe in one pass.
+
+    Input: cleaned dataframe, table name and year of the data
+    Output: dataframe with one row per column, in the column order of
+            INSERT_COLUMN_STATS (null fraction, min / quantiles / max for
+            numeric columns, distinct count)
+    """
+    try:
+        data = df.drop(columns=[c for c in ID_COLS if c in df.columns])
+        nrows = len(data)
+
+        # Cleaned frames are object dtype; a column is numeric if
+        # every non-null value converts to a number
+        numeric = data.apply(pd.to_numeric, errors="coerce")
+        is_numeric = numeric.notna().sum() == data.notna().sum()
+        numeric = numeric.loc[:, is_numeric].astype(float)
+
+        stats = pd.DataFrame({
+            'TABLE_NAME': table_name,
+            'YEAR': int(year),
+            'COLUMN_NAME': data.columns.str.upper(),
+            'ROW_COUNT': nrows,
+            'NULL_FRAC': (data.isna().mean().values if nrows
+                          else [None] * len(data.columns)),
+        }, index=data.columns)
+
+        quantiles = numeric.quantile(QUANTILES).T
+        stats['MIN_VALUE'] = numeric.min()
+        for q in QUANTILES:
+            stats[f"P{int(q * 100):02d}"] = quantiles[q]
+        stats['MAX_VALUE'] = numeric.max()
+        stats['N_DISTINCT'] = data.nunique()
+    except Exception as e:
+        log.get_logger(__name__).error(
+            f"Statistics error for {table_name}: {e}", exc_info=True)
+        print(f"Error occured computing statistics for {table_name}: {e}")
+        raise
+
+    # Convert NA values to None (for psycopg2)
+    stats = stats.reset_index(drop=True)
+    stats = stats.astype(object).where(pd.notnull(stats), None)
+    print(f"Statistics computed for {len(stats)} columns of {table_name}.")
+    return stats
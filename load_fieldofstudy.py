@@ -0,0 +1,121 @@
+# Driver code to load the College Scorecard Field of Study files
+import sys
+import time
+import re
+import pandas as pd
+from load_data.util_package import sql_queries as query
+import load_data.cleaning_package.cleaning_fieldofstudy as clean_fos
+import load_data.util_package.collegescorecard_utils as utils
+import load_data.util_package.file_utils as file_utils
+import load_data.util_package.maintenance_utils as maintenance_utils
+import load_data.util_package.bulk_utils as bulk_utils
+
+# Field of Study members to load when given the whole bundle .zip
+FIELD_OF_STUDY_PATTERN = r"^FieldOfStudyData\d{4}_\d{4}_PP\.csv$"
+
+# Rows parsed, cleaned and copied at a time
+CHUNK_ROWS = 50000
+
+
+def file_year(source):
+    """
+    Year of a Field of Study file: the first calendar year of its later
+    award year (FieldOfStudyData1920_2021_PP.csv -> 2020).
+    """
+    match = re.search(r"\d{4}_(\d{2})\d{2}", file_utils.source_name(source))
+    if not match:
+        raise ValueError(f"Could not extract year from {source}; "
+                         "pass it with --year=YYYY.")
+    return f"20{match.group(1)}"
+
+
+def load_file(filename, year, chunk_rows=CHUNK_ROWS):
+    """
+    Read, clean and bulk load one Field of Study file for a year,
+    chunk by chunk, into that year's partition of Fields_Of_Study.
+
+    Returns dict of table name -> rows inserted or updated.
+    """
+    start_time = time.time()
+    print(f"====LOADING {filename}====")
+
+    # create the tables if they do not exist
+    utils.load_dimensions(clean_fos.CATEGORY_MAPPINGS)
+    utils.create_table(query.CREATE_FIELDS_OF_STUDY)
+    utils.create_table(query.CREATE_CIP_CODES)
+    print("All necessary tables created or already exists.\n")
+
+    # program names are small: collect them while the chunks stream by
+    cip_codes = []
+    # keys of the programs already loaded: a program listed twice keeps
+    # its first row even when the two rows are in different chunks,
+    # otherwise adding the primary key to the loaded table would fail
+    seen = set()
+
+    def cleaned_chunks():
+        # only the needed columns are parsed
+        for chunk in file_utils.read_csv_chunks(
+                filename, chunk_rows,
+                usecols=lambda col: col in clean_fos.READ_COLS,
+                dtype={"CIPCODE": str, "CIPDESC": str}):
+            cip_codes.append(clean_fos.clean_cip_codes(chunk))
+            clean = clean_fos.clean_fields_of_study(chunk, year)
+            keys = list(zip(*(clean[col] for col in clean_fos.ID_COLS)))
+            new = [key not in seen for key in keys]
+            seen.update(keys)
+            yield clean[new]
+
+    results = {"Fields_Of_Study": bulk_utils.load_year_partition(
+        utils.get_connection, "Fields_Of_Study", year, cleaned_chunks())}
+
+    if cip_codes:
+        cip_codes = pd.concat(cip_codes).drop_duplicates(subset=["CIPCODE"])
+        results["Cip_Codes"] = utils.insert_data(query.INSERT_CIP_CODES,
+                                                 cip_codes)
+
+    print("\nData loading complete.\n")
+
+    # Calculate time elapsed to load this file
+    elapsed_time = time.time() - start_time
+    print(f"{elapsed_time} seconds taken to load data file.")
+
+    return results
+
+
+def main():
+    # Get csv filename
+    if len(sys.argv) < 2:
+        print("Error: Missing CSV file argument.")
+        sys.exit(1)
+    filename = sys.argv[1]
+    # --year=YYYY for files without the award years in their name
+    # (e.g. Most-Recent-Cohorts-Field-of-Study.csv)
+    year = None
+    for arg in sys.argv[2:]:
+        if arg.startswith("--year="):
+            year = arg.split("=", 1)[1]
+
+    try:
+        # a .zip bundle expands to each Field of Study member
+        sources = file_utils.expand_sources(filename, FIELD_OF_STUDY_PATTERN)
+        if year is not None and len(sources) > 1:
+            raise ValueError("--year applies to a single file.")
+
+        # rows changed per table over every file, for the maintenance stage
+        changed = {}
+        for source in sources:
+            maintenance_utils.add_changed(
+                changed, load_file(source, year or file_year(source)))
+
+        maintenance = maintenance_utils.run_maintenance(utils.get_connection,
+                                                        changed)
+        maintenance_utils.print_load_summary(changed, maintenance)
+        maintenance_utils.record_load(utils.get_connection, changed)
+
+    except Exception as e:
+        print("ETL Pipeline failed:", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,110 @@
 # Driver code to load IPEDS data using the shared utilities module
 import sys
 import time
-import re
 from load_data.util_package import sql_queries as query
 # your IPEDS CREATE/INSERT SQL above
 import load_data.cleaning_package.cleaning_ipeds as clean_ipeds
 # your clean_directory function above
+import load_data.cleaning_package.validation as validation
 import load_data.util_package.ipeds_utils as utils
 # the utilities module above
+import load_data.util_package.file_utils as file_utils
+import load_data.util_package.stats_utils as stats_utils
+import load_data.util_package.maintenance_utils as maintenance_utils
+import load_data.util_package.ipeds_components as ipeds_components
+import load_data.util_package.profile_utils as profile_utils
+
+# Directory files (hd2022.csv); the other components are declared
+# in ipeds_components.py
+HD_PATTERN = r"^hd(?P<year>\d{4})(_rv)?\.csv$"
+
+
+def load_directory(filename, year, history=False):
+    """
+    Extract, clean, validate and load one HD (directory) file for a year.
+
+    Returns dict of table name -> rows inserted or updated.
+    """
+    start_time = time.time()
+
+    # Load CSV data into a DataFrame
+    # NOTE: utils.load_data currently requires OPEID + UNITID columns.
+    # For pure IPEDS files, you may want to relax that inside utilities.
+    print(f"====LOADING {filename}====")
+    ipeds_raw = utils.load_data(filename, year)
+
+    # Clean data for the IPEDS directory table
+    directory_clean = clean_ipeds.clean_directory(ipeds_raw)
+    print("IPEDS directory data cleaned successfully.\n")
+
+    # Create and fill the Carnegie code -> label dimension tables,
+    # the directory table references them
+    utils.load_dimensions({
+        col: col_map
+        for col, col_map in clean_ipeds.CATEGORY_MAPPINGS.items()
+        if col in directory_clean.columns})
+
+    # Create the directory table if it does not exist
+    utils.create_table(query.CREATE_INSTITUTIONS_IPEDS)
+    utils.create_table(query.CREATE_INSTNM_SEARCH_INDEX)
+    utils.create_table(query.CREATE_QUARANTINE)
+    utils.create_table(query.CREATE_COLUMN_STATS)
+    if history:
+        utils.create_table(query.CREATE_INSTITUTIONS_IPEDS_HISTORY)
+    print("IPEDS directory table created or already exists.\n")
+
+    # Quarantine rows that would violate the table constraints
+    directory_clean, directory_bad = validation.validate(
+        directory_clean, "Institutions_IPEDS")
+    if not directory_bad.empty:
+        utils.insert_data(query.INSERT_QUARANTINE, directory_bad)
+
+    # Insert the cleaned directory data
+    results = {
+        "Institutions_IPEDS": utils.insert_data(
+            query.INSERT_INSTITUTIONS_IPEDS, directory_clean)
+    }
+    if history:
+        # version changed directory records with their valid-from year
+        results["Institutions_IPEDS_history"] = utils.insert_data(
+            query.INSERT_INSTITUTIONS_IPEDS_HISTORY, directory_clean)
+
+    # refresh the statistics catalog for this year
+    utils.insert_data(query.INSERT_COLUMN_STATS,
+                      stats_utils.compute_column_stats(
+                          directory_clean, "Institutions_IPEDS", year))
+    print("\nIPEDS directory data loading complete.\n")
+
+    # Calculate time elapsed to load this file
+    elapsed_time = time.time() - start_time
+    print(f"{elapsed_time} seconds taken to load IPEDS data file.")
+
+    return maintenance_utils.add_changed({}, results)
+
+
+# HD feeds several tables (dimensions, history, statistics) and keeps its
+# own validated upsert instead of the chunked bulk load
+ipeds_components.register("HD", HD_PATTERN, "Institutions_IPEDS",
+                          loader=load_directory)
+
+
+def load_file(filename, year, history=False):
+    """
+    Load one IPEDS file with the component its name belongs to.
+
+    Returns dict of table name -> rows inserted or updated.
+    """
+    component = ipeds_components.find_component(
+        file_utils.source_name(filename))
+    if component["loader"] is not None:
+        return component["loader"](filename, year, history=history)
+
+    start_time = time.time()
+    print(f"====LOADING {filename} ({component['name']})====")
+    results = utils.load_component(component, filename, year)
+    elapsed_time = time.time() - start_time
+    print(f"{elapsed_time} seconds taken to load IPEDS data file.")
+    return results
 
 
 def main():
@@ -18,40 +115,51 @@ def main():
 
     filename = sys.argv[1]
 
-    # Extract 4-digit year from filename (e.g., hd2022.csv -> 2022)
-    match = re.search(r"(\d{4})", filename)
-    if not match:
-        print("Error: Could not extract 4-digit year from filename.")
-        sys.exit(1)
-    year = match.group(1)
+    # --history keeps every version of an institution's directory record
+    history = "--history" in sys.argv[2:]
 
-    try:
-        start_time = time.time()
+    # --profile writes a CPU profile and an allocation report per stage
+    if "--profile" in sys.argv[2:]:
+        profile_utils.enable()
+        profile_utils.instrument(utils, "load_data", "insert_data",
+                                 "load_component")
+        profile_utils.instrument(clean_ipeds, "clean_directory",
+                                 "rename_latest_carnegie_columns")
 
-        # Load CSV data into a DataFrame
-        # NOTE: utils.load_data currently requires OPEID + UNITID columns.
-        # For pure IPEDS files, you may want to relax that inside utilities.
-        ipeds_raw = utils.load_data(filename, year)
-
-        # Clean data for the IPEDS directory table
-        directory_clean = clean_ipeds.clean_directory(ipeds_raw)
-        print("IPEDS directory data cleaned successfully.\n")
+    try:
+        # a .zip of IPEDS files expands to each member of a known
+        # component, read in place
+        sources = file_utils.expand_sources(
+            filename, ipeds_components.sources_pattern())
 
-        # Create the directory table if it does not exist
-        utils.create_table(query.CREATE_INSTITUTIONS_IPEDS)
-        print("IPEDS directory table created or already exists.\n")
+        # rows changed per table over every file, for the maintenance stage
+        changed = {}
+        for source in sources:
+            # The file or archive member name gives the component
+            # and the year (e.g., hd2022.csv -> HD, 2022)
+            name = file_utils.source_name(source)
+            component = ipeds_components.find_component(name)
+            if component is None:
+                print(f"Error: {name} is not a known IPEDS component file",
+                      f"({', '.join(ipeds_components.COMPONENTS)}).")
+                sys.exit(1)
+            year = ipeds_components.component_year(component, name)
 
-        # Insert the cleaned directory data
-        utils.insert_data(query.INSERT_INSTITUTIONS_IPEDS, directory_clean)
-        print("\nIPEDS directory data loading complete.\n")
+            maintenance_utils.add_changed(
+                changed, load_file(source, year, history=history))
 
-        # Calculate time elapsed to load this file
-        elapsed_time = time.time() - start_time
-        print(f"{elapsed_time} seconds taken to load IPEDS data file.")
+        # refresh planner statistics of the touched tables so the
+        # dashboard gets good plans right after the load
+        maintenance = maintenance_utils.run_maintenance(utils.get_connection,
+                                                        changed)
+        maintenance_utils.print_load_summary(changed, maintenance)
+        maintenance_utils.record_load(utils.get_connection, changed)
 
     except Exception as e:
         print("IPEDS ETL Pipeline failed:", e)
         sys.exit(1)
+    finally:
+        profile_utils.report()
 
 
 if __name__ == "__main__":
@@ -2,9 +2,194 @@
 import sys
 import time
 import re
+import functools
+import pandas as pd
 from load_data.util_package import sql_queries as query
 import load_data.cleaning_package.cleaning_collegescorecard as clean_cs
+import load_data.cleaning_package.validation as validation
 import load_data.util_package.collegescorecard_utils as utils
+import load_data.util_package.file_utils as file_utils
+import load_data.util_package.stats_utils as stats_utils
+import load_data.util_package.maintenance_utils as maintenance_utils
+import load_data.util_package.bulk_utils as bulk_utils
+import load_data.util_package.profile_utils as profile_utils
+
+# Scorecard members to load when given the whole bundle .zip
+MERGED_PATTERN = r"^MERGED\d{4}_\d{2}_PP\.csv$"
+
+# How each table's shadow is filled in a --swap reload: the yearly tables
+# keep every other year and take the file's rows for the loaded year
+YEAR_SLICE_FILL = [query.SWAP_KEEP_OTHER_YEARS, query.SWAP_INSERT_STAGED]
+INSTITUTIONS_FILL = [query.SWAP_KEEP_UNCHANGED_INSTITUTIONS,
+                     query.SWAP_MERGE_INSTITUTIONS]
+
+# Tables rebuilt by --swap; their shadows are analyzed before the swap
+SWAPPED_TABLES = ["Institutions", "Financials", "Demographics", "Academics"]
+
+
+def load_file(filename, year, parallel=False, isolate=False,
+              history=False, swap=False, metrics=None, file_hash=None):
+    """
+    Extract, clean, validate and load one MERGED file for a year.
+    `metrics` ("all" or a list of columns) also stores those columns
+    in the long-format metric store. With the `file_hash` of the file,
+    the tables are written in checkpointed chunks (see --resume).
+
+    Returns dict of table name -> rows inserted or updated.
+    """
+    start_time = time.time()
+    # Load csv data into a df
+    print(f"====LOADING {filename}====")
+    scorecard_data = utils.load_data(filename, year)
+    if metrics is not None:
+        metric_values = utils.melt_metrics(
+            scorecard_data, year, None if metrics == "all" else metrics)
+
+    print("Initiniating data cleaning...")
+    # clean data
+    institutions_clean = clean_cs.clean_institutions(scorecard_data)
+    academics_clean = clean_cs.clean_academics(scorecard_data)
+    demographics_clean = clean_cs.clean_demographics(scorecard_data)
+    financials_clean = clean_cs.clean_financials(scorecard_data)
+
+    print("Data cleaned successfully.\n")
+
+    # create and fill the code -> label dimension tables first,
+    # Institutions references them
+    utils.load_dimensions(clean_cs.CATEGORY_MAPPINGS)
+
+    # create the tables if they do not exist
+    utils.create_table(query.CREATE_INSTITUTIONS)
+    utils.create_table(query.CREATE_ACADEMICS)
+    utils.create_table(query.CREATE_FINANCIALS)
+    utils.create_table(query.CREATE_DEMOGRAPHICS)
+    utils.create_table(query.CREATE_QUARANTINE)
+    utils.create_table(query.CREATE_COLUMN_STATS)
+    if history:
+        utils.create_table(query.CREATE_INSTITUTIONS_HISTORY)
+    if metrics is not None:
+        utils.create_metric_store()
+    if file_hash is not None:
+        utils.create_table(query.CREATE_LOAD_CHECKPOINTS)
+
+    print("All necessary tables created or already exists.\n")
+
+    # validate against the table constraints so that a single bad row
+    # does not roll back a whole table
+    print("Validating cleaned data...")
+    institutions_clean, institutions_bad = validation.validate(
+        institutions_clean, "Institutions")
+    known_unitids = (utils.fetch_column(query.SELECT_INSTITUTION_UNITIDS)
+                     + institutions_clean["UNITID"].tolist())
+    financials_clean, financials_bad = validation.validate(
+        financials_clean, "Financials", known_unitids)
+    demographics_clean, demographics_bad = validation.validate(
+        demographics_clean, "Demographics", known_unitids)
+    academics_clean, academics_bad = validation.validate(
+        academics_clean, "Academics", known_unitids)
+
+    quarantine = pd.concat([institutions_bad, financials_bad,
+                            demographics_bad, academics_bad])
+    if not quarantine.empty:
+        utils.insert_data(query.INSERT_QUARANTINE, quarantine)
+    print("Data validated.\n")
+
+    # insert the new data into the tables
+    if file_hash is not None:
+        insert = functools.partial(utils.insert_data_checkpointed,
+                                   file_hash=file_hash)
+    elif isolate:
+        insert = utils.insert_data_isolated
+    else:
+        insert = utils.insert_data
+
+    if swap:
+        # build the new version of the four tables next to the live ones
+        # and swap them in together, so readers never see a partial load
+        results = bulk_utils.reload_with_swap(utils.get_connection, [
+            ("Institutions", query.INSERT_INSTITUTIONS,
+             institutions_clean, INSTITUTIONS_FILL),
+            ("Financials", query.INSERT_FINANCIALS,
+             financials_clean, YEAR_SLICE_FILL),
+            ("Demographics", query.INSERT_DEMOGRAPHICS,
+             demographics_clean, YEAR_SLICE_FILL),
+            ("Academics", query.INSERT_ACADEMICS,
+             academics_clean, YEAR_SLICE_FILL)
+        ], year)
+    elif parallel:
+        # Financials, Demographics and Academics only depend on
+        # Institutions through the UNITID foreign key, so commit
+        # Institutions first and then write the three of them at once
+        inserted = insert(query.INSERT_INSTITUTIONS, institutions_clean)
+        if inserted is None:
+            raise RuntimeError("Institutions insert failed; "
+                               "fact tables were not loaded.")
+        results = utils.insert_data_parallel([
+            (query.INSERT_FINANCIALS, financials_clean),
+            (query.INSERT_DEMOGRAPHICS, demographics_clean),
+            (query.INSERT_ACADEMICS, academics_clean)
+        ], insert_fn=insert)
+        failed = [t for t, rows in results.items() if rows is None]
+        if failed:
+            raise RuntimeError(f"Insert failed for: {', '.join(failed)}")
+        results["Institutions"] = inserted
+    else:
+        results = {
+            "Institutions": insert(query.INSERT_INSTITUTIONS,
+                                   institutions_clean),
+            "Financials": insert(query.INSERT_FINANCIALS, financials_clean),
+            "Demographics": insert(query.INSERT_DEMOGRAPHICS,
+                                   demographics_clean),
+            "Academics": insert(query.INSERT_ACADEMICS, academics_clean)
+        }
+
+    if history:
+        # version changed institutions with their valid-from year
+        results["Institutions_history"] = insert(
+            query.INSERT_INSTITUTIONS_HISTORY, institutions_clean)
+
+    if metrics is not None:
+        results["Metric_Values"] = utils.load_metrics(metric_values, year)
+
+    # refresh the statistics catalog for this year
+    column_stats = pd.concat([
+        stats_utils.compute_column_stats(institutions_clean,
+                                         "Institutions", year),
+        stats_utils.compute_column_stats(financials_clean,
+                                         "Financials", year),
+        stats_utils.compute_column_stats(demographics_clean,
+                                         "Demographics", year),
+        stats_utils.compute_column_stats(academics_clean,
+                                         "Academics", year)
+    ])
+    utils.insert_data(query.INSERT_COLUMN_STATS, column_stats)
+
+    if file_hash is not None:
+        failed = [t for t, rows in results.items() if rows is None]
+        if failed:
+            # stop the run: a partial load is neither maintained nor
+            # recorded as a new load version
+            raise RuntimeError(
+                f"Insert failed for: {', '.join(failed)}. Rerun with "
+                "--resume to continue from the last committed chunk.")
+        # the file is in: a later run of it starts from scratch
+        utils.clear_checkpoints(file_hash)
+
+    """
+    # update the existing data using most recent data
+    utils.update_data(query.INSERT_INSTITUTIONS, institutions_clean)
+    utils.update_data(query.INSERT_FINANCIALS, financials_clean)
+    utils.update_data(query.INSERT_DEMOGRAPHICS, demographics_clean)
+    utils.update_data(query.INSERT_ACADEMICS, academics_clean)
+    """
+
+    print("\nData loading complete.\n")
+
+    # Calculate time elapsed to load this file
+    elapsed_time = time.time() - start_time
+    print(f"{elapsed_time} seconds taken to load data file.")
+
+    return maintenance_utils.add_changed({}, results)
 
 
 def main():
@@ -13,57 +198,85 @@ def main():
         print("Error: Missing CSV file argument.")
         sys.exit(1)
     filename = sys.argv[1]
-    # get the year from the filename
-    match = re.search(r"(\d{4})_(\d{2})", filename)
-    start, end = match.groups()
-    # year = f"{start}-{start[:2]}{end}"
-    year = start
+    # --parallel writes the fact tables concurrently after Institutions
+    parallel = "--parallel" in sys.argv[2:]
+    # --isolate commits good rows and sets aside the rows Postgres rejects
+    isolate = "--isolate" in sys.argv[2:]
+    # --history keeps every version of an institution's attributes
+    history = "--history" in sys.argv[2:]
+    # --swap rebuilds the tables in shadow copies and swaps them in
+    swap = "--swap" in sys.argv[2:]
+    # --metrics stores every numeric column in the metric store,
+    # --metrics=COL1,COL2 only the listed ones
+    metrics = None
+    for arg in sys.argv[2:]:
+        if arg == "--metrics":
+            metrics = "all"
+        elif arg.startswith("--metrics="):
+            metrics = arg.split("=", 1)[1].split(",")
+    # --resume commits in chunks and records progress, so that a rerun
+    # after a failure continues from the last committed chunk
+    resume = "--resume" in sys.argv[2:]
+    if resume and isolate:
+        print("--resume replaces --isolate: rows are committed in chunks",
+              "and rejected rows are not set aside.")
+    if resume and swap:
+        print("--swap rebuilds its four tables in one go, so --resume only",
+              "checkpoints the --history insert.")
+    # --profile writes a CPU profile and an allocation report per stage
+    if "--profile" in sys.argv[2:]:
+        profile_utils.enable()
+        profile_utils.instrument(utils, "load_data", "insert_data",
+                                 "insert_data_isolated",
+                                 "insert_data_checkpointed", "load_metrics")
+        profile_utils.instrument(clean_cs, "clean_institutions",
+                                 "clean_academics", "clean_demographics",
+                                 "clean_financials")
+        profile_utils.instrument(bulk_utils, "reload_with_swap")
+    if swap and (parallel or isolate):
+        print("--parallel and --isolate are ignored for the four tables",
+              "--swap rebuilds; --isolate still applies to --history.")
 
     try:
-        start_time = time.time()
-        # Load csv data into a df
-        scorecard_data = utils.load_data(filename, year)
-
-        print("Initiniating data cleaning...")
-        # clean data
-        institutions_clean = clean_cs.clean_institutions(scorecard_data)
-        academics_clean = clean_cs.clean_academics(scorecard_data)
-        demographics_clean = clean_cs.clean_demographics(scorecard_data)
-        financials_clean = clean_cs.clean_financials(scorecard_data)
-
-        print("Data cleaned successfully.\n")
-
-        # create the tables if they do not exist
-        utils.create_table(query.CREATE_INSTITUTIONS)
-        utils.create_table(query.CREATE_ACADEMICS)
-        utils.create_table(query.CREATE_FINANCIALS)
-        utils.create_table(query.CREATE_DEMOGRAPHICS)
-
-        print("All necessary tables created or already exists.\n")
-
-        # insert the new data into the tables
-        utils.insert_data(query.INSERT_INSTITUTIONS, institutions_clean)
-        utils.insert_data(query.INSERT_FINANCIALS, financials_clean)
-        utils.insert_data(query.INSERT_DEMOGRAPHICS, demographics_clean)
-        utils.insert_data(query.INSERT_ACADEMICS, academics_clean)
-
-        """
-        # update the existing data using most recent data
-        utils.update_data(query.INSERT_INSTITUTIONS, institutions_clean)
-        utils.update_data(query.INSERT_FINANCIALS, financials_clean)
-        utils.update_data(query.INSERT_DEMOGRAPHICS, demographics_clean)
-        utils.update_data(query.INSERT_ACADEMICS, academics_clean)
-        """
-
-        print("\nData loading complete.\n")
-
-        # Calculate time elapsed to load this file
-        elapsed_time = time.time() - start_time
-        print(f"{elapsed_time} seconds taken to load data file.")
+        # a .zip bundle expands to each MERGED member, read in place
+        sources = file_utils.expand_sources(filename, MERGED_PATTERN)
+
+        # rows changed per table over every file, for the maintenance stage
+        changed = {}
+        for source in sources:
+            # get the year from the file (or archive member) name
+            match = re.search(r"(\d{4})_(\d{2})",
+                              file_utils.source_name(source))
+            if not match:
+                raise ValueError(f"Could not extract year from {source}.")
+            start, end = match.groups()
+            # year = f"{start}-{start[:2]}{end}"
+            year = start
+
+            # the content hash identifies the file's checkpoints
+            file_hash = file_utils.file_hash(source) if resume else None
+
+            maintenance_utils.add_changed(
+                changed, load_file(source, year, parallel=parallel,
+                                   isolate=isolate, history=history,
+                                   swap=swap, metrics=metrics,
+                                   file_hash=file_hash))
+
+        # refresh planner statistics of the touched tables so the
+        # dashboard gets good plans right after the load
+        # the swapped tables were analyzed while they were built
+        maintenance = maintenance_utils.run_maintenance(
+            utils.get_connection, changed,
+            analyzed=SWAPPED_TABLES if swap else ())
+        maintenance_utils.print_load_summary(changed, maintenance)
+        maintenance_utils.record_load(utils.get_connection, changed)
 
     except Exception as e:
         print("ETL Pipeline failed:", e)
         sys.exit(1)
+    finally:
+        utils.close_pool()
+        profile_utils.report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+# Driver code to pre-render the dashboard views to static files
+import sys
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import load_data.util_package.dashboard_utils as utils
+import load_data.util_package.sql_queries as queries
+
+TUITION_TYPES = ["In-state", "Out-of-state"]
+AGG_LEVELS = ["All Institutions", "Institution Type (Control)"]
+
+
+def save_table(df, folder, name):
+    """
+    Save a table as JSON (records) and HTML.
+    """
+    df.to_json(os.path.join(folder, f"{name}.json"),
+               orient="records", indent=2)
+    df.to_html(os.path.join(folder, f"{name}.html"), index=False)
+
+
+def save_chart(chart, folder, name, png=False):
+    """
+    Save an Altair chart as a standalone HTML page and Vega-Lite JSON,
+    and optionally as PNG (requires vl-convert-python).
+    """
+    chart.save(os.path.join(folder, f"{name}.html"))
+    with open(os.path.join(folder, f"{name}.json"), "w") as f:
+        json.dump(chart.to_dict(), f)
+    if png:
+        chart.save(os.path.join(folder, f"{name}.png"))
+
+
+def render_view(year, state, out_dir, png=False):
+    """
+    Render every table and chart of the report for one (year, state) view.
+    Runs in a worker process; each query opens its own connection.
+
+    Returns (year, state, number of files written)
+    """
+    folder = os.path.join(out_dir, str(year), state or "ALL")
+    os.makedirs(folder, exist_ok=True)
+
+    # PLOT 1
+    _, summary_df = utils.get_institution_summary(state)
+    save_table(utils.make_institution_summary(summary_df),
+               folder, "institutions_by_state_type")
+
+    # PLOT 2
+    tuition_summary_df = utils.query_data(
+        utils.year_query(queries.tuition_rate_summary),
+        params=(year, state, None))
+    save_table(utils.make_tuition_summary_table(tuition_summary_df),
+               folder, "tuition_summary")
+
+    # PLOT 3
+    loan_df = utils.query_data(
+        utils.year_query(queries.loan_repayment_performance), params=(year,))
+    if not loan_df.empty:
+        best_df, worst_df = utils.make_loan_performance_tables(
+            loan_df, state_selected=state)
+        save_table(best_df, folder, "loan_repayment_best")
+        save_table(worst_df, folder, "loan_repayment_worst")
+
+    # PLOT 4 (every aggregation level and tuition type)
+    tuition_repay_df = utils.query_columnar(
+        queries.tuition_repayment_over_time, params=())
+    for agg_level in AGG_LEVELS:
+        for tuition_type in TUITION_TYPES:
+            scales = utils.report_scales(year, tuition_type=tuition_type)
+            trend_chart = utils.make_tuition_repayment_charts(
+                tuition_repay_df, state_selected=state,
+                agg_level=agg_level, tuition_type=tuition_type,
+                tuition_floor=scales["tuition_floor"],
+                repayment_floor=scales["repayment_floor"])
+            if trend_chart is not None:
+                name = (f"tuition_repayment_{agg_level.split()[0].lower()}"
+                        f"_{tuition_type.split('-')[0].lower()}")
+                save_chart(trend_chart, folder, name, png)
+
+    # PLOT 6 (every tuition type)
+    adm_df = utils.query_columnar(utils.year_query(queries.tuition_admrate),
+                                  params=(year,))
+    for tuition_type in TUITION_TYPES:
+        chart = utils.make_tuition_adm_plot(adm_df, state_selected=state,
+                                            tuition_type=tuition_type)
+        save_chart(chart, folder,
+                   f"tuition_admission_{tuition_type.split('-')[0].lower()}",
+                   png)
+
+    # PLOT 7
+    salary_df = utils.query_columnar(
+        utils.year_query(queries.faculty_salary_map),
+        params=(year, state, None))
+    deck, legend_html = utils.make_faculty_salary_map(
+        salary_df, salary_range=utils.report_scales(year)["salary_range"])
+    deck.to_html(os.path.join(folder, "faculty_salary_map.html"),
+                 open_browser=False, notebook_display=False)
+    with open(os.path.join(folder, "faculty_salary_legend.html"), "w") as f:
+        f.write(legend_html)
+
+    return year, state, len(os.listdir(folder))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pre-render every (year, state) view of the dashboard.")
+    parser.add_argument("out_dir", help="Folder to write the artifacts to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of worker processes")
+    parser.add_argument("--years", nargs="*", type=int,
+                        help="Years to render (default: all)")
+    parser.add_argument("--states", nargs="*",
+                        help="States to render (default: all and ALL)")
+    parser.add_argument("--png", action="store_true",
+                        help="Also write PNGs (requires vl-convert-python)")
+    args = parser.parse_args()
+
+    try:
+        start_time = time.time()
+
+        years = args.years or sorted(
+            utils.query_data(queries.get_years, params=())["year"].tolist())
+        states = args.states
+        if states is None:
+            states = [""] + utils.query_data(
+                queries.get_states, params=())["stabbr"].tolist()
+
+        # PLOT 5 does not depend on year or state
+        os.makedirs(args.out_dir, exist_ok=True)
+        save_table(utils.make_sat_carnegie_table(
+            utils.query_data(queries.SAT_avg_carnegie)),
+            args.out_dir, "sat_by_carnegie")
+
+        views = [(int(year), state) for year in years for state in states]
+        print(f"Rendering {len(views)} views with {args.workers} workers...")
+
+        failed = 0
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {
+                executor.submit(render_view, year, state,
+                                args.out_dir, args.png): (year, state)
+                for year, state in views}
+            for future in as_completed(futures):
+                year, state = futures[future]
+                try:
+                    _, _, nfiles = future.result()
+                    print(f"SUCCESS: {year} {state or 'ALL'} "
+                          f"({nfiles} files)")
+                except Exception as e:
+                    failed += 1
+                    print(f"FAILED : {year} {state or 'ALL'}: {e}")
+
+        elapsed_time = time.time() - start_time
+        print(f"\n{len(views) - failed} / {len(views)} views rendered to",
+              f"{args.out_dir} in {elapsed_time:.1f} seconds.")
+        if failed:
+            sys.exit(1)
+
+    except Exception as e:
+        print("Report rendering failed:", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
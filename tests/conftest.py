@@ -0,0 +1,64 @@
+# The modules are imported as load_data.<package>.<module>, from the
+# repository root, like the drivers do
+import importlib
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Connection settings (see README, Credentials), imported by every module
+# that connects to the database
+CREDENTIALS = "load_data.util_package.credentials"
+
+
+def import_or_skip(name, *requires):
+    """
+    Import a module of the repository for a fixture, skipping the test
+    when one of the modules it requires (psycopg, fastapi, ...,
+    CREDENTIALS) is not installed.
+    """
+    for module in requires:
+        pytest.importorskip(module)
+    return importlib.import_module(name)
+
+
+@pytest.fixture
+def dashboard_utils():
+    return import_or_skip("load_data.util_package.dashboard_utils",
+                          "psycopg", "altair", "pydeck", "scipy", CREDENTIALS)
+
+
+@pytest.fixture
+def bulk_utils():
+    return import_or_skip("load_data.util_package.bulk_utils", "psycopg")
+
+
+@pytest.fixture
+def collegescorecard_utils():
+    return import_or_skip("load_data.util_package.collegescorecard_utils",
+                          "psycopg", "psycopg_pool", CREDENTIALS)
+
+
+@pytest.fixture
+def ipeds_components():
+    return import_or_skip("load_data.util_package.ipeds_components",
+                          "psycopg", CREDENTIALS)
+
+
+@pytest.fixture
+def ipeds_utils():
+    return import_or_skip("load_data.util_package.ipeds_utils",
+                          "psycopg", "psycopg_pool", CREDENTIALS)
+
+
+@pytest.fixture
+def connection_utils():
+    return import_or_skip("load_data.util_package.connection_utils",
+                          "psycopg", "psycopg_pool", CREDENTIALS)
+
+
+@pytest.fixture
+def api():
+    return import_or_skip("api", "fastapi", "psycopg", "altair", "pydeck",
+                          "scipy", CREDENTIALS)
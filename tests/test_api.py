@@ -0,0 +1,38 @@
+import pytest
+
+
+def test_etag_changes_with_load_version_and_params(api):
+    params = {"year": 2021, "state": "NY", "unitid": None}
+    etag = api.make_etag(7, "tuition-summary", params, "json")
+    assert etag.startswith('"v7-')
+    assert etag == api.make_etag(7, "tuition-summary", dict(params), "json")
+    assert etag != api.make_etag(8, "tuition-summary", params, "json")
+    assert etag != api.make_etag(7, "tuition-summary", params, "arrow")
+
+
+def test_etag_matches(api):
+    etag = '"v7-abc"'
+    assert api.etag_matches(etag, '"v7-abc"')
+    assert api.etag_matches(etag, 'W/"v7-abc", "v6-def"')
+    assert api.etag_matches(etag, "*")
+    assert not api.etag_matches(etag, '"v6-abc"')
+    assert not api.etag_matches(etag, None)
+
+
+def test_parse_params_defaults_and_types(api):
+    params = api.parse_params("search", {"search": "rutgers"})
+    assert params == {"search": "rutgers", "state": "", "limit": 25}
+    assert api.parse_params("loan-repayment", {"year": "2021"}) == {
+        "year": 2021}
+
+
+@pytest.mark.parametrize("name, query", [
+    ("loan-repayment", {}),
+    ("loan-repayment", {"year": "last"}),
+    ("search", {"search": "a", "limit": "0"}),
+    ("search", {"search": "a", "limit": "101"}),
+])
+def test_parse_params_rejects_bad_values(api, name, query):
+    with pytest.raises(api.HTTPException) as error:
+        api.parse_params(name, query)
+    assert error.value.status_code == 422
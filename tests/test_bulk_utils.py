@@ -0,0 +1,24 @@
+import load_data.util_package.sql_queries as queries
+
+
+def test_insert_table_name(bulk_utils):
+    assert bulk_utils.insert_table_name(queries.INSERT_FINANCIALS) == \
+        "Financials"
+
+
+def test_insert_table_name_after_with_clause(bulk_utils):
+    assert (bulk_utils.insert_table_name(queries.INSERT_INSTITUTIONS_HISTORY)
+            == "Institutions_history")
+    assert bulk_utils.insert_columns(
+        queries.INSERT_INSTITUTIONS_HISTORY)[0] == "UNITID"
+
+
+def test_point_references_to_swapped_shadows(bulk_utils):
+    definition = ("FOREIGN KEY (unitid) REFERENCES public.institutions(unitid)"
+                  " ON DELETE CASCADE")
+    assert bulk_utils._point_references(definition, {"institutions"}) == (
+        "FOREIGN KEY (unitid) REFERENCES public.institutions"
+        f"{bulk_utils.SHADOW_SUFFIX}(unitid) ON DELETE CASCADE")
+    # tables that are not swapped keep their references
+    assert bulk_utils._point_references(definition, {"financials"}) == \
+        definition
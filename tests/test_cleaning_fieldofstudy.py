@@ -0,0 +1,31 @@
+import pandas as pd
+import load_data.cleaning_package.cleaning_fieldofstudy as clean_fos
+
+
+def test_clean_fields_of_study_keeps_one_row_per_program():
+    df = pd.DataFrame({
+        "UNITID": ["1", "1", "1", "2", None],
+        "CIPCODE": ["5202", "5202", "5203", "5202", "5202"],
+        "CREDLEV": ["3", "3", "9", "5", "3"],
+        "CIPDESC": ["Business."] * 5,
+        "IPEDSCOUNT1": ["12", "13", "1", "PrivacySuppressed", "4"],
+        "EARN_MDN_1YR": ["40000.5", "1", "1", "50000", "1"],
+    })
+    clean = clean_fos.clean_fields_of_study(df, "2021")
+
+    # unknown credential levels and missing keys are dropped, the first
+    # row of a repeated program is kept
+    assert clean[clean_fos.ID_COLS + ["YEAR"]].values.tolist() == [
+        [1, 5202, 3, 2021], [2, 5202, 5, 2021]]
+    assert clean["IPEDSCOUNT1"].tolist() == [12, None]
+    assert clean["EARN_MDN_1YR"].tolist() == [40000.5, 50000]
+    # columns missing from older files are NULL
+    assert clean["EARN_MDN_4YR"].tolist() == [None, None]
+
+
+def test_clean_cip_codes_lists_each_code_once():
+    df = pd.DataFrame({"CIPCODE": ["5202", "5202", "1101", "x"],
+                       "CIPDESC": ["Business.", "Business.", "Computer.",
+                                   "Bad."]})
+    clean = clean_fos.clean_cip_codes(df)
+    assert clean.values.tolist() == [[5202, "Business"], [1101, "Computer"]]
@@ -0,0 +1,120 @@
+import contextlib
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_melt_metrics_keeps_numeric_values_grouped_by_metric(
+        collegescorecard_utils):
+    data = pd.DataFrame({
+        "UNITID": [1, 2, 3],
+        "OPEID": [10, 20, 30],
+        "C150_4": [0.5, None, "PrivacySuppressed"],
+        "MD_EARN": ["40000", "50000", "60000"],
+        "INSTURL": ["a.edu", "b.edu", "c.edu"],
+    })
+    metrics = collegescorecard_utils.melt_metrics(data, "2021")
+
+    assert metrics["NAME"].tolist() == ["C150_4", "MD_EARN", "MD_EARN",
+                                        "MD_EARN"]
+    assert metrics["UNITID"].tolist() == [1, 1, 2, 3]
+    assert set(metrics["YEAR"]) == {2021}
+    assert np.allclose(metrics["VALUE"], [0.5, 40000, 50000, 60000])
+
+
+def test_melt_metrics_rejects_unknown_columns(collegescorecard_utils):
+    data = pd.DataFrame({"UNITID": [1], "C150_4": [0.5]})
+    with pytest.raises(KeyError):
+        collegescorecard_utils.melt_metrics(data, 2021,
+                                            columns=["C150_4", "NOPE"])
+
+
+class FakeDatabase:
+    """
+    Rows applied and the Load_Checkpoints row of one table, behind
+    connections whose commit of chunk `lose_ack` goes through once but
+    reports a lost connection.
+    """
+    def __init__(self, lose_ack, error):
+        self.lose_ack = lose_ack
+        self.error = error
+        self.applied = 0
+        self.checkpoint = None
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    closed = False
+    broken = False
+
+    def __init__(self, db):
+        self.db = db
+        self.pending = None
+        self.error = db.error
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        yield
+        rows, checkpoint = self.pending
+        self.db.applied += rows
+        self.db.checkpoint = checkpoint
+        if checkpoint[0] == self.db.lose_ack:
+            self.db.lose_ack = None
+            self.broken = True
+            raise self.error("server closed the connection")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, query, rows):
+        self.rowcount = len(rows)
+
+    def execute(self, query, params):
+        if "SET" in query:
+            # UPSERT_LOAD_CHECKPOINT: (hash, table, chunk, chunk_rows)
+            self.conn.pending = (self.rowcount, (params[2], params[3]))
+        else:
+            self.result = self.conn.db.checkpoint
+
+    def fetchone(self):
+        return self.result
+
+
+def test_checkpointed_insert_skips_a_chunk_committed_before_a_lost_ack(
+        collegescorecard_utils, monkeypatch):
+    db = FakeDatabase(lose_ack=1,
+                      error=collegescorecard_utils.psycopg.OperationalError)
+    monkeypatch.setattr(collegescorecard_utils, "get_connection", db.connect)
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    df = pd.DataFrame({"UNITID": range(5), "YEAR": [2021] * 5})
+
+    inserted = collegescorecard_utils.insert_data_checkpointed(
+        "INSERT INTO Financials (UNITID, YEAR) VALUES (%s, %s)", df,
+        file_hash="abc", chunk_rows=2)
+
+    # chunk 1 was committed once; its rowcount was lost with the
+    # acknowledgement
+    assert db.applied == 5
+    assert inserted == 3
+    assert db.checkpoint == (2, 2)
@@ -0,0 +1,28 @@
+import logging
+import pytest
+
+
+@pytest.fixture
+def read_pools(monkeypatch, connection_utils):
+    # fresh pools reading from the primary, closed after the test
+    monkeypatch.setattr(connection_utils, "_read_pools", {})
+    monkeypatch.setattr(connection_utils, "read_hosts", lambda: [])
+    yield
+    connection_utils.close_read_pools()
+
+
+def test_read_connection_returns_idle_connections(connection_utils,
+                                                  read_pools, caplog):
+    caplog.set_level(logging.WARNING, logger="psycopg.pool")
+    try:
+        for _ in range(2):
+            with connection_utils.read_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                    assert cur.fetchone() == (1,)
+    except connection_utils.PoolTimeout:
+        pytest.skip("database not reachable")
+
+    # a connection returned inside a transaction is rolled back by the
+    # pool with a "rolling back returned connection" warning
+    assert not caplog.records
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def spatial_index(dashboard_utils):
+    return dashboard_utils.SpatialIndex(pd.DataFrame({
+        "unitid": [1, 2, 3, 4],
+        "instnm": ["Columbia", "NYU", "Princeton", "Stanford"],
+        "city": ["New York", "New York", "Princeton", "Stanford"],
+        "stabbr": ["NY", "NY", "NJ", "CA"],
+        "latitude": [40.8075, 40.7295, 40.3431, 37.4275],
+        "longitude": [-73.9626, -73.9965, -74.6551, -122.1697],
+    }))
+
+
+def test_within_radius(dashboard_utils, spatial_index):
+    result = dashboard_utils.institutions_within_radius(spatial_index, 1, 50)
+    assert result["unitid"].tolist() == [2, 3]
+    # Columbia - NYU is about 5.7 miles
+    assert result["distance_miles"].iloc[0] == pytest.approx(5.7, abs=0.2)
+
+
+def test_nearest(dashboard_utils, spatial_index):
+    # Princeton is the furthest west of the East Coast institutions
+    result = dashboard_utils.nearest_institutions(spatial_index, 4, k=2)
+    assert result["unitid"].tolist()[0] == 3
+    assert len(result) == 2
+    assert 4 not in result["unitid"].tolist()
+
+
+@pytest.fixture
+def cube(dashboard_utils):
+    facts = pd.DataFrame({
+        "unitid": [1, 2, 3, 4, 1],
+        "instnm": ["A", "B", "C", "D", "A"],
+        "year": [2021, 2021, 2021, 2021, 2020],
+        "stabbr": ["NY", "NY", "NJ", None, "NY"],
+        "control": ["Public", "Private", "Public", "Public", "Public"],
+        "c_basic": ["X", "X", "Y", "Y", "X"],
+    })
+    measures = {m: [np.nan] * 5 for m in dashboard_utils.CUBE_MEASURES}
+    measures["tuitionfee_in"] = [100, 300, 200, 400, 50]
+    measures["tuitionfee_out"] = [150, np.nan, 250, 450, 60]
+    return dashboard_utils.Cube(facts.assign(**measures))
+
+
+def test_cube_aggregate_by_dimension(cube):
+    result = cube.aggregate(["tuitionfee_in", "tuitionfee_out"],
+                            by=["stabbr"], year=2021)
+    # institutions without a state form the last group
+    assert result["stabbr"].tolist()[:2] == ["NJ", "NY"]
+    assert pd.isna(result["stabbr"].iloc[2])
+    assert result["rows"].tolist() == [1, 2, 1]
+    assert result["tuitionfee_in"].tolist() == [200, 200, 400]
+    # missing values are left out of the mean
+    assert result["tuitionfee_out"].tolist() == [250, 150, 450]
+
+
+@pytest.mark.parametrize("agg, expected", [
+    ("sum", [100 + 300 + 50]), ("count", [3]),
+    ("min", [50]), ("max", [300]),
+])
+def test_cube_aggregates(cube, agg, expected):
+    result = cube.aggregate(["tuitionfee_in"], agg=agg, stabbr="NY")
+    assert result["tuitionfee_in"].tolist() == expected
+
+
+def test_cube_filters(cube):
+    assert cube.mask(stabbr=["NY", "NJ"], year=2021).sum() == 3
+    assert cube.mask(stabbr="TX").sum() == 0
+    assert cube.mask(unitid=1).sum() == 2
+    assert cube.mask(require=["tuitionfee_out"]).sum() == 4
+    rows = cube.rows(["tuitionfee_in"], year=2020)
+    assert rows[["unitid", "stabbr", "tuitionfee_in"]].values.tolist() == [
+        [1, "NY", 50]]
+
+
+def test_cube_tuition_summary_requires_both_tuitions(dashboard_utils,
+                                                    cube):
+    summary = dashboard_utils.cube_tuition_summary(cube, 2021)
+    assert summary.to_dict("records") == [
+        {"stabbr": "NJ", "c_basic": "Y", "avg_in_state_tuition": 200.0,
+         "avg_out_state_tuition": 250.0},
+        {"stabbr": "NY", "c_basic": "X", "avg_in_state_tuition": 100.0,
+         "avg_out_state_tuition": 150.0},
+    ]
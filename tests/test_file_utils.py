@@ -0,0 +1,31 @@
+import zipfile
+import load_data.util_package.file_utils as file_utils
+
+
+def test_split_source_without_member():
+    assert file_utils.split_source("data/MERGED2021_22_PP.csv") == (
+        "data/MERGED2021_22_PP.csv", None)
+
+
+def test_split_source_with_member():
+    assert file_utils.split_source("bundle.zip::MERGED2021_22_PP.csv") == (
+        "bundle.zip", "MERGED2021_22_PP.csv")
+
+
+def test_source_name_uses_member_and_drops_compression():
+    assert (file_utils.source_name("2019/bundle.zip::MERGED2021_22_PP.csv")
+            == "MERGED2021_22_PP.csv")
+    assert file_utils.source_name("2019/HD2022.csv.gz") == "HD2022.csv"
+
+
+def test_expand_sources_lists_matching_members_in_order(tmp_path):
+    bundle = tmp_path / "bundle.zip"
+    with zipfile.ZipFile(bundle, "w") as archive:
+        for name in ["MERGED2021_22_PP.csv", "readme.txt",
+                     "MERGED2019_20_PP.csv"]:
+            archive.writestr(name, "UNITID\n1\n")
+
+    sources = file_utils.expand_sources(str(bundle),
+                                        r"^MERGED\d{4}_\d{2}_PP\.csv$")
+    assert sources == [f"{bundle}::MERGED2019_20_PP.csv",
+                       f"{bundle}::MERGED2021_22_PP.csv"]
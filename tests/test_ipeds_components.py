@@ -0,0 +1,27 @@
+import re
+import pytest
+
+
+@pytest.mark.parametrize("file_name, name, year", [
+    ("ef2022a.csv", "EF", "2022"),
+    ("EF2022A_RV.csv", "EF", "2022"),
+    ("sal2021_is.csv", "SAL", "2021"),
+    ("sfa2122.csv", "SFA", "2021"),
+    ("gr2020_rv.csv", "GR", "2020"),
+])
+def test_component_year(ipeds_components, file_name, name, year):
+    component = ipeds_components.find_component(file_name)
+    assert component["name"] == name
+    assert ipeds_components.component_year(component, file_name) == year
+
+
+def test_unknown_file_has_no_component(ipeds_components):
+    assert ipeds_components.find_component("readme.txt") is None
+
+
+def test_sources_pattern_matches_every_component(ipeds_components):
+    pattern = re.compile(ipeds_components.sources_pattern(), re.IGNORECASE)
+    for name in ["ef2022a.csv", "sal2021_is.csv", "sfa2122.csv",
+                 "gr2020.csv"]:
+        assert pattern.search(name)
+    assert not pattern.search("readme.txt")
@@ -0,0 +1,35 @@
+import pytest
+
+
+@pytest.fixture
+def loaded_chunks(monkeypatch, ipeds_utils):
+    # chunks load_component would copy into the partition
+    chunks = []
+
+    def load_year_partition(get_connection, table_name, year, cleaned):
+        chunks.extend(cleaned)
+        return sum(len(chunk) for chunk in chunks)
+
+    monkeypatch.setattr(ipeds_utils, "create_table", lambda query: None)
+    monkeypatch.setattr(ipeds_utils.bulk_utils, "load_year_partition",
+                        load_year_partition)
+    return chunks
+
+
+def test_load_component_drops_keys_repeated_across_chunks(
+        tmp_path, ipeds_components, ipeds_utils, loaded_chunks):
+    path = tmp_path / "ef2022a.csv"
+    path.write_text("UNITID,EFALEVEL,EFTOTLT\n"
+                    "1,1,10\n"
+                    "1,2,20\n"
+                    # same keys as the first row, in the second chunk
+                    "1,1,99\n"
+                    "2,1,30\n")
+
+    rows = ipeds_utils.load_component(ipeds_components.COMPONENTS["EF"],
+                                      str(path), "2022", chunk_rows=2)
+
+    assert rows == {"Enrollment_IPEDS": 3}
+    assert [len(chunk) for chunk in loaded_chunks] == [2, 1]
+    assert loaded_chunks[1][["UNITID", "EFALEVEL", "EFTOTLT"]] \
+        .values.tolist() == [[2, 1, 30]]
@@ -0,0 +1,47 @@
+import pandas as pd
+import load_data.cleaning_package.validation as validation
+
+
+def financials(**overrides):
+    row = {"UNITID": 100, "YEAR": 2021, "TUITIONFEE_IN": 1000,
+           "TUITIONFEE_OUT": 2000, "TUITIONFEE_PROG": None, "TUITFTE": 500,
+           "AVGFACSAL": 7000, "CDR2": 0.1, "CDR3": 0.2}
+    row.update(overrides)
+    return row
+
+
+def test_validate_splits_valid_and_rejected_rows():
+    df = pd.DataFrame([financials(),
+                       financials(UNITID=101, TUITIONFEE_IN=-5),
+                       financials(UNITID=102, AVGFACSAL=0)])
+    valid, quarantine = validation.validate(df, "Financials")
+
+    assert valid["UNITID"].tolist() == [100]
+    assert quarantine["UNITID"].tolist() == [101, 102]
+    assert quarantine["RULES"].tolist() == ["CHECK_TUITIONFEE_IN",
+                                            "CHECK_AVGFACSAL"]
+    assert set(quarantine["TABLE_NAME"]) == {"Financials"}
+
+
+def test_validate_lets_missing_values_pass_checks():
+    df = pd.DataFrame([financials(TUITIONFEE_IN=None, CDR3=None)])
+    valid, quarantine = validation.validate(df, "Financials")
+    assert len(valid) == 1
+    assert quarantine.empty
+
+
+def test_validate_lists_every_broken_rule_and_unknown_unitids():
+    df = pd.DataFrame([financials(UNITID=999, YEAR=3000, CDR2=-1)])
+    _, quarantine = validation.validate(df, "Financials",
+                                        known_unitids=[100])
+    assert quarantine["RULES"].iloc[0].split(";") == [
+        "CHECK_YEAR", "CHECK_CDR2", "FK_UNITID"]
+
+
+def test_validate_checks_not_null_columns():
+    df = pd.DataFrame({"UNITID": [1, 2], "OPEID": [10, None],
+                       "LAST_REPORTED": [2020, 2021]})
+    valid, quarantine = validation.validate(df, "Institutions")
+    assert valid["UNITID"].tolist() == [1]
+    assert quarantine["RULES"].tolist() == ["NOT_NULL_OPEID"]
+    assert quarantine["YEAR"].tolist() == [2021]